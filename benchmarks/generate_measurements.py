@@ -0,0 +1,86 @@
+import os
+import argparse
+import numpy as np
+from openpyxl import Workbook
+
+# Rows in front of the cycles: two limit rows, the rest is dropped by the evaluation as settling phase
+SETTLING_ROWS = 18
+INFUSION_LIMITS = (0.55, 0.75)
+INJECTION_LIMITS = (0.30, 0.50)
+
+
+def plug_in_profile(samples, depth, rng, noise):
+    # Idle, ramp in, hold at depth, ramp out, idle
+    x = np.linspace(0, 1, samples, endpoint=False)
+    profile = np.clip(np.minimum((x - 0.2) / 0.15, (0.9 - x) / 0.1), 0, 1) * depth
+    return np.abs(profile + rng.normal(0, noise, samples))
+
+
+def generate_signals(cycles=12, samples_per_cycle=500, noise=0.002, oneport=False, nan_rate=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    infusion = [plug_in_profile(samples_per_cycle, 0.65 + rng.normal(0, 0.03), rng, noise) for _ in range(cycles)]
+    injection = [plug_in_profile(samples_per_cycle, 0.40 + rng.normal(0, 0.03), rng, noise) for _ in range(cycles)]
+
+    infusion = np.concatenate([INFUSION_LIMITS, np.zeros(SETTLING_ROWS)] + infusion)
+    injection = None if oneport else np.concatenate([INJECTION_LIMITS, np.zeros(SETTLING_ROWS)] + injection)
+
+    if nan_rate:
+        # Gaps in the recording, the limit rows are always present
+        for values in (infusion, injection):
+            if values is not None:
+                gaps = rng.random(len(values)) < nan_rate
+                gaps[:2] = False
+                values[gaps] = np.nan
+    return infusion, injection
+
+
+def write_measurement(file_path, cycles=12, samples_per_cycle=500, noise=0.002, oneport=False, nan_rate=0.0, seed=0):
+    infusion, injection = generate_signals(cycles, samples_per_cycle, noise, oneport, nan_rate, seed)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Measurement')
+    ws.append(['Time', 'Infusion'] if oneport else ['Time', 'Infusion', 'Injection'])
+    time = np.arange(len(infusion)) * 0.01
+    columns = [time.tolist(), infusion.tolist()] + ([] if oneport else [injection.tolist()])
+    for row in zip(*columns):
+        # Gaps are empty cells
+        ws.append([None if value != value else value for value in row])
+    wb.save(file_path)
+    return len(infusion)
+
+
+def generate_folder(folder, files=10, **kwargs):
+    os.makedirs(folder, exist_ok=True)
+    seed = kwargs.pop('seed', 0)
+    paths = []
+    for index in range(files):
+        path = os.path.join(folder, f'measurement_{index:04d}.xlsx')
+        write_measurement(path, seed=seed + index, **kwargs)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic 2F plug in depth measurement workbooks.')
+    parser.add_argument('folder')
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--cycles', type=int, default=12)
+    parser.add_argument('--samples-per-cycle', type=int, default=500)
+    parser.add_argument('--noise', type=float, default=0.002)
+    parser.add_argument('--oneport', action='store_true')
+    parser.add_argument('--nan-rate', type=float, default=0.0, help='Share of empty cells')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = generate_folder(args.folder, args.files,
+                            cycles=args.cycles,
+                            samples_per_cycle=args.samples_per_cycle,
+                            noise=args.noise,
+                            oneport=args.oneport,
+                            nan_rate=args.nan_rate,
+                            seed=args.seed)
+    print(f'{len(paths)} measurements written to {args.folder}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+from generate_measurements import generate_folder
+from measurement_reader import read_measurement, BACKENDS, default_backend
+from evaluation import EvaluationSettings, segment_measurement, evaluate_measurement, threshold_maxima
+from batch import evaluate_files, default_workers, THREAD, PROCESS
+from export_excel import ExportExcel
+
+SETTINGS = EvaluationSettings(0.01, 0.2, 0.1)
+
+# (cycles, samples per cycle) of the single file cases
+SIZES = {
+    'small': (12, 200),
+    'medium': (15, 2000),
+    'large': (20, 10000),
+}
+FILE_COUNTS = [1, 10, 50]
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+
+def record(results, case, phase, durations, **info):
+    results.append({
+        'case': case,
+        'phase': phase,
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'repeat': len(durations),
+        **info,
+    })
+    print(f'{case:<28}{phase:<20}{min(durations)*1000:10.2f} ms', file=sys.stderr)
+
+
+def bench_phases(results, folder, case, repeat, backend, **kwargs):
+    path = generate_folder(os.path.join(folder, case), 1, **kwargs)[0]
+
+    measurement, durations = timed(lambda: read_measurement(path, backend), repeat)
+    rows = len(measurement.infusion)
+    record(results, case, f'read[{backend}]', durations, rows=rows)
+
+    maxima, durations = timed(lambda: segment_measurement(measurement, SETTINGS), repeat)
+    cycles = len(maxima.infusion) if maxima is not None else 0
+    record(results, case, 'calc_cycles', durations, rows=rows, cycles=cycles)
+
+    _, durations = timed(lambda: threshold_maxima(maxima, SETTINGS.infusion_filter, SETTINGS.injection_filter), repeat)
+    record(results, case, 'thresholding', durations, rows=rows, cycles=cycles)
+
+    data = evaluate_measurement(os.path.basename(path), measurement, maxima, SETTINGS).data
+    output_file = os.path.join(folder, f'{case}_result.xlsx')
+    _, durations = timed(lambda: ExportExcel([data], output_file, sys.stderr.write, 'en_US').write_to_excel(), repeat)
+    record(results, case, 'export', durations, rows=rows, cycles=cycles)
+
+
+def bench_batch(results, folder, files, repeat, workers, mode):
+    case = f'batch_{files}_files'
+    paths = generate_folder(os.path.join(folder, case), files, cycles=12, samples_per_cycle=1000)
+    names = [os.path.basename(path) for path in paths]
+    batch_folder = os.path.dirname(paths[0])
+
+    evaluated, durations = timed(lambda: list(evaluate_files(batch_folder, names, SETTINGS, workers, mode)), repeat)
+    record(results, case, f'evaluate[{mode}]', durations, files=files, workers=workers)
+
+    output_file = os.path.join(folder, f'{case}_result.xlsx')
+    output_file_data = [result.data for result in evaluated if result.data]
+    _, durations = timed(lambda: ExportExcel(output_file_data, output_file, sys.stderr.write, 'en_US').write_to_excel(), repeat)
+    record(results, case, 'export', durations, files=files)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {(entry['case'], entry['phase']): entry for entry in json.load(file)['results']}
+
+    regressions = 0
+    print(f'\n{"case":<28}{"phase":<20}{"baseline":>12}{"current":>12}{"ratio":>8}')
+    for entry in results:
+        old = baseline.get((entry['case'], entry['phase']))
+        if old is None:
+            continue
+        ratio = entry['min'] / old['min'] if old['min'] else np.inf
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions += 1
+            flag = '  slower'
+        print(f'{entry["case"]:<28}{entry["phase"]:<20}{old["min"]*1000:10.2f}ms{entry["min"]*1000:10.2f}ms{ratio:8.2f}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the phases of the evaluation on synthetic measurements.')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--files', nargs='+', type=int, default=FILE_COUNTS, help='File counts of the batch cases')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--mode', choices=[PROCESS, THREAD], default=PROCESS)
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=[default_backend()])
+    parser.add_argument('--nan-rate', type=float, default=0.0, help='Share of empty cells in the single file cases')
+    parser.add_argument('--oneport', action='store_true', help='Use one port measurements in the single file cases')
+    parser.add_argument('--keep', help='Keep the generated files in this folder')
+    args = parser.parse_args(argv)
+
+    folder = args.keep or tempfile.mkdtemp(prefix='2f_benchmark_')
+    results = []
+    try:
+        for size in args.sizes:
+            cycles, samples_per_cycle = SIZES[size]
+            for backend in args.backends:
+                bench_phases(results, folder, f'{size}_{backend}', args.repeat, backend,
+                             cycles=cycles, samples_per_cycle=samples_per_cycle,
+                             oneport=args.oneport, nan_rate=args.nan_rate)
+        for files in args.files:
+            bench_batch(results, folder, files, args.repeat, args.workers, args.mode)
+    finally:
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'results': results,
+        }, file, indent=2)
+    print(f'Results saved at {args.output}', file=sys.stderr)
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
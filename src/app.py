@@ -1,14 +1,11 @@
+import startup_timing
 import os
 import sys
-import ctypes
-import locale
-import importlib
-import requests
-from pathlib import Path
-import pandas as pd
-
-from PyQt6.QtCore import QMutex, QObject, QThread, pyqtSignal, QUrl, Qt
-from PyQt6.QtGui import QAction, QIcon, QDoubleValidator, QDesktopServices
+import importlib.util
+import multiprocessing
+
+from PyQt6.QtCore import QUrl, Qt, QTimer, QSettings, QSortFilterProxyModel
+from PyQt6.QtGui import QAction, QCursor, QIcon, QDoubleValidator, QIntValidator, QDesktopServices
 from PyQt6.QtWidgets import (
     QApplication,
     QLabel,
@@ -17,17 +14,34 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QWidget,
-    QScrollArea,
     QStyle,
     QMessageBox,
     QProgressBar,
     QLineEdit,
-    QCheckBox,
+    QComboBox,
+    QSpinBox,
     QTextEdit,
-    QFileDialog
+    QFileDialog,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView
 )
-from openpyxl.utils.exceptions import InvalidFileException
-from export_excel import ExportExcel
+# pandas, openpyxl and requests are only imported once an evaluation, export or update check runs
+from file_list import FolderScanner, MeasurementFileModel, scan_folder
+from result_table import ResultTableModel, ResultTableView
+from folder_watch import FolderWatcher
+from evaluation import EvaluationSettings, LiveEvaluation, skipped_result, LEVEL, EDGE
+from measurement_cache import MeasurementCache
+from prefetch import PREFETCH_BYTES
+from update_check import UpdateChecker
+from scheduler import EvaluationScheduler
+from batch import default_workers, THREAD, PROCESS
+from timings import PhaseTimer, NULL_TIMER, summary
+from event_bus import EventBus
+from progress import ROWS, MESSAGE, RESULT, FINISHED, estimate_rows
 
 if '_PYIBoot_SPLASH' in os.environ and importlib.util.find_spec("pyi_splash"):
     import pyi_splash
@@ -35,20 +49,32 @@ if '_PYIBoot_SPLASH' in os.environ and importlib.util.find_spec("pyi_splash"):
     pyi_splash.close()
 
 
-if importlib.util.find_spec("win32com"):
-    from win32com.client import *
-    def get_version_number(file_path):
-        information_parser = Dispatch("Scripting.FileSystemObject")
-        version = information_parser.GetFileVersion(file_path)
-        return version
-    VERSION = get_version_number(sys.argv[0])
-else:
-    VERSION = 'DEV VERSION'
+def get_version():
+    if not importlib.util.find_spec("win32com"):
+        return 'DEV VERSION'
+
+    # Reading the file version through COM is slow, it is cached per executable
+    settings = QSettings('jkfres', '2F plug in depth evaluation')
+    file_path = os.path.abspath(sys.argv[0])
+    try:
+        key = f'{file_path}|{os.path.getmtime(file_path)}'
+    except OSError:
+        key = None
+    if key and settings.value('version/key') == key:
+        return settings.value('version/number', 'DEV VERSION')
+
+    from win32com.client import Dispatch
+    information_parser = Dispatch("Scripting.FileSystemObject")
+    version = information_parser.GetFileVersion(file_path)
+    if key:
+        settings.setValue('version/key', key)
+        settings.setValue('version/number', version)
+    return version
+
+
+VERSION = get_version()
 
 if os.name == 'nt':
-    windll = ctypes.windll.kernel32
-    windll.GetUserDefaultUILanguage()
-    LANGUAGE = locale.windows_locale[ windll.GetUserDefaultUILanguage() ]
     try:
         from ctypes import windll  # Only exists on Windows.
         APPID = 'joeklein.fk.plugindepth.1'
@@ -56,182 +82,70 @@ if os.name == 'nt':
     except ImportError:
         pass
 
-if os.name == 'posix':
-    LANGUAGE = locale.getlocale()[0]
+basedir = os.path.dirname(__file__)
+
 
+class SweepDialog(QDialog):
+    def __init__(self, cycle_filter, infusion_filter, injection_filter, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Threshold sweep')
+        self.setMinimumWidth(400)
 
-mutex = QMutex()
-pd.set_option('display.max_columns', None)
-basedir = os.path.dirname(__file__)
+        layout = QFormLayout()
+        self.setLayout(layout)
+        layout.addRow(QLabel('Ranges as start:stop:step or values separated by ";"'))
 
+        self.cycle_filter_entry = QLineEdit(cycle_filter)
+        layout.addRow('Cycle filter:', self.cycle_filter_entry)
 
-class MeasurmentTask(QObject):
-    finished = pyqtSignal()
-    broken = pyqtSignal()
-    addData = pyqtSignal(list)
-    addMinMaxData = pyqtSignal(list)
-    terminated = pyqtSignal(bool)
-
-    def __init__(self, info_text, cycle_filter, measurments_folder_path, infusion_filter_entry, injection_filter_entry, output):
-        super().__init__()
-        self.info_text = info_text
-        self.cycle_filter = cycle_filter
-        self.measurments_folder_path = measurments_folder_path
-        self.infusion_filter_entry = infusion_filter_entry
-        self.injection_filter_entry = injection_filter_entry
-        self.output = output
-        self.df_output = []
-        self.file = ''
-        self.output_file_data = ()
-
-    def calc_cycles(self, df1, df2):
-        df1.drop(index=df1.index[:20], inplace=True)
-        df1.dropna(inplace=True)
-        df1.reset_index(drop=True, inplace=True)
-
-        # Find the positions where a new cycle starts (value < 0.01)
-        cycle_start1 = df1[df1 < float(self.cycle_filter.text().replace(',','.'))].index.tolist()
-
-        # Default value if df2 is None
-        cycle_start = cycle_start1
-
-        if df2 is not None:
-            df2.drop(index=df2.index[:20], inplace=True)
-            df2.dropna(inplace=True)
-            df2.reset_index(drop=True, inplace=True)
-
-            # Find the positions where a new cycle starts (value < 0.01)
-            cycle_start2 = df2[df2 < float(self.cycle_filter.text().replace(',','.'))].index.tolist()
-
-            # Use the shortest cycle start points to get equal cycles
-            cycle_start = cycle_start2
-            if len(cycle_start1) < len(cycle_start2):
-                cycle_start = cycle_start1
-
-        # Find the length of the shortest cycle amount
-        cycle_length = len(cycle_start)
-
-        if cycle_length == len(df1.index):
-            return None, None
-
-        # Divide the data into cycles
-        cycles1 = [df1[cycle_start[i]:cycle_start[i+1]] if i < cycle_length - 1 else df1[cycle_start[i]:] for i in range(cycle_length)]
-        cycles2 = [ None for _ in range(cycle_length)]
-
-        if df2 is not None:
-            cycles2 = [df2[cycle_start[i]:cycle_start[i+1]] if i < cycle_length - 1 else df2[cycle_start[i]:] for i in range(cycle_length)]
-        return cycles1, cycles2
-
-    def get_limits(self, df, name):
-        min_min = df.iloc[0][name]
-        max_max = df.iloc[1][name]
-        return min_min, max_max
-
-    def evaluation(self, file):
-        col_infusion = []
-        col_injection = []
-        col_error_infusion = []
-        col_error_injection = []
-        oneport = False
+        self.infusion_filter_entry = QLineEdit(infusion_filter)
+        layout.addRow('Infusion filter:', self.infusion_filter_entry)
 
-        try:
-            file_path = os.path.join(self.measurments_folder_path, file[0])
-            df = pd.read_excel(file_path, engine='openpyxl')
-
-            if not set(['Infusion']).issubset(df.columns):
-                self.info_text.insertPlainText(f'This file ({file[0]}) is beyond my capabilities.\nSorry it\'s my first day coding.! 👍\n')
-                self.broken.emit()
-                return
-
-            if not set(['Injection']).issubset(df.columns):
-                self.info_text.insertPlainText(f'One Port file ({file[0]}) detected.\n')
-                oneport = True
-
-            limits = [self.get_limits(df, 'Infusion'), self.get_limits(df, 'Injection') if not oneport else (0, 0)]
-            infusion, injection = self.calc_cycles(df['Infusion'], df['Injection'] if not oneport else None)
-
-            if not infusion or (not injection and not oneport):
-                self.info_text.insertPlainText('Phu you filtered the shi* out of the Cycle values.\n')
-                self.broken.emit()
-                return
-
-            # Add maximum values to result array
-            for (infusion, injection) in zip(infusion, injection):
-                infusion_max = max(infusion)
-                append_infusion = infusion_max >= float(self.infusion_filter_entry.text().replace(',','.'))
-
-                append_injection = False
-                injection_max = 0
-                if injection is not None:
-                    injection_max = max(injection)
-                    append_injection = injection_max >= float(self.injection_filter_entry.text().replace(',','.'))
-
-                if append_infusion or append_injection:
-                    col_infusion.append(infusion_max)
-                    col_injection.append(injection_max)
-
-                if append_infusion and not append_injection:
-                    col_error_infusion.append(False)
-                    col_error_injection.append(True)
-                elif append_injection and not append_infusion:
-                    col_error_injection.append(False)
-                    col_error_infusion.append(True)
-                elif append_infusion and append_injection:
-                    col_error_infusion.append(False)
-                    col_error_injection.append(False)
-
-            if len(col_infusion) == 0:
-                self.info_text.insertPlainText('Phu you filtered the shi* out of the Infusion values.\n')
-                self.broken.emit()
-                return
-
-            if len(col_injection) == 0:
-                self.info_text.insertPlainText('Phu you filtered the shi* out of the Injection values.\n')
-                self.broken.emit()
-                return
-
-            if all(col_error_injection) is True and not oneport:
-                self.info_text.insertPlainText(f'\nWarning: No injection measurements found. One Port file ({file[0]}) detected.\n\n')
-                oneport = True
-
-            if len(col_infusion) > 15:
-                self.info_text.insertPlainText(f"\nWarning: More than 15 measurements found on file \"{file[0]}\".\nThe handover from 3T to 2F could have triggered a new cycle. Adjust the filters to remove unwanted measurements.\n\n")
-
-            self.df_output = pd.DataFrame(list(zip(col_infusion, col_injection, col_error_infusion, col_error_injection)))
-            self.df_output.columns =['Infusion', 'Injection', 'Error Infusion', 'Error Injection']
-            self.output_file_data = (file[0], self.df_output, limits, oneport)
-
-            mutex.lock()
-            self.addData.emit(self.output_file_data)
-            mutex.unlock()
-            self.finished.emit()
-        
-        except InvalidFileException:
-            self.info_text.insertPlainText(f'\nError: File "{file[0]}" is not an Excel file or cant be read!\n\n')
-            mutex.lock()
-            self.terminated.emit(True)
-            self.broken.emit()
-            mutex.unlock()
-        except Exception as e:
-            if str(e) == 'File is not a zip file':
-                self.info_text.insertPlainText(f'\nError: File "{file[0]}" is not an Excel file or cant be read!\n\n')
-            else:
-                self.info_text.insertPlainText(f'\nError: File "{file[0]}" abort with exception:\n{e}\n\n')
-            mutex.lock()
-            self.terminated.emit(True)
-            self.broken.emit()
-            mutex.unlock()
+        self.injection_filter_entry = QLineEdit(injection_filter)
+        layout.addRow('Injection filter:', self.injection_filter_entry)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def get_ranges(self):
+        from sweep import parse_range
+
+        return (parse_range(self.cycle_filter_entry.text()),
+                parse_range(self.infusion_filter_entry.text()),
+                parse_range(self.injection_filter_entry.text()))
 
 
 class Window(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setupUi()
-        self.threads = []
+        # Results, messages and the progress of the workers are handled once per frame
+        self.event_bus = EventBus(self)
+        self.event_bus.drained.connect(self.process_events)
+        self.scheduler = EvaluationScheduler(parent=self)
+        self.scheduler.resultReady.connect(lambda result: self.event_bus.post(RESULT, result.name, result))
+        self.scheduler.finished.connect(lambda: self.event_bus.post(FINISHED, None))
+        self.measurement_cache = MeasurementCache()
+        self.live_evaluation = LiveEvaluation()
+        self.selected_files = []
+        self.batch_files = []
+        self.skipped_failed = 0
+        self.cancelled = False
+        self.watch_queue = set()
+        # Batches started by the folder watcher report their export without a dialog
+        self.watch_batch = False
+        self.count_finished = 0
+        self.expected_rows = {}
+        self.rows_done = {}
         self.output_file = ''
         self.output_file_data = []
+        self.timings = []
+        self.sources = {}
+        self.export_manifest = None
+        self.evaluation_settings = None
         self.min_max_data = []
-        self.measurment_files = []
         self.measurments_folder_path = None
         self.count_terminated = None
 
@@ -253,45 +167,59 @@ class Window(QMainWindow):
 
     def update_measurments_folder(self):
         self.measurments_folder_path = self.measurments_folder_entry.text()
-        if os.path.exists(self.measurments_folder_path):
-            self.show_measurment_files()
+        if self.watch_action.isChecked():
+            self.watch_action.setChecked(False)
+        # Rescan once typing pauses
+        self.scan_timer.start()
 
     def update_output_file(self):
         self.output_file = self.output_file_entry.text()
 
     def show_measurment_files(self):
+        self.scan_timer.stop()
         if not self.measurments_folder_path:
             self.info_text.insertPlainText('No source folder selected!\n')
             return
+        self.folder_scanner.scan(str(self.measurments_folder_path))
 
-        for file in self.measurment_files:
-            file[1].setParent(None)
-        self.measurment_files = []
+    def scan_measurments_folder(self):
+        if self.measurments_folder_path and os.path.isdir(self.measurments_folder_path):
+            self.folder_scanner.scan(str(self.measurments_folder_path))
 
-        try:
-            for file in os.listdir(path=str(self.measurments_folder_path)):
-                if Path(file).suffix == '.xlsx' and 'result' not in file.lower() and file[:1] != '.':
-                    self.file_area.show()
-                    self.select_none.show()
-                    self.select_all.show()
-                    self.setMinimumHeight(500)
-                    checkbox = QCheckBox(file)
-                    self.measurment_files.append((file, checkbox))
-                    self.file_layout.addWidget(checkbox)
-        except Exception:
-            # Dir does not exist
-            pass
-
-        if not self.measurment_files:
-            self.select_none.hide()
-            self.select_all.hide()
-            self.file_area.hide()
-            self.setMinimumHeight(250)
-            self.resize(800,250)
+    def set_measurment_files(self, folder, files):
+        if folder != str(self.measurments_folder_path):
+            return
+        self.file_model.set_files(folder, files)
+
+        if files:
+            self.file_filter_entry.show()
+            self.file_view.show()
+            self.select_none.show()
+            self.select_all.show()
+            self.setMinimumHeight(500)
+        else:
+            self.clear_measurment_files()
+
+    def set_measurment_headers(self, folder, headers):
+        self.file_model.set_headers(folder, headers)
+
+    def clear_measurment_files(self, folder=None):
+        # Dir does not exist
+        self.file_model.set_files(folder, [])
+        self.select_none.hide()
+        self.select_all.hide()
+        self.file_filter_entry.hide()
+        self.file_view.hide()
+        self.setMinimumHeight(250)
+        self.resize(800,250)
+
+    def visible_measurment_files(self):
+        # File names in the sort order and filter of the view
+        return [self.file_model.name(self.file_proxy.mapToSource(self.file_proxy.index(row, 0)).row())
+                for row in range(self.file_proxy.rowCount())]
 
     def select_measurment_files(self, state):
-        for file in self.measurment_files:
-            file[1].setChecked(state)
+        self.file_model.set_checked(self.visible_measurment_files(), state)
 
     def select_all_measurment_files(self):
         self.select_measurment_files(True)
@@ -300,10 +228,22 @@ class Window(QMainWindow):
         self.select_measurment_files(False)
 
     def write_to_excel(self):
-        writer = ExportExcel(self.output_file_data, f'{self.output_file}.xlsx', self.info_text, LANGUAGE)
-        writer.write_to_excel()
+        from export_excel import ExportExcel, get_language
+
+        timed = self.timings_action.isChecked()
+        timer = PhaseTimer() if timed else NULL_TIMER
+        writer = ExportExcel(self.output_file_data, f'{self.output_file}.xlsx', self.info_text.insertPlainText, get_language(),
+                             timer, self.timings if timed else None,
+                             self.static_export_action.isChecked(), self.charts_action.isChecked(),
+                             self.sources, self.evaluation_settings)
+        if self.export_manifest is not None:
+            writer.update_excel(self.export_manifest)
+        else:
+            writer.write_to_excel()
         self.prog_bar.setValue(100)
         self.info_text.insertPlainText(f'File was saved at\n{self.output_file}.xlsx')
+        if timed:
+            self.show_timings(sum(timer.phases.values()))
 
         title = 'Export successfully!'
         text = 'Export successfully!'
@@ -315,6 +255,10 @@ class Window(QMainWindow):
             buttonText= 'Open export anyway'
             icon = QMessageBox.Icon.Warning
 
+        if self.watch_batch:
+            # New files can arrive one after the other, a dialog for each of them would block the window
+            self.statusBar().showMessage(f'{text} {self.output_file}.xlsx')
+            return
         self.msg_box(title=title,
                      text=text,
                      buttonText=buttonText,
@@ -322,100 +266,333 @@ class Window(QMainWindow):
                      buttonClick=lambda _, path=QUrl.fromLocalFile(f'{self.output_file}.xlsx'): QDesktopServices.openUrl(path))
 
     def show_measurments(self):
-        for name, df, _, oneport in self.output_file_data:
-            df.index += 1
-            if oneport:
-                df.drop(['Injection', 'Error Injection'], axis=1, inplace=True)
-            self.info_text.insertHtml(f"<p style='font-family:Verdana;font-weight:bold;'>{name}</p>\n")
-            self.info_text.insertPlainText(f'\n{df}\n')
-    
-    def add_data_output(self, data=None):
-        if data:
-            self.output_file_data.append(data)
-
-        step = 100/len(self.threads)/3*2
-        step += self.prog_bar.value()
-        self.prog_bar.setValue(int(step))
-        self.prog_bar.show()
-
-        if self.count_terminated != 0:
+        # The table reads the result arrays directly, nothing is copied or converted to text
+        self.result_view.set_results(self.output_file_data)
+        self.result_view.setVisible(bool(self.output_file_data))
+
+    def process_events(self, events):
+        texts = []
+        for kind, name, value in events:
+            if kind == ROWS:
+                # Progress of a file that already has its result may arrive late from a process
+                if name in self.expected_rows and self.rows_done.get(name, 0) < self.expected_rows[name]:
+                    self.rows_done[name] = min(value, self.expected_rows[name] - 1)
+            elif kind == MESSAGE:
+                texts.append(value)
+            elif kind == RESULT:
+                texts.extend(value.messages)
+                self.add_data_output(value)
+            elif kind == FINISHED:
+                self.info_text.insertPlainText(''.join(texts))
+                texts = []
+                self.evaluation_finished()
+
+        if texts:
+            self.info_text.insertPlainText(''.join(texts))
+        if self.scheduler.is_running():
+            total = sum(self.expected_rows.values())
+            self.prog_bar.setValue(int(100*sum(self.rows_done.values())/total) if total else 100)
+
+    def add_data_output(self, result):
+        if result.cancelled:
+            return
+        if result.measurement is not None:
+            self.live_evaluation.add(result.name, result.measurement)
+        if result.data:
+            # A changed file replaces its earlier result
+            self.output_file_data = [data for data in self.output_file_data if data[0] != result.name]
+            self.output_file_data.append(result.data)
+        if result.timings:
+            self.timings.append(result.timings)
+        if result.failed:
+            self.count_terminated += 1
             self.info_text.setMaximumSize(1920,850)
             self.resize(800,650)
 
-        if len(self.threads) - self.count_terminated == len(self.output_file_data):
-            if self.output_file:
-                self.write_to_excel()
-            else:
-                self.show_measurments()
-            self.prog_bar.hide()
-            self.evaluate_button.show()
+        self.count_finished += 1
+        if result.name in self.expected_rows:
+            self.rows_done[result.name] = self.expected_rows[result.name]
+
+    def evaluation_finished(self):
+        # Results arrive in completion order, keep the order of the file list
+        order = {name: index for index, name in enumerate(self.selected_files)}
+        self.output_file_data.sort(key=lambda data: order[data[0]])
+        self.timings.sort(key=lambda record: order[record['file']])
+
+        if self.output_file:
+            self.write_to_excel()
+        else:
+            self.show_measurments()
+            if self.timings_action.isChecked():
+                self.show_timings()
+        if self.cancelled:
+            self.info_text.insertPlainText(f'\nEvaluation cancelled, {self.count_finished} of {len(self.batch_files)} files evaluated.\n')
+            self.cancelled = False
+        self.prog_bar.hide()
+        self.cancel_button.hide()
+        self.evaluate_button.show()
+
+        # Files that changed while the last batch was running
+        if self.watch_queue:
+            files = list(self.watch_queue)
+            self.watch_queue.clear()
+            self.evaluate_new_files(files)
+
+    def show_timings(self, export_seconds=None):
+        self.info_text.setMaximumSize(1920,850)
+        self.resize(800,650)
+        self.info_text.insertPlainText(summary(self.timings, export_seconds))
 
     def startThreads(self):
-        self.threads.clear()
+        if self.scheduler.is_running():
+            return
+
+        # A filter that is empty or still being typed can't be evaluated, nothing is reset
+        try:
+            self.get_settings()
+        except ValueError:
+            self.info_text.setPlainText('Invalid filter, please check the filter values!\n')
+            return
+
+        self.watch_batch = False
         self.output_file_data = []
+        self.timings = []
+        self.live_evaluation.clear()
+        self.result_view.set_results([])
+        self.result_view.hide()
         self.info_text.setPlainText('')
         self.count_terminated = 0
+        self.count_finished = 0
 
         if not self.measurments_folder_path:
             self.info_text.insertPlainText('No source folder selected!\n')
             self.evaluate_button.show()
             return
 
-        if sum([1 for file in self.measurment_files if file[1].isChecked()]) == 0:
+        # Every checked file is evaluated, files hidden by the filter come after the visible ones
+        visible = self.visible_measurment_files()
+        shown = set(visible)
+        hidden = [file.name for file in self.file_model.files if file.name not in shown]
+        self.selected_files = [file for file in visible + hidden if file in self.file_model.checked]
+        if not self.selected_files:
             self.info_text.insertPlainText('No data source selected!\n')
             self.evaluate_button.show()
             return
-        
+
         self.info_text.setPlainText('')
-        output = False
+        count_hidden = len([file for file in hidden if file in self.file_model.checked])
+        if count_hidden:
+            self.info_text.insertPlainText(f'{count_hidden} checked files hidden by the filter are evaluated too.\n')
+        files = self.selected_files
+        self.sources = self.source_infos(files)
+        self.export_manifest = None
+        if self.output_file and self.update_export_action.isChecked():
+            from export_update import read_manifest, stale_files, settings_key
+            from export_excel import get_language
+
+            # Files whose sheet in the result file is still up to date are not evaluated again
+            self.export_manifest = read_manifest(f'{self.output_file}.xlsx')
+            if self.export_manifest is not None:
+                key = settings_key(self.get_settings(), get_language(),
+                                   self.static_export_action.isChecked(), self.charts_action.isChecked())
+                files = stale_files(self.export_manifest, files, self.sources, key)
+                self.info_text.insertPlainText(f'{len(files)} of {len(self.selected_files)} files changed since the last export.\n')
+        self.run_evaluation(self.skip_invalid_files(files))
+
+    def source_infos(self, files):
+        from export_update import source_info
+
+        sources = {}
+        for file in files:
+            try:
+                sources[file] = source_info(os.path.join(self.measurments_folder_path, file))
+            except OSError:
+                pass
+        return sources
+
+    def run_evaluation(self, files):
         if self.output_file:
-            output = True
             self.info_text.setMaximumSize(1920,60)
             self.resize(800,450)
         else:
             self.info_text.setMaximumSize(1920,850)
             self.resize(800,650)
 
-        self.threads = [
-            self.createThread(file, output)
-            for file in self.measurment_files if file[1].isChecked()
-        ]
-
-        step = 100/len(self.threads)/3*len(self.threads)
-        for thread in self.threads:
-            self.evaluate_button.hide()
-            self.prog_bar.setValue(0)
-            thread.start()
-            self.prog_bar.setValue(int(step))
-            self.prog_bar.show()
-
-    def createThread(self, file, output):
-        thread = QThread()
-        worker = MeasurmentTask(self.info_text,
-                                self.cycle_filter_entry,
-                                self.measurments_folder_path,
-                                self.infusion_filter_entry,
-                                self.injection_filter_entry,
-                                output
-                                )
-        worker.moveToThread(thread)
-        thread.started.connect(lambda: worker.evaluation(file))
-        worker.broken.connect(lambda: self.kill_thread(thread))
-        worker.terminated.connect(self.count_terminated_threads)
-        worker.addData.connect(self.add_data_output)
-        worker.finished.connect(thread.terminate)
-        worker.finished.connect(worker.deleteLater)
-        thread.finished.connect(thread.deleteLater)
-        return thread
-    
-    def count_terminated_threads(self, status):
-        if status:
-            self.count_terminated += 1
-            self.add_data_output()
-    
-    def kill_thread(self, thread):
-        if thread in self.threads:  # Check if the thread is in the list of threads
-            thread.terminate()
+        self.batch_files = files
+        self.count_terminated = self.skipped_failed
+        self.count_finished = 0
+
+        # Progress is measured in rows, known from the header sniffing or estimated from the file size
+        headers = self.file_model.headers()
+        sizes = {file.name: file.size for file in self.file_model.files}
+        self.expected_rows = {file: estimate_rows(headers.get(file), sizes.get(file, 0)) for file in files}
+        self.rows_done = {}
+        self.evaluate_button.hide()
+        self.prog_bar.setValue(0)
+        self.prog_bar.show()
+        self.cancel_button.show()
+        self.cancelled = False
+
+        self.scheduler.workers = self.workers_entry.value()
+        self.scheduler.mode = self.worker_mode_combo.currentData()
+        self.scheduler.prefetch_bytes = PREFETCH_BYTES if self.prefetch_action.isChecked() else 0
+        cache = self.measurement_cache if self.cache_action.isChecked() else None
+        self.evaluation_settings = self.get_settings()
+        self.scheduler.start(self.measurments_folder_path, files, self.evaluation_settings, cache,
+                             self.timings_action.isChecked(), self.event_bus.channel(self.scheduler.mode))
+
+    def cancel_evaluation(self):
+        if not self.scheduler.is_running():
+            return
+        # Results finished so far are kept and shown or exported as usual
+        self.cancelled = True
+        self.watch_queue.clear()
+        self.scheduler.cancel()
+
+    def toggle_watch(self, enabled):
+        if not enabled:
+            self.folder_watcher.stop()
+            return
+
+        folder = str(self.measurments_folder_path or '')
+        if not os.path.isdir(folder):
+            self.watch_action.setChecked(False)
+            self.info_text.insertPlainText('No source folder selected!\n')
+            return
+        files = self.file_model.files if self.file_model.folder == folder else scan_folder(folder)
+        self.folder_watcher.start(folder, files)
+        self.info_text.insertPlainText(f'Watching {folder} for new measurements.\n')
+
+    def evaluate_new_files(self, files):
+        # New files are selected and evaluated on their own, their results are merged into the last results
+        self.file_model.set_checked(files, True)
+        if self.scheduler.is_running():
+            self.watch_queue.update(files)
+            return
+
+        try:
+            self.get_settings()
+        except ValueError:
+            self.info_text.insertPlainText('Invalid filter, new measurements are not evaluated!\n')
+            return
+
+        self.selected_files = self.selected_files + [file for file in files if file not in self.selected_files]
+        self.sources.update(self.source_infos(files))
+        self.watch_batch = True
+        self.info_text.setPlainText(f'Evaluating {len(files)} new or changed files.\n')
+        self.run_evaluation(self.skip_invalid_files(files))
+
+    def skip_invalid_files(self, files):
+        # Files found invalid at scan time are reported right away and never reach a worker
+        headers = self.file_model.headers()
+        valid = []
+        self.skipped_failed = 0
+        for file in files:
+            header = headers.get(file)
+            if header is None or header.valid:
+                valid.append(file)
+                continue
+            result = skipped_result(file, header)
+            self.event_bus.post(MESSAGE, file, ''.join(result.messages))
+            self.skipped_failed += result.failed
+        return valid
+
+    def live_update(self):
+        # Re-evaluate the signals kept from the last run, files are not read again
+        if self.scheduler.is_running() or not self.live_evaluation.measurements:
+            return
+
+        try:
+            settings = self.get_settings()
+        except ValueError:
+            # Filter is still being typed
+            return
+
+        previous = {data[0]: data for data in self.output_file_data}
+        self.output_file_data = []
+        self.info_text.setPlainText('')
+        for name in self.selected_files:
+            if name in self.live_evaluation:
+                result = self.live_evaluation.evaluate(name, settings)
+                self.info_text.insertPlainText(''.join(result.messages))
+                if result.data:
+                    self.output_file_data.append(result.data)
+            elif name in previous:
+                # Streamed files keep no signal, their cycles only change with another evaluation
+                self.info_text.insertPlainText(f'File ({name}) is too large to update live, evaluate it again.\n')
+                self.output_file_data.append(previous[name])
+        self.show_measurments()
+
+    def get_settings(self):
+        return EvaluationSettings(float(self.cycle_filter_entry.text().replace(',','.')),
+                                  float(self.infusion_filter_entry.text().replace(',','.')),
+                                  float(self.injection_filter_entry.text().replace(',','.')),
+                                  *self.get_cycle_detection())
+
+    def get_cycle_detection(self):
+        detection = self.cycle_detection_combo.currentData()
+        # The validators let half typed values like "," through, the callers report the ValueError
+        try:
+            hysteresis = float(self.hysteresis_entry.text().replace(',','.') or 0)
+            min_dwell = int(self.min_dwell_entry.text() or 1)
+        except ValueError:
+            raise ValueError('Invalid hysteresis or minimum dwell') from None
+        if hysteresis < 0 or min_dwell < 1:
+            raise ValueError('Invalid hysteresis or minimum dwell')
+        return detection, hysteresis, min_dwell
+
+    def update_cycle_detection(self):
+        edge = self.cycle_detection_combo.currentData() == EDGE
+        self.hysteresis_entry.setEnabled(edge)
+        self.min_dwell_entry.setEnabled(edge)
+
+    def closeEvent(self, event):
+        self.folder_watcher.stop()
+        self.scheduler.shutdown()
+        super().closeEvent(event)
+
+    def run_sweep(self):
+        if self.scheduler.is_running() or not self.live_evaluation.measurements:
+            self.msg_box('Threshold sweep', 'Evaluate the measurements first, the sweep reuses their signals.')
+            return
+
+        dialog = SweepDialog(self.cycle_filter_entry.text(),
+                             self.infusion_filter_entry.text(),
+                             self.injection_filter_entry.text(),
+                             self)
+        if not dialog.exec():
+            return
+
+        try:
+            cycle_filters, infusion_filters, injection_filters = dialog.get_ranges()
+            detection, hysteresis, min_dwell = self.get_cycle_detection()
+        except ValueError as e:
+            self.msg_box('Threshold sweep', f'Error: {e}', icon=QMessageBox.Icon.Warning)
+            return
+
+        file_path = QFileDialog.getSaveFileName(self, 'Export Sweep', '2F_plugin_depth_sweep', 'Excel files (*.xlsx);;CSV files (*.csv)', options=QFileDialog.Option.DontUseNativeDialog)[0]
+        if not file_path:
+            return
+
+        measurements = {name: self.live_evaluation.measurements[name] for name in self.selected_files if name in self.live_evaluation}
+
+        QApplication.setOverrideCursor(QCursor(Qt.CursorShape.WaitCursor))
+        try:
+            from sweep import sweep
+
+            table = sweep(measurements, cycle_filters, infusion_filters, injection_filters, detection, hysteresis, min_dwell)
+            if file_path.endswith('.csv'):
+                table.to_csv(file_path, index=False)
+            else:
+                file_path = file_path if file_path.endswith('.xlsx') else f'{file_path}.xlsx'
+                table.to_excel(file_path, sheet_name='Sweep', index=False)
+        except Exception as e:
+            self.info_text.insertPlainText(f'Error: {e}\n')
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        self.info_text.insertPlainText(f'{len(table)} filter combinations saved at\n{file_path}\n')
 
     def show_info(self):
         self.msg_box('About', 
@@ -441,8 +618,31 @@ class Window(QMainWindow):
         self.setMinimumWidth(800)
         self.setMinimumHeight(250)
 
+        self.settings = QSettings('jkfres', '2F plug in depth evaluation')
+
         self.measurments_folder_path = []
-        self.measurment_files = []
+
+        # Folders are listed in a background thread once the path stops changing
+        self.header_index = {}
+        self.folder_scanner = FolderScanner(self, self.header_index)
+        self.folder_scanner.scanned.connect(self.set_measurment_files)
+        self.folder_scanner.sniffed.connect(self.set_measurment_headers)
+        self.folder_scanner.failed.connect(self.clear_measurment_files)
+        self.scan_timer = QTimer(self)
+        self.scan_timer.setSingleShot(True)
+        self.scan_timer.setInterval(300)
+        self.scan_timer.timeout.connect(self.scan_measurments_folder)
+
+        self.folder_watcher = FolderWatcher(self, self.header_index)
+        self.folder_watcher.listed.connect(self.set_measurment_files)
+        self.folder_watcher.scanner.sniffed.connect(self.set_measurment_headers)
+        self.folder_watcher.filesReady.connect(self.evaluate_new_files)
+
+        # Debounce the live update while the filters are edited
+        self.live_update_timer = QTimer(self)
+        self.live_update_timer.setSingleShot(True)
+        self.live_update_timer.setInterval(150)
+        self.live_update_timer.timeout.connect(self.live_update)
 
         self.validator_float = QDoubleValidator(0.000, 10.000, 3)
         self.validator_float.setNotation(QDoubleValidator.Notation.StandardNotation)
@@ -486,6 +686,55 @@ class Window(QMainWindow):
         evaluate_action.setStatusTip("Evaluate")
         evaluate_action.triggered.connect(self.startThreads)
 
+        cancel_action = QAction("Cancel Evaluation", self)
+        cancel_action.setShortcut("Esc")
+        cancel_action.setStatusTip("Stop the running evaluation and keep the results finished so far")
+        cancel_action.triggered.connect(self.cancel_evaluation)
+
+
+        self.watch_action = QAction("Watch Folder", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.setStatusTip("Evaluate new and changed measurements as soon as they appear in the folder")
+        self.watch_action.toggled.connect(self.toggle_watch)
+
+        self.cache_action = QAction("Cache Measurements", self)
+        self.cache_action.setCheckable(True)
+        self.cache_action.setChecked(True)
+        self.cache_action.setStatusTip("Keep parsed measurements on disk to skip reading unchanged files again")
+
+        self.prefetch_action = QAction("Read Files Ahead", self)
+        self.prefetch_action.setCheckable(True)
+        self.prefetch_action.setChecked(True)
+        self.prefetch_action.setStatusTip("Read the next files into memory while earlier ones are evaluated, faster on network drives")
+
+        clear_cache_action = QAction("Clear Cache", self)
+        clear_cache_action.setStatusTip("Remove all cached measurements")
+        clear_cache_action.triggered.connect(lambda: self.measurement_cache.clear())
+
+        self.timings_action = QAction("Record Timings", self)
+        self.timings_action.setCheckable(True)
+        self.timings_action.setStatusTip("Time reading, cycle detection and export of every file and show a summary after the evaluation")
+
+        self.static_export_action = QAction("Static Export", self)
+        self.static_export_action.setCheckable(True)
+        self.static_export_action.setStatusTip("Export computed values instead of formulas and conditional formatting, the result opens faster")
+
+        self.update_export_action = QAction("Update Export", self)
+        self.update_export_action.setCheckable(True)
+        self.update_export_action.setStatusTip("Only evaluate files that changed since the result file was written and replace just their sheets")
+
+        self.charts_action = QAction("Charts in Export", self)
+        self.charts_action.setCheckable(True)
+        self.charts_action.setChecked(True)
+        self.charts_action.setStatusTip("Add a chart to every sheet of the export")
+
+        self.update_check_action = QAction("Check for Updates", self)
+        self.update_check_action.setCheckable(True)
+        self.update_check_action.setStatusTip("Check once a day for a new release on startup")
+
+        sweep_action = QAction("Threshold Sweep", self)
+        sweep_action.setStatusTip("Evaluate ranges of filter values on the last evaluated measurements")
+        sweep_action.triggered.connect(self.run_sweep)
 
         about_action = QAction('About', self)
         about_action.setStatusTip('Show info')
@@ -503,7 +752,20 @@ class Window(QMainWindow):
         file_menu.addSeparator()
         file_menu.addAction(select_output_action)
         file_menu.addAction(evaluate_action)
+        file_menu.addAction(cancel_action)
+        file_menu.addAction(self.watch_action)
+        file_menu.addAction(sweep_action)
         file_menu.addSeparator()
+        file_menu.addAction(self.cache_action)
+        file_menu.addAction(self.prefetch_action)
+        file_menu.addAction(clear_cache_action)
+        file_menu.addAction(self.timings_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.update_export_action)
+        file_menu.addAction(self.static_export_action)
+        file_menu.addAction(self.charts_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.update_check_action)
         file_menu.addAction(about_action)
         file_menu.addAction(exit_action)
 
@@ -524,19 +786,39 @@ class Window(QMainWindow):
         self.folder_scan_button = QPushButton('Scan', clicked=self.show_measurment_files) # type: ignore
         layout_measurments_folder.addWidget(self.folder_scan_button)
 
-        # ScrollArea Measurments selection
-        self.file_area = QScrollArea()
-        self.file_area.setWidgetResizable(True)
-        self.file_area.setMinimumSize(300,200)
-        self.file_area.setMaximumSize(1920,550)
-        self.file_area.hide()
-
-        file_widget = QWidget()
-        self.file_area.setWidget(file_widget)
-        upper_layout.addWidget(self.file_area)
-
-        self.file_layout = QVBoxLayout()
-        file_widget.setLayout(self.file_layout)
+        # Measurments selection, the view only draws the visible rows
+        self.file_filter_entry = QLineEdit()
+        self.file_filter_entry.setPlaceholderText('Filter files')
+        self.file_filter_entry.setClearButtonEnabled(True)
+        self.file_filter_entry.hide()
+        upper_layout.addWidget(self.file_filter_entry)
+
+        self.file_model = MeasurementFileModel(self)
+        self.file_proxy = QSortFilterProxyModel(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        self.file_proxy.setSortRole(Qt.ItemDataRole.UserRole)
+        self.file_proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.file_proxy.setFilterKeyColumn(0)
+        self.file_filter_entry.textChanged.connect(self.file_proxy.setFilterFixedString)
+
+        self.file_view = QTableView()
+        self.file_view.setModel(self.file_proxy)
+        self.file_view.setSortingEnabled(True)
+        self.file_view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.file_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.file_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.file_view.setShowGrid(False)
+        self.file_view.verticalHeader().hide()
+        self.file_view.verticalHeader().setDefaultSectionSize(22)
+        self.file_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.file_view.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        self.file_view.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.file_view.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
+        self.file_view.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
+        self.file_view.setMinimumSize(300,200)
+        self.file_view.setMaximumSize(1920,550)
+        self.file_view.hide()
+        upper_layout.addWidget(self.file_view)
 
         self.file_select_buttons_layout = QHBoxLayout()
         self.file_select_buttons_layout.addSpacing(20)
@@ -570,6 +852,7 @@ class Window(QMainWindow):
         filter_layout.addWidget(self.cycle_filter_entry)
         self.cycle_filter_entry.setValidator(self.validator_float)
         self.cycle_filter_entry.setText('0,01')
+        self.cycle_filter_entry.textChanged.connect(lambda: self.live_update_timer.start())
 
         infusion_filter_label = QLabel('Infusion filter:')
         filter_layout.addWidget(infusion_filter_label)
@@ -578,6 +861,7 @@ class Window(QMainWindow):
         filter_layout.addWidget(self.infusion_filter_entry)
         self.infusion_filter_entry.setValidator(self.validator_float)
         self.infusion_filter_entry.setText('0,2')
+        self.infusion_filter_entry.textChanged.connect(lambda: self.live_update_timer.start())
 
         injection_layout = QHBoxLayout()
         layout.addLayout(injection_layout)
@@ -589,6 +873,61 @@ class Window(QMainWindow):
         filter_layout.addWidget(self.injection_filter_entry)
         self.injection_filter_entry.setValidator(self.validator_float)
         self.injection_filter_entry.setText('0,1')
+        self.injection_filter_entry.textChanged.connect(lambda: self.live_update_timer.start())
+
+        detection_layout = QHBoxLayout()
+        upper_layout.addLayout(detection_layout)
+
+        cycle_detection_label = QLabel('Cycle detection:')
+        detection_layout.addWidget(cycle_detection_label)
+
+        self.cycle_detection_combo = QComboBox()
+        self.cycle_detection_combo.addItem('Level', LEVEL)
+        self.cycle_detection_combo.addItem('Falling edge', EDGE)
+        self.cycle_detection_combo.setToolTip('Level: every sample below the cycle filter starts a new cycle.\n'
+                                              'Falling edge: only the transition below the cycle filter starts a new cycle.')
+        detection_layout.addWidget(self.cycle_detection_combo)
+        self.cycle_detection_combo.currentIndexChanged.connect(self.update_cycle_detection)
+        self.cycle_detection_combo.currentIndexChanged.connect(lambda: self.live_update_timer.start())
+
+        hysteresis_label = QLabel('Hysteresis:')
+        detection_layout.addWidget(hysteresis_label)
+
+        self.hysteresis_entry = QLineEdit()
+        detection_layout.addWidget(self.hysteresis_entry)
+        self.hysteresis_entry.setValidator(self.validator_float)
+        self.hysteresis_entry.setToolTip('The signal has to rise this far above the cycle filter before the next falling edge counts.')
+        self.hysteresis_entry.setText('0,0')
+        self.hysteresis_entry.textChanged.connect(lambda: self.live_update_timer.start())
+
+        min_dwell_label = QLabel('Min. dwell:')
+        detection_layout.addWidget(min_dwell_label)
+
+        self.min_dwell_entry = QLineEdit()
+        detection_layout.addWidget(self.min_dwell_entry)
+        self.min_dwell_entry.setValidator(QIntValidator(1, 1000000))
+        self.min_dwell_entry.setToolTip('Samples the signal has to stay below the cycle filter for a falling edge to count.')
+        self.min_dwell_entry.setText('1')
+        self.min_dwell_entry.textChanged.connect(lambda: self.live_update_timer.start())
+        self.update_cycle_detection()
+
+        workers_layout = QHBoxLayout()
+        upper_layout.addLayout(workers_layout)
+
+        workers_label = QLabel('Workers:')
+        workers_layout.addWidget(workers_label)
+
+        self.workers_entry = QSpinBox()
+        self.workers_entry.setRange(1, 256)
+        self.workers_entry.setValue(default_workers())
+        workers_layout.addWidget(self.workers_entry)
+
+        self.worker_mode_combo = QComboBox()
+        self.worker_mode_combo.addItem('Threads', THREAD)
+        self.worker_mode_combo.addItem('Processes', PROCESS)
+        self.worker_mode_combo.setToolTip('Processes parse the files in parallel on all cores, threads start faster.')
+        workers_layout.addWidget(self.worker_mode_combo)
+        workers_layout.addStretch()
 
         output_layout = QHBoxLayout()
         lower_layout.addLayout(output_layout)
@@ -609,38 +948,61 @@ class Window(QMainWindow):
         self.evaluate_button = QPushButton('Evaluate', clicked=self.startThreads) # type: ignore
         lower_layout.addWidget(self.evaluate_button)
 
+        progress_layout = QHBoxLayout()
+        lower_layout.addLayout(progress_layout)
+
         self.prog_bar = QProgressBar(self)
         self.prog_bar.setGeometry(50, 100, 250, 30)
         self.prog_bar.setValue(0)
-        lower_layout.addWidget(self.prog_bar)
+        progress_layout.addWidget(self.prog_bar)
         self.prog_bar.hide()
 
+        self.cancel_button = QPushButton('Cancel', clicked=self.cancel_evaluation) # type: ignore
+        progress_layout.addWidget(self.cancel_button)
+        self.cancel_button.hide()
+
+        self.result_view = ResultTableView()
+        self.result_view.setModel(ResultTableModel(self))
+        self.result_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectItems)
+        self.result_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.result_view.verticalHeader().hide()
+        self.result_view.verticalHeader().setDefaultSectionSize(22)
+        self.result_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.result_view.setMinimumSize(300,200)
+        self.result_view.setMaximumSize(1920,850)
+        self.result_view.hide()
+        lower_layout.addWidget(self.result_view)
+
         self.info_text = QTextEdit()
         self.info_text.setMinimumSize(300,60)
         self.info_text.setMaximumSize(1920,60)
         lower_layout.addWidget(self.info_text)
 
-        self.check_for_update()
+        # Check for updates in the background once the window is shown
+        self.update_checker = UpdateChecker(self.settings, self)
+        self.update_checker.latestRelease.connect(self.show_update)
+        self.update_check_action.setChecked(self.update_checker.enabled())
+        self.update_check_action.toggled.connect(self.update_checker.set_enabled)
+        QTimer.singleShot(0, self.update_checker.check)
 
-    def check_for_update(self):
-        try:
-            response = requests.get('https://api.github.com/repos/jkfres/2F-plug-in-depth-evaluation/releases')
-            if response.status_code != 200:
-                return
-
-            releases = response.json()
-            if not releases:
-                return
+    def show_update(self, tag):
+        if VERSION == 'DEV VERSION' or tag.lstrip('v') == VERSION:
+            return
 
-            if releases[0]['tag_name'] != VERSION and not 'DEV VERSION':
-                self.msg_box(title='Eine neue Version ist verfügbar!', text='Update verfügbar', icon=QMessageBox.Icon.Information, buttonText='Update herunterladen', buttonClick=lambda: QDesktopServices.openUrl(QUrl('https://github.com/jkfres/2F-plug-in-depth-evaluation/releases')))
-        except Exception:
-            pass
+        self.msg_box(title='Eine neue Version ist verfügbar!', text='Update verfügbar', icon=QMessageBox.Icon.Information, buttonText='Update herunterladen', buttonClick=lambda: QDesktopServices.openUrl(QUrl('https://github.com/jkfres/2F-plug-in-depth-evaluation/releases')))
 
 
 if __name__ == '__main__':
+    # Needed for the process pool in the frozen executable
+    multiprocessing.freeze_support()
+    startup_timing.mark('imports')
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(os.path.join(basedir,'files','icon.ico')))
+    startup_timing.mark('QApplication')
     window = Window()
+    startup_timing.mark('Window')
     window.show()
+    startup_timing.mark('show')
+    # The first event loop iteration paints the window
+    QTimer.singleShot(0, startup_timing.report)
     sys.exit(app.exec())
@@ -0,0 +1,77 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import progress
+from evaluation import evaluate_file, FileResult, STREAM_BYTES
+from timings import received
+from prefetch import Prefetcher, PREFETCH_BYTES
+
+THREAD = 'thread'
+PROCESS = 'process'
+
+# Files queued per worker, so the pool never runs dry but not every file is submitted at once
+QUEUE_DEPTH = 2
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def create_executor(workers, mode, channel=None, cancel=None):
+    executor = ProcessPoolExecutor if mode == PROCESS else ThreadPoolExecutor
+    if channel is None and cancel is None:
+        return executor(max_workers=workers)
+    # The workers post their progress into the channel and stop once cancel is set
+    return executor(max_workers=workers, initializer=progress.connect, initargs=(channel, cancel))
+
+
+def create_cancel_event(mode):
+    return multiprocessing.Event() if mode == PROCESS else threading.Event()
+
+
+def worker_failed(name, e):
+    # Only happens if the worker itself died, e.g. a killed process
+    return FileResult(name, messages=[f'\nError: File "{name}" abort with exception:\n{e}\n\n'], failed=True)
+
+
+def evaluate_files(folder, files, settings, workers=None, mode=PROCESS, cache=None, keep_measurement=False, timed=False,
+                   stream_bytes=STREAM_BYTES, prefetch_bytes=PREFETCH_BYTES):
+    workers = workers or default_workers()
+    pending = deque(files)
+    running = {}
+
+    # The files are read into memory ahead of the workers, reading and decoding overlap
+    prefetcher = Prefetcher(folder, files, prefetch_bytes, cache=cache, stream_bytes=stream_bytes) if prefetch_bytes else None
+
+    with create_executor(workers, mode) as executor, prefetcher or nullcontext():
+        while pending or running:
+            while pending and len(running) < workers * QUEUE_DEPTH and (prefetcher is None or prefetcher.ready()):
+                name = pending.popleft()
+                index, prefetched = prefetcher.take() if prefetcher else (None, None)
+                future = executor.submit(evaluate_file, folder, name, settings, cache, keep_measurement, timed, stream_bytes,
+                                         prefetched)
+                running[future] = name
+                if prefetcher:
+                    # The content is held until the worker is done with it
+                    future.add_done_callback(lambda future, index=index: prefetcher.release(index))
+
+            waiting = list(running)
+            if pending and len(running) < workers * QUEUE_DEPTH:
+                # The next file is still being read
+                waiting.append(prefetcher.next())
+            done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future, None)
+                if name is None:
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield worker_failed(name, e)
+                else:
+                    received(result.timings)
+                    yield result
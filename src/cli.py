@@ -0,0 +1,201 @@
+import os
+import sys
+import glob
+import argparse
+import multiprocessing
+
+from batch import evaluate_files, default_workers, THREAD, PROCESS
+from evaluation import EvaluationSettings, LEVEL, EDGE, STREAM_BYTES
+from export_excel import ExportExcel, get_language
+from measurement_cache import MeasurementCache, default_cache_dir, DEFAULT_MAX_BYTES
+from measurement_reader import is_measurement_file
+from prefetch import PREFETCH_BYTES
+from export_update import read_manifest, stale_files, source_info, settings_key
+from sweep import sweep, parse_range
+from timings import PhaseTimer, NULL_TIMER, merge_export, summary, write_json
+
+
+def decimal(value):
+    return float(value.replace(',', '.'))
+
+
+def find_measurement_files(paths, recursive=True):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    files.extend(os.path.join(root, name) for name in sorted(names) if is_measurement_file(name))
+            else:
+                files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if is_measurement_file(name))
+        else:
+            files.extend(file for file in sorted(glob.glob(path, recursive=recursive)) if is_measurement_file(file))
+
+    # Keep the first occurrence if paths overlap
+    return list(dict.fromkeys(files))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Evaluate 2F plug in depth measurements without the GUI.')
+    parser.add_argument('paths', nargs='+', help='Measurement folders or glob patterns like "data/**/*.xlsx"')
+    parser.add_argument('-o', '--output', help='Excel file to export the results to, otherwise the results are printed')
+    parser.add_argument('-j', '--jobs', type=int, default=default_workers(), help='Number of parallel workers (default: number of cores)')
+    parser.add_argument('--mode', choices=[PROCESS, THREAD], default=PROCESS, help='Run the workers as processes or threads')
+    parser.add_argument('--recursive', action=argparse.BooleanOptionalAction, default=True, help='Search folders recursively')
+    parser.add_argument('--cycle-filter', type=decimal, default=0.01)
+    parser.add_argument('--infusion-filter', type=decimal, default=0.2)
+    parser.add_argument('--injection-filter', type=decimal, default=0.1)
+    parser.add_argument('--detection', choices=[LEVEL, EDGE], default=LEVEL, help='Cycle detection mode')
+    parser.add_argument('--hysteresis', type=decimal, default=0.0, help='Hysteresis of the falling edge detection')
+    parser.add_argument('--min-dwell', type=int, default=1, help='Minimum samples below the cycle filter of the falling edge detection')
+    parser.add_argument('--sweep-cycle-filter', metavar='RANGE', help='Sweep the cycle filter, e.g. "0.005:0.02:0.005"')
+    parser.add_argument('--sweep-infusion-filter', metavar='RANGE', help='Sweep the infusion filter, e.g. "0.1:0.5:0.05"')
+    parser.add_argument('--sweep-injection-filter', metavar='RANGE', help='Sweep the injection filter, e.g. "0.05;0.1;0.2"')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=True, help='Cache parsed measurements on disk')
+    parser.add_argument('--cache-dir', help=f'Cache folder (default: {default_cache_dir()})')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // 1024**2, help='Cache size limit in MB')
+    parser.add_argument('--cache-hash', action='store_true', help='Also key the cache by a hash of the file content')
+    parser.add_argument('--stream-above', type=int, default=STREAM_BYTES // 1024**2, metavar='MB',
+                        help='Evaluate files from this size on block by block to save memory, 0 streams every file')
+    parser.add_argument('--prefetch', type=int, default=PREFETCH_BYTES // 1024**2, metavar='MB',
+                        help='Read upcoming files into memory while earlier ones are evaluated, up to this many MB (0: off)')
+    parser.add_argument('--timings', action='store_true', help='Time the phases of every file, print a summary and add a "Timings" sheet to the export')
+    parser.add_argument('--timings-json', metavar='FILE', help='Write the timings of every file to a JSON file')
+    parser.add_argument('--static', action='store_true', help='Export computed values and styled cells instead of formulas and conditional formatting, the file opens faster')
+    parser.add_argument('--charts', action=argparse.BooleanOptionalAction, default=True, help='Add a chart to every sheet of the export')
+    parser.add_argument('--update', action='store_true', help='Only evaluate files that changed since the existing output was written and replace just their sheets')
+    parser.add_argument('--language', help='Excel language of the export, e.g. de_DE (default: system language)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print errors')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = find_measurement_files(args.paths, args.recursive)
+    if not files:
+        print('No measurement files found!', file=sys.stderr)
+        return 2
+
+    settings = EvaluationSettings(args.cycle_filter,
+                                  args.infusion_filter,
+                                  args.injection_filter,
+                                  args.detection,
+                                  args.hysteresis,
+                                  args.min_dwell)
+
+    cache = None
+    if args.cache:
+        cache = MeasurementCache(args.cache_dir, args.cache_size * 1024**2, args.cache_hash)
+
+    if args.sweep_cycle_filter or args.sweep_infusion_filter or args.sweep_injection_filter:
+        return run_sweep(args, files, settings, cache)
+
+    language = args.language or get_language()
+    output_file = None
+    if args.output:
+        output_file = args.output if args.output.endswith('.xlsx') else f'{args.output}.xlsx'
+    sources = {name: source_info(name) for name in files}
+
+    # Files whose sheet in the output is still up to date are not evaluated again
+    manifest = read_manifest(output_file) if args.update and output_file else None
+    if manifest is not None:
+        total = len(files)
+        files = stale_files(manifest, files, sources, settings_key(settings, language, args.static, args.charts))
+        print(f'{len(files)} of {total} files changed since the last export.', file=sys.stderr)
+
+    timed = args.timings or bool(args.timings_json)
+    output_file_data = []
+    timings = []
+    failed = 0
+    results = evaluate_files('', files, settings, args.jobs, args.mode, cache, timed=timed,
+                             stream_bytes=args.stream_above * 1024**2, prefetch_bytes=args.prefetch * 1024**2)
+    for count, result in enumerate(results, 1):
+        if result.timings:
+            timings.append(result.timings)
+        if result.failed:
+            failed += 1
+        if result.messages and (result.failed or not args.quiet):
+            sys.stderr.write(''.join(result.messages))
+        if result.data:
+            output_file_data.append(result.data)
+        if not args.quiet:
+            print(f'[{count}/{len(files)}] {result.name}', file=sys.stderr)
+
+    order = {name: index for index, name in enumerate(files)}
+    output_file_data.sort(key=lambda data: order[data[0]])
+    timings.sort(key=lambda record: order[record['file']])
+
+    export_timer = PhaseTimer() if timed else NULL_TIMER
+    exported = True
+    if output_file:
+        writer = ExportExcel(output_file_data, output_file, sys.stderr.write, language,
+                             export_timer, timings if args.timings else None, args.static, args.charts,
+                             sources, settings)
+        if manifest is not None:
+            exported = writer.update_excel(manifest)
+        else:
+            exported = writer.write_to_excel()
+        if not exported:
+            print(f'File "{output_file}" was not saved.', file=sys.stderr)
+        elif not args.quiet:
+            print(f'File was saved at\n{output_file}', file=sys.stderr)
+    else:
+        for name, df, _, oneport in output_file_data:
+            if oneport:
+                df = df.drop(columns=['Injection', 'Error Injection'])
+            df = df.set_axis(df.index + 1)
+            print(f'{name}\n{df.to_string()}\n')
+
+    if timed:
+        # The export time of every sheet also goes into the JSON records without a "Timings" sheet
+        merge_export(timings, export_timer)
+        export_seconds = sum(export_timer.phases.values()) if args.output else None
+        if args.timings:
+            sys.stderr.write(summary(timings, export_seconds))
+        if args.timings_json:
+            write_json(args.timings_json, timings, export_seconds)
+
+    print(f'{len(output_file_data)} of {len(files)} files evaluated, {failed} failed.', file=sys.stderr)
+    return 1 if failed or not exported else 0
+
+
+def run_sweep(args, files, settings, cache):
+    try:
+        cycle_filters = parse_range(args.sweep_cycle_filter or str(args.cycle_filter))
+        infusion_filters = parse_range(args.sweep_infusion_filter or str(args.infusion_filter))
+        injection_filters = parse_range(args.sweep_injection_filter or str(args.injection_filter))
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+    # Every file is decoded once, all filter combinations are evaluated on the kept signals
+    measurements = {}
+    failed = 0
+    for result in evaluate_files('', files, settings, args.jobs, args.mode, cache, keep_measurement=True, stream_bytes=None,
+                                 prefetch_bytes=args.prefetch * 1024**2):
+        if result.failed:
+            failed += 1
+            sys.stderr.write(''.join(result.messages))
+        elif result.measurement is not None:
+            measurements[result.name] = result.measurement
+    measurements = {name: measurements[name] for name in files if name in measurements}
+
+    table = sweep(measurements, cycle_filters, infusion_filters, injection_filters,
+                  args.detection, args.hysteresis, args.min_dwell)
+
+    if not args.output:
+        print(table.to_string(index=False))
+    elif args.output.endswith('.csv'):
+        table.to_csv(args.output, index=False)
+    else:
+        output_file = args.output if args.output.endswith('.xlsx') else f'{args.output}.xlsx'
+        table.to_excel(output_file, sheet_name='Sweep', index=False)
+
+    print(f'{len(table)} combinations of {len(measurements)} files evaluated, {failed} failed.', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
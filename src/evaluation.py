@@ -0,0 +1,285 @@
+import os
+from typing import NamedTuple
+import numpy as np
+from measurement_cache import load_measurement
+from timings import PhaseTimer, NULL_TIMER
+from progress import row_reporter, check_cancelled, Cancelled
+
+# Samples at the start of a recording that belong to the limits and the settling phase
+SKIP_SAMPLES = 20
+
+# Files from this size on are evaluated block by block instead of holding every sample in memory
+STREAM_BYTES = 64 * 1024 * 1024
+
+# Cycle detection modes
+LEVEL = 'level'
+EDGE = 'edge'
+
+
+class EvaluationSettings(NamedTuple):
+    cycle_filter: float
+    infusion_filter: float
+    injection_filter: float
+    detection: str = LEVEL
+    hysteresis: float = 0.0
+    min_dwell: int = 1
+
+    def segmentation(self):
+        # Settings the cycle maxima depend on, the infusion/injection filter only apply afterwards
+        return (self.cycle_filter, self.detection, self.hysteresis, self.min_dwell)
+
+
+class FileResult(NamedTuple):
+    name: str
+    data: tuple = None
+    messages: tuple = ()
+    failed: bool = False
+    measurement: object = None
+    timings: dict = None
+    cancelled: bool = False
+
+
+class CycleMaxima(NamedTuple):
+    infusion: np.ndarray
+    injection: np.ndarray
+
+
+class CycleResult(NamedTuple):
+    infusion: np.ndarray
+    injection: np.ndarray
+    error_infusion: np.ndarray
+    error_injection: np.ndarray
+
+
+def prepare_channel(values):
+    values = values[SKIP_SAMPLES:]
+    return values[~np.isnan(values)]
+
+
+def find_cycle_starts(values, cycle_filter, detection=LEVEL, hysteresis=0.0, min_dwell=1):
+    if detection == EDGE:
+        return find_falling_edges(values, cycle_filter, hysteresis, min_dwell)
+
+    # Every sample below the cycle filter starts a new cycle
+    return np.flatnonzero(values < cycle_filter)
+
+
+def find_falling_edges(values, cycle_filter, hysteresis=0.0, min_dwell=1):
+    low = values < cycle_filter
+    high = values >= cycle_filter + hysteresis
+
+    # Samples inside the hysteresis band keep the state of the last sample outside of it
+    last_defined = np.where(low | high, np.arange(len(values)), -1)
+    last_defined = np.maximum.accumulate(last_defined) if len(values) else last_defined
+    idle = (last_defined >= 0) & low[last_defined]
+
+    # A recording starting in idle state opens its first cycle at the first sample
+    changes = np.flatnonzero(np.diff(idle, prepend=False, append=False))
+    edges = changes[0::2]
+    dwell = changes[1::2] - edges
+    return edges[dwell >= min_dwell]
+
+
+def calc_cycles(infusion, injection, cycle_filter, detection=LEVEL, hysteresis=0.0, min_dwell=1):
+    infusion = prepare_channel(infusion)
+    cycle_start = find_cycle_starts(infusion, cycle_filter, detection, hysteresis, min_dwell)
+
+    if injection is not None:
+        injection = prepare_channel(injection)
+        cycle_start2 = find_cycle_starts(injection, cycle_filter, detection, hysteresis, min_dwell)
+
+        # Use the shortest cycle start points to get equal cycles
+        if len(cycle_start) >= len(cycle_start2):
+            cycle_start = cycle_start2
+
+    if len(cycle_start) == len(infusion):
+        return None, None, None
+
+    return cycle_start, infusion, injection
+
+
+def cycle_maxima(values, cycle_start):
+    # Cycles starting behind the end of the channel stay empty
+    maxima = np.full(len(cycle_start), np.nan)
+    inside = cycle_start < len(values)
+    if inside.any():
+        maxima[inside] = np.maximum.reduceat(values, cycle_start[inside])
+    return maxima
+
+
+def threshold_cycles(infusion_max, injection_max, infusion_filter, injection_filter):
+    append_infusion = infusion_max >= infusion_filter
+    append_injection = injection_max >= injection_filter
+    keep = append_infusion | append_injection
+    return CycleResult(infusion_max[keep],
+                       injection_max[keep],
+                       ~append_infusion[keep],
+                       ~append_injection[keep])
+
+
+def segment_cycles(infusion, injection, cycle_filter, detection=LEVEL, hysteresis=0.0, min_dwell=1):
+    cycle_start, infusion, injection = calc_cycles(infusion, injection, cycle_filter,
+                                                   detection, hysteresis, min_dwell)
+    if cycle_start is None or len(cycle_start) == 0:
+        return None
+
+    return CycleMaxima(cycle_maxima(infusion, cycle_start),
+                       cycle_maxima(injection, cycle_start) if injection is not None else None)
+
+
+def threshold_maxima(maxima, infusion_filter, injection_filter):
+    injection_max = maxima.injection
+    if injection_max is None:
+        # One port files have no injection channel, which never passes the filter
+        injection_max = np.zeros(len(maxima.infusion))
+        injection_filter = np.inf
+
+    return threshold_cycles(maxima.infusion, injection_max, infusion_filter, injection_filter)
+
+
+def evaluate_cycles(infusion, injection, cycle_filter, infusion_filter, injection_filter,
+                    detection=LEVEL, hysteresis=0.0, min_dwell=1):
+    maxima = segment_cycles(infusion, injection, cycle_filter, detection, hysteresis, min_dwell)
+    if maxima is None:
+        return None
+    return threshold_maxima(maxima, infusion_filter, injection_filter)
+
+
+def segment_measurement(measurement, settings):
+    if not measurement.valid:
+        return None
+    return segment_cycles(measurement.infusion,
+                          measurement.injection,
+                          settings.cycle_filter,
+                          settings.detection,
+                          settings.hysteresis,
+                          settings.min_dwell)
+
+
+def invalid_message(name):
+    return f'This file ({name}) is beyond my capabilities.\nSorry it\'s my first day coding.! 👍\n'
+
+
+def unreadable_message(name):
+    return f'\nError: File "{name}" is not an Excel file or cant be read!\n\n'
+
+
+def skipped_result(name, header):
+    # Result of a file whose header was already found invalid at scan time, same as if a worker had read it
+    if not header.readable:
+        return FileResult(name, messages=[unreadable_message(name)], failed=True)
+    return FileResult(name, messages=[invalid_message(name)])
+
+
+def evaluate_measurement(name, measurement, maxima, settings):
+    import pandas as pd
+
+    messages = []
+    oneport = False
+
+    if not measurement.valid:
+        messages.append(invalid_message(name))
+        return FileResult(name, messages=messages)
+
+    if measurement.oneport:
+        messages.append(f'One Port file ({name}) detected.\n')
+        oneport = True
+
+    if maxima is None:
+        messages.append('Phu you filtered the shi* out of the Cycle values.\n')
+        return FileResult(name, messages=messages, measurement=measurement)
+
+    cycles = threshold_maxima(maxima, settings.infusion_filter, settings.injection_filter)
+
+    if len(cycles.infusion) == 0:
+        messages.append('Phu you filtered the shi* out of the Infusion values.\n')
+        return FileResult(name, messages=messages, measurement=measurement)
+
+    if cycles.error_injection.all() and not oneport:
+        messages.append(f'\nWarning: No injection measurements found. One Port file ({name}) detected.\n\n')
+        oneport = True
+
+    if len(cycles.infusion) > 15:
+        messages.append(f"\nWarning: More than 15 measurements found on file \"{name}\".\nThe handover from 3T to 2F could have triggered a new cycle. Adjust the filters to remove unwanted measurements.\n\n")
+
+    df_output = pd.DataFrame({'Infusion': cycles.infusion,
+                              'Injection': cycles.injection,
+                              'Error Infusion': cycles.error_infusion,
+                              'Error Injection': cycles.error_injection})
+    return FileResult(name, (name, df_output, measurement.limits, oneport), messages, measurement=measurement)
+
+
+def evaluate_file(folder, name, settings, cache=None, keep_measurement=False, timed=False, stream_bytes=STREAM_BYTES,
+                  prefetched=None):
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    timer = PhaseTimer() if timed else NULL_TIMER
+    path = os.path.join(folder, name)
+    try:
+        if prefetched is None and stream_bytes is not None and os.path.getsize(path) >= stream_bytes:
+            from streaming import stream_segment
+
+            # Reading and cycle detection run block by block, the signal is never held in memory
+            with timer.phase('read'):
+                measurement, maxima, rows = stream_segment(path, settings, report=row_reporter(name))
+            keep_measurement = False
+        else:
+            # Files read into memory ahead of time only have to be decoded
+            data = None
+            if prefetched is not None:
+                timer.add('prefetch', prefetched.seconds)
+                data = prefetched.data
+            measurement = load_measurement(path, cache, timer, row_reporter(name), data)
+            rows = len(measurement.infusion) if measurement.valid else 0
+            check_cancelled()
+            with timer.phase('segmentation'):
+                maxima = segment_measurement(measurement, settings)
+        check_cancelled()
+        with timer.phase('thresholding'):
+            result = evaluate_measurement(name, measurement, maxima, settings)
+
+        if timed:
+            timer.count('rows', rows)
+            timer.count('cycles', len(result.data[1]) if result.data else 0)
+            result = result._replace(timings=timer.record(name))
+        # Only hand the signal arrays back if the caller wants to evaluate them again
+        return result if keep_measurement else result._replace(measurement=None)
+    except Cancelled:
+        return FileResult(name, cancelled=True)
+    except InvalidFileException:
+        message = unreadable_message(name)
+    except Exception as e:
+        if str(e) == 'File is not a zip file':
+            message = unreadable_message(name)
+        else:
+            message = f'\nError: File "{name}" abort with exception:\n{e}\n\n'
+    return FileResult(name, messages=[message], failed=True, timings=timer.record(name) if timed else None)
+
+
+class LiveEvaluation:
+    def __init__(self):
+        self.measurements = {}
+        self.maxima = {}
+
+    def __contains__(self, name):
+        return name in self.measurements
+
+    def add(self, name, measurement):
+        self.measurements[name] = measurement
+        self.maxima.pop(name, None)
+
+    def clear(self):
+        self.measurements.clear()
+        self.maxima.clear()
+
+    def evaluate(self, name, settings):
+        measurement = self.measurements[name]
+
+        # Only segment again if a setting of the cycle detection changed
+        segmentation = settings.segmentation()
+        cached = self.maxima.get(name)
+        if cached is None or cached[0] != segmentation:
+            cached = (segmentation, segment_measurement(measurement, settings))
+            self.maxima[name] = cached
+
+        return evaluate_measurement(name, measurement, cached[1], settings)
@@ -0,0 +1,47 @@
+import queue
+import multiprocessing
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from batch import PROCESS
+
+FRAME_RATE = 30
+
+
+class EventBus(QObject):
+    # Collects events from the GUI thread, worker threads and worker processes and hands them over once per frame
+    drained = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.local = queue.SimpleQueue()
+        self.process_queue = None
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000 // FRAME_RATE)
+        self.timer.timeout.connect(self.drain)
+        self.timer.start()
+
+    def post(self, kind, name, value=None):
+        self.local.put((kind, name, value))
+
+    def channel(self, mode):
+        # Queue the workers of the given mode post into
+        if mode != PROCESS:
+            return self.local
+        if self.process_queue is None:
+            self.process_queue = multiprocessing.Queue()
+        return self.process_queue
+
+    def drain(self):
+        events = []
+        # Worker progress first, a result of the same file always comes after it through the local queue
+        for source in (self.process_queue, self.local):
+            if source is None:
+                continue
+            try:
+                while True:
+                    events.append(source.get_nowait())
+            except queue.Empty:
+                pass
+        if events:
+            self.drained.emit(events)
@@ -1,66 +1,412 @@
 import os
-import pandas as pd
+import re
+import ctypes
+import locale
+from copy import copy
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.chart import BarChart, Reference
-from openpyxl.styles import PatternFill, numbers, Font, Alignment
+from openpyxl.styles import PatternFill, numbers, Font, Alignment, Border, Side
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string, get_column_letter
+from openpyxl.worksheet.hyperlink import Hyperlink
 from openpyxl.styles.differential import DifferentialStyle
 from openpyxl.formatting import Rule
-from openpyxl import formatting as op_fm
+from openpyxl.formatting.rule import CellIsRule
 from openpyxl.utils.exceptions import InvalidFileException, ReadOnlyWorkbookException
 
+from timings import NULL_TIMER, TIMING_COLUMNS, merge_export, timing_rows
+from result_summary import summarize_results, SUMMARY_COLUMNS, INFUSION_TARGET, INJECTION_TARGET
+from export_update import merge_workbooks, settings_key, MANIFEST_SHEET, MANIFEST_COLUMNS
+
+
+def get_language():
+    if os.name == 'nt':
+        windll = ctypes.windll.kernel32
+        return locale.windows_locale[ windll.GetUserDefaultUILanguage() ]
+    return locale.getlocale()[0]
+
+
+class CellBlock:
+    # Collects the cells around the data columns, write-only sheets can only be appended row by row
+    def __init__(self, ws):
+        self.ws = ws
+        self.rows = {}
+
+    def __getitem__(self, coordinate):
+        column, row = coordinate_from_string(coordinate)
+        cells = self.rows.setdefault(row, {})
+        column = column_index_from_string(column)
+        if column not in cells:
+            cells[column] = WriteOnlyCell(self.ws)
+        return cells[column]
+
+    def __setitem__(self, coordinate, value):
+        self[coordinate].value = value
+
+
+def register_style(ws, **attributes):
+    # Adds the style to the workbook of the sheet once, cells share copies of the returned style array
+    cell = WriteOnlyCell(ws)
+    for name, value in attributes.items():
+        if value is not None:
+            setattr(cell, name, value)
+    return cell._style
+
+
+def styled_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value)
+    if style is not None:
+        cell._style = copy(style)
+    return cell
+
+
+class SheetTemplate:
+    # Layout every result sheet shares, built once per workbook. Only the limits, the averages
+    # and the data ranges of the formulas, conditional formatting and chart change per sheet
+    def __init__(self, ws, language, static):
+        self.static = static
+        self.value_false = "FALSCH" if language == 'de_DE' else "FALSE"
+
+        right = Alignment(horizontal='right', vertical='center', wrapText=False)
+        bold = Font(bold=True)
+        limit_font = Font(bold=True, color='E67E17')
+        smallest_fill = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='solid')
+        largest_fill = PatternFill(start_color='B8F589', end_color='B8F589', fill_type='solid')
+
+        # Same header style as DataFrame.to_excel
+        self.header = register_style(ws, font=bold,
+                                     border=Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin')),
+                                     alignment=Alignment(horizontal='center', vertical='top'))
+        self.label = register_style(ws, alignment=right)
+        self.bold = register_style(ws, font=bold)
+        self.number = register_style(ws, number_format=numbers.FORMAT_NUMBER_COMMA_SEPARATED1, alignment=right)
+        self.bold_number = register_style(ws, number_format=numbers.FORMAT_NUMBER_COMMA_SEPARATED1, alignment=right, font=bold)
+        self.link = register_style(ws, font=Font(color='0563C1', underline='single'))
+        self.summary_number = register_style(ws, number_format=numbers.FORMAT_NUMBER_COMMA_SEPARATED1)
+
+        # Highlighting of the static sheets: (below the lower limit, extreme) -> style
+        fills = {None: None, 'smallest': smallest_fill, 'largest': largest_fill}
+        self.highlights = {(below, extreme): register_style(ws, font=limit_font if below else None, fill=fill)
+                           for below in (False, True) for extreme, fill in fills.items()}
+
+        self.legend = {
+            'I16': ('Legend', self.bold),
+            'I17': ('Smallest value', None),
+            'J17': ('0.001', register_style(ws, fill=smallest_fill)),
+            'I18': ('Largest value', None),
+            'J18': ('0.7', register_style(ws, fill=largest_fill)),
+            'I19': ('Lower limit', None),
+            'J19': ('0.001', register_style(ws, font=limit_font)),
+            'I20': ('Upper limit', None),
+            'J20': ('1.0', register_style(ws, font=Font(bold=True, color='D9112A'))),
+        }
+        self.cells = {oneport: self.layout(language, oneport) for oneport in (False, True)}
+
+        self.widths = {oneport: {'A': 15, 'B': 15, 'C': 15, 'D': 15 if not oneport else 5,
+                                 'E': 16, 'F': 20, 'G': 20 if not oneport else 5, 'I': 20}
+                       for oneport in (False, True)}
+
+        # The rules are shared by all sheets, a sheet is written completely before the next one adds them again
+        largest = Rule(type='top10', rank=1, dxf=DifferentialStyle(fill=PatternFill(bgColor='B8F589')))
+        smallest = Rule(type='top10', bottom=True, rank=1, dxf=DifferentialStyle(fill=PatternFill(bgColor='FFC7CE')))
+        self.rules = [('A', 2, CellIsRule(operator='lessThanOrEqual', formula=['$F$2'], stopIfTrue=False, font=limit_font)),
+                      ('B', 2, CellIsRule(operator='lessThanOrEqual', formula=['$G$2'], stopIfTrue=False, font=limit_font)),
+                      ('A', 1, largest), ('B', 1, largest),
+                      ('A', 1, smallest), ('B', 1, smallest)]
+
+    def layout(self, language, oneport):
+        # Coordinate -> (value, style), the cells left empty are filled in per sheet
+        cells = {
+            'E2': ('Lower limit', self.label),
+            'E3': ('Upper limit', self.label),
+            'E5': ('Average', self.label),
+            'E6': ('Target', self.label),
+            'E7': ('Delta', self.label),
+            'E9': ('Installed shim', self.label),
+            'E10': ('Required shim', self.label),
+            'F1': ('Infusion evaluation', self.bold),
+            'F2': (None, self.number),
+            'F3': (None, self.number),
+            'F5': (None, self.number),
+            'F6': (INFUSION_TARGET if self.static else '0,65' if language == 'de_DE' else '0.65', self.number),
+            'F7': (None if self.static else '=F6-F5', self.bold_number),
+            'G3': (None, self.number),
+        }
+        if not oneport:
+            cells.update({
+                'G1': ('Injection evaluation', self.bold),
+                'G2': (None, self.number),
+                'G5': (None, self.number),
+                'G6': (INJECTION_TARGET if self.static else '0,40' if language == 'de_DE' else '0.40', self.number),
+                'G7': (None if self.static else '=G6-G5', self.bold_number),
+            })
+        cells.update(self.legend)
+
+        rows = {}
+        for coordinate, cell in cells.items():
+            column, row = coordinate_from_string(coordinate)
+            rows.setdefault(row, {})[column_index_from_string(column)] = cell
+        return rows
+
+    def stamp(self, ws, oneport):
+        block = CellBlock(ws)
+        for row, cells in self.cells[oneport].items():
+            block.rows[row] = {column: styled_cell(ws, value, style) for column, (value, style) in cells.items()}
+        return block
+
+    def set_column_widths(self, ws, oneport):
+        for column, width in self.widths[oneport].items():
+            ws.column_dimensions[column].width = width
+        ws.column_dimensions.group(start='C', end='D', hidden=True)
+
+    def add_conditional_formatting(self, ws, rows, oneport):
+        for column, first_row, rule in self.rules:
+            if column == 'A' or not oneport:
+                ws.conditional_formatting.add(f'{column}{first_row}:{column}{rows + 1}', rule)
+
+
 class ExportExcel:
-    def __init__(self, output_file_data, output_file, info_text, language):
+    def __init__(self, output_file_data, output_file, log, language, timer=NULL_TIMER, timings=None, static=False, charts=True,
+                 sources=None, settings=None):
         self.output_file_data = output_file_data
         self.output_file = output_file
-        self.info_text = info_text
+        self.log = log
         self.language = language
+        # Static sheets hold computed values and styled cells instead of formulas and conditional formatting
+        self.static = static
+        self.charts = charts
+        # Export time per sheet is collected in timer, timings are the records of the evaluation for the "Timings" sheet
+        self.timer = timer
+        self.timings = timings
+        # File name -> (path, size, mtime) and the evaluation settings, recorded in the manifest for updates
+        self.sources = sources or {}
+        self.settings_key = settings_key(settings, language, static, charts)
+        self.sheet_names = set()
+        self.template = None
 
-    def num_format(self, cell):
-        cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-        cell.alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
+    def sheet_name(self, name):
+        # Sheet names are limited to 31 chars without []:*?/\ and have to be unique
+        name = re.sub(r'[\[\]:*?/\\]', '_', os.path.splitext(os.path.basename(name))[0])[:31]
+        unique_name = name
+        count = 1
+        while unique_name.lower() in self.sheet_names:
+            count += 1
+            unique_name = f'{name[:31-len(str(count))-1]}_{count}'
+        self.sheet_names.add(unique_name.lower())
+        return unique_name
 
     def write_to_excel(self):
+        # Errors are logged, the return value tells whether the file was written
         try:
-            with pd.ExcelWriter(f'{self.output_file}', engine='openpyxl') as writer:
-                for name, df, limits, oneport in self.output_file_data:
-                    name = os.path.splitext(name)[0]
-                    if oneport:
-                        df["Injection"] = None
-                        df["Error Injection"] = None
-                        df.loc[:, 'Injection'] = pd.NA
-                        df.loc[:, 'Error Injection'] = pd.NA
+            # The summary comes first and links to the file sheets, their names are fixed up front
+            summary_name = self.sheet_name('Summary')
+            manifest_name = self.sheet_name(MANIFEST_SHEET)
+            names = [self.sheet_name(data[0]) for data in self.output_file_data]
+            with self.timer.phase('summary'):
+                summary = summarize_results(self.output_file_data)
+                manifest = [self.manifest_row(name, row) for name, row in zip(names, summary.itertuples(index=False))]
+            self.write_workbook(self.output_file, summary_name, manifest_name, names, summary, manifest)
+            return True
+        except PermissionError:
+            self.log(f'Error: File "{self.output_file}" is read-only. Please close this file and try again.\n')
+        except Exception as e:
+            self.log(f'Error: {e}\n')
+        return False
 
-                    # Max Char length for sheets in excel = 31
-                    df.to_excel(writer, sheet_name=name[:31], index=False)
+    def update_excel(self, manifest):
+        # Only the sheets of the evaluated files are written, all other sheets of the result file are copied unchanged
+        if manifest is None:
+            return self.write_to_excel()
+        try:
+            # Sheets of the result file keep their names, new files get names that are still free
+            self.sheet_names = {sheet.lower() for sheet in manifest.sheets}
+            self.sheet_names.update(row['Sheet'].lower() for row in manifest.rows.values())
+            self.sheet_names -= {'summary', MANIFEST_SHEET.lower(), 'timings'}
+            summary_name = self.sheet_name('Summary')
+            manifest_name = self.sheet_name(MANIFEST_SHEET)
+            names = [manifest.rows[data[0]]['Sheet'] if data[0] in manifest.rows else self.sheet_name(data[0])
+                     for data in self.output_file_data]
 
-                    wb = writer.book
-                    ws = wb[name[:31]]
+            with self.timer.phase('summary'):
+                summary = summarize_results(self.output_file_data)
+                evaluated = {row[0]: self.manifest_row(name, row) for name, row in zip(names, summary.itertuples(index=False))}
+                # Files of the result file keep their place, new files are added at the end
+                rows = [evaluated.pop(name, None) or [row[column] for column in MANIFEST_COLUMNS]
+                        for name, row in manifest.rows.items()]
+                rows.extend(evaluated.values())
 
-                    # Define Limits
-                    self.infusion_upper_limit = limits[0][1]
-                    self.infusion_lower_limit = limits[0][0]
+            folder = os.path.dirname(os.path.abspath(self.output_file))
+            update_file = os.path.join(folder, f'~{os.path.basename(self.output_file)}.update')
+            merged_file = os.path.join(folder, f'~{os.path.basename(self.output_file)}.merged')
+            try:
+                self.write_workbook(update_file, summary_name, manifest_name, names, summary, rows)
+                managed = {row[1].lower() for row in rows}
+                anchor = next((sheet for sheet in reversed(manifest.sheets) if sheet.lower() in managed), summary_name)
+                # Timings of an earlier run don't belong to the results any more
+                dropped = [] if self.timings or 'timings' in managed else ['Timings']
+                with self.timer.phase('save'):
+                    merge_workbooks(self.output_file, update_file, merged_file, anchor, dropped)
+                    os.replace(merged_file, self.output_file)
+            finally:
+                for file in (update_file, merged_file):
+                    if os.path.exists(file):
+                        os.remove(file)
+            return True
+        except PermissionError:
+            self.log(f'Error: File "{self.output_file}" is read-only. Please close this file and try again.\n')
+        except Exception as e:
+            self.log(f'Error: {e}\n')
+        return False
 
-                    self.injection_upper_limit = limits[1][1] if not oneport else None
-                    self.injection_lower_limit = limits[1][0] if not oneport else None
+    def manifest_row(self, sheet, summary_row):
+        # File, sheet, where the file came from and its summary, an update of the result file reads it back
+        source = self.sources.get(summary_row[0], (None, None, None))
+        return [summary_row[0], sheet, *source, self.settings_key] + [
+            None if isinstance(value, float) and value != value else value for value in summary_row[1:]]
 
-                    self.set_column_widths(ws, oneport)
+    def write_workbook(self, path, summary_name, manifest_name, names, summary, manifest):
+        # Write-only workbooks stream every sheet to a temporary file, only one sheet is held in memory
+        wb = Workbook(write_only=True)
+        self.template = None
+        if manifest:
+            with self.timer.phase('summary'):
+                self.add_summary_sheet(wb, summary_name, manifest)
+
+        for index, ((file_name, df, limits, oneport), name) in enumerate(zip(self.output_file_data, names)):
+            with self.timer.phase(file_name):
+                ws = self.create_sheet(wb, name)
+
+                # Define Limits
+                self.infusion_upper_limit = limits[0][1]
+                self.infusion_lower_limit = limits[0][0]
+
+                self.injection_upper_limit = limits[1][1] if not oneport else None
+                self.injection_lower_limit = limits[1][0] if not oneport else None
+
+                # Averages of the static sheets come from the summary
+                self.infusion_average = summary['Average Infusion'].iat[index]
+                self.injection_average = summary['Average Injection'].iat[index]
+
+                block = self.template.stamp(ws, oneport)
+                self.template.set_column_widths(ws, oneport)
+                if self.charts:
                     self.add_chart(ws, df, name, oneport)
-                    self.add_conditional_formatting(ws, df, oneport)
-                    self.add_data_to_sheet(ws, df, oneport)
-        except PermissionError:
-            self.info_text.insertPlainText(f'Error: File "{self.output_file}" is read-only. Please close this file and try again.\n')
-        except Exception as e:
-            self.info_text.insertPlainText(f'Error: {e}\n')
+                if not self.static:
+                    self.template.add_conditional_formatting(ws, df.shape[0], oneport)
+                self.add_data_to_sheet(block, df, oneport)
+                self.write_rows(ws, df, block, oneport)
 
-    def set_column_widths(self, ws, oneport):
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 15 if not oneport else 5
-        ws.column_dimensions.group(start='C', end='D', hidden=True)
-        ws.column_dimensions['E'].width = 16
-        ws.column_dimensions['F'].width = 20
-        ws.column_dimensions['G'].width = 20 if not oneport else 5
-        ws.column_dimensions['I'].width = 20
+                # Closing writes the sheet tail and frees its rows
+                ws.close()
+
+        if self.timings:
+            merge_export(self.timings, self.timer)
+            self.add_timings_sheet(wb)
+        if manifest:
+            self.add_manifest_sheet(wb, manifest_name, manifest)
+        with self.timer.phase('save'):
+            try:
+                wb.save(path)
+            except Exception:
+                # Sheets that were not written yet would fail later, when they are garbage collected
+                for ws in wb.worksheets:
+                    if not ws.closed:
+                        ws.close()
+                raise
+
+    def create_sheet(self, wb, name):
+        ws = wb.create_sheet(name)
+        # The styles are registered through the first sheet, all other sheets of the workbook share them
+        if self.template is None:
+            self.template = SheetTemplate(ws, self.language, self.static)
+        return ws
+
+    def header_cell(self, ws, value):
+        return styled_cell(ws, value, self.template.header)
+
+    def add_summary_sheet(self, wb, name, manifest):
+        ws = self.create_sheet(wb, name)
+        ws.column_dimensions['A'].width = 30
+        for column in range(2, len(SUMMARY_COLUMNS) + 1):
+            ws.column_dimensions[get_column_letter(column)].width = 16
+        ws.freeze_panes = 'B2'
+        # Filter and sort buttons on the header row
+        ws.auto_filter.ref = f'A1:{get_column_letter(len(SUMMARY_COLUMNS))}{len(manifest) + 1}'
+
+        ws.append([self.header_cell(ws, column) for column in SUMMARY_COLUMNS])
+        statistics = len(MANIFEST_COLUMNS) - len(SUMMARY_COLUMNS) + 1
+        # Sorted by file name, the manifest keeps the order of the sheets
+        for row in sorted(manifest, key=lambda row: str(row[0]).lower()):
+            link = styled_cell(ws, row[0], self.template.link)
+            link.hyperlink = Hyperlink(ref='', location=f"'{row[1]}'!A1", display=row[0])
+            values = [link]
+            for value in row[statistics:]:
+                if isinstance(value, float):
+                    value = styled_cell(ws, value, self.template.summary_number)
+                values.append(value)
+            ws.append(values)
+
+    def add_manifest_sheet(self, wb, name, manifest):
+        ws = self.create_sheet(wb, name)
+        ws.sheet_state = 'hidden'
+        ws.append(MANIFEST_COLUMNS)
+        for row in manifest:
+            ws.append(row)
+
+    def add_timings_sheet(self, wb):
+        ws = self.create_sheet(wb, self.sheet_name('Timings'))
+        ws.column_dimensions['A'].width = 30
+        ws.append([self.header_cell(ws, column) for column in TIMING_COLUMNS])
+        for row in timing_rows(self.timings):
+            ws.append(row)
+
+    def write_rows(self, ws, df, block, oneport):
+        columns = [df[column].tolist() for column in ('Infusion', 'Injection', 'Error Infusion', 'Error Injection')]
+        if oneport:
+            columns[1] = columns[3] = [None] * len(df)
+
+        styled = self.highlighted_cells(ws, df, oneport) if self.static else {}
+        ws.append([self.header_cell(ws, column) for column in df.columns] + self.block_row(block, 1, 4))
+        for row, values in enumerate(zip(*columns), start=2):
+            # NaN is written as an empty cell
+            values = [None if value != value else value for value in values]
+            for column, cell in styled.get(row, {}).items():
+                values[column] = cell
+            ws.append(values + self.block_row(block, row, 4))
+
+        for row in range(len(df) + 2, max(block.rows, default=0) + 1):
+            ws.append(self.block_row(block, row, 0))
+
+    def highlighted_cells(self, ws, df, oneport):
+        # Same highlighting as the conditional formatting, baked into the cells: row -> column -> cell
+        styled = {}
+        channels = [(0, 'Infusion', self.infusion_lower_limit)]
+        if not oneport:
+            channels.append((1, 'Injection', self.injection_lower_limit))
+        for column, name, lower_limit in channels:
+            values = df[name].to_numpy(dtype=np.float64)
+            with np.errstate(invalid='ignore'):
+                below = values <= lower_limit
+            smallest = largest = np.zeros(len(values), dtype=bool)
+            if not np.isnan(values).all():
+                smallest = values == np.nanmin(values)
+                largest = values == np.nanmax(values)
+
+            for row in np.flatnonzero(below | smallest | largest):
+                extreme = 'largest' if largest[row] else 'smallest' if smallest[row] else None
+                style = self.template.highlights[(bool(below[row]), extreme)]
+                styled.setdefault(row + 2, {})[column] = styled_cell(ws, float(values[row]), style)
+        return styled
+
+    def block_row(self, block, row, offset):
+        cells = block.rows.get(row)
+        if not cells:
+            return []
+        values = [None] * (max(cells) - offset)
+        for column, cell in cells.items():
+            values[column - offset - 1] = cell
+        return values
 
     def add_chart(self, ws, df, name, oneport):
         chart = BarChart()
@@ -72,112 +418,28 @@ class ExportExcel:
         chart.style = 2
         ws.add_chart(chart, 'I1')
 
-    def add_conditional_formatting(self, ws, df, oneport):
-
-        infusion_rule = op_fm.rule.CellIsRule(
-            operator='lessThanOrEqual',
-            formula=['$F$2'],
-            stopIfTrue=False,
-            font=Font(bold=True, color='E67E17'),
-        )
-
-        injection_rule = op_fm.rule.CellIsRule(
-            operator='lessThanOrEqual',
-            formula=['$G$2'],
-            stopIfTrue=False,
-            font=Font(bold=True, color="E67E17"),
-        )
-
-        ws.conditional_formatting.add(f'A2:A{df.shape[0]+1}', infusion_rule)
-        ws.conditional_formatting.add(f'B2:B{df.shape[0]+1}', injection_rule) if not oneport else None
-
-        # Min Value
-        dxf = DifferentialStyle(fill=PatternFill(bgColor='B8F589'))
-        rule = Rule(type='top10', rank=1, dxf=dxf)
-        ws.conditional_formatting.add(f'A1:A{df.shape[0]+1}', rule)
-        ws.conditional_formatting.add(f'B1:B{df.shape[0]+1}', rule) if not oneport else None
-
-        # Max Value
-        dxf = DifferentialStyle(fill=PatternFill(bgColor='FFC7CE'))
-        rule = Rule(type='top10', bottom=True, rank=1, dxf=dxf)
-        ws.conditional_formatting.add(f'A1:A{df.shape[0]+1}', rule)
-        ws.conditional_formatting.add(f'B1:B{df.shape[0]+1}', rule) if not oneport else None
-
+    def static_value(self, value):
+        # No average without a cycle free of errors, the cell stays empty
+        return None if value != value else float(value)
 
     def add_data_to_sheet(self, ws, df, oneport):
-        ws['E2'] = 'Lower limit'
-        ws['E2'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-        ws['E3'] = 'Upper limit'
-        ws['E3'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-
-        self.num_format(ws['F2'])
+        # Labels, styles and the legend come from the template, only the limits and averages are filled in
         ws['F2'] = self.infusion_lower_limit
-
-        self.num_format(ws['F3'])
         ws['F3'] = self.infusion_upper_limit
+        if not oneport:
+            ws['G2'] = self.injection_lower_limit
+            ws['G3'] = self.injection_upper_limit
+
+        # Static sheets get the computed values instead of the formulas
+        if self.static:
+            ws['F5'] = self.static_value(self.infusion_average)
+            ws['F7'] = self.static_value(INFUSION_TARGET - self.infusion_average)
+            if not oneport:
+                ws['G5'] = self.static_value(self.injection_average)
+                ws['G7'] = self.static_value(INJECTION_TARGET - self.injection_average)
+            return
 
-        self.num_format(ws['G2']) if not oneport else None
-        ws['G2'] = self.injection_lower_limit if not oneport else None
-
-        self.num_format(ws['G3'])
-        ws['G3'] = self.injection_upper_limit if not oneport else None
-
-        ws['E5'] = 'Average'
-        ws['E5'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-        ws['E6'] = 'Target'
-        ws['E6'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-        ws['E7'] = 'Delta'
-        ws['E7'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-        ws['E9'] = 'Installed shim'
-        ws['E9'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-        ws['E10'] = 'Required shim'
-        ws['E10'].alignment = Alignment(horizontal='right', vertical='center', wrapText=False)
-
-        ws['F1'].font = Font(bold=True)
-        ws['F1'] = 'Infusion evaluation'
-
-        value_false = "FALSCH" if self.language == 'de_DE' else "FALSE"
-        
-        self.num_format(ws['F5'])
+        value_false = self.template.value_false
         ws['F5'] = f'=AVERAGEIF(C2:C{df.shape[0]+1}, "{value_false}", A2:A{df.shape[0]+1})' # Infusion Mittelwert
-        
-        self.num_format(ws['F6'])
-        ws['F6'] = '0,65' if self.language == 'de_DE' else '0.65' # Infusion Optimal
-        
-        self.num_format(ws['F7'])
-        ws['F7'].font = Font(bold=True)
-        ws['F7'] = '=F6-F5' # Infusion Optimal
-
-        ws['G1'].font = Font(bold=True) if not oneport else None
-        ws['G1'] = 'Injection evaluation' if not oneport else None
-        
-        self.num_format(ws['G5']) if not oneport else None
-        ws['G5'] = f'=AVERAGEIF(D2:D{df.shape[0]+1}, "{value_false}", B2:B{df.shape[0]+1})' if not oneport else None # Injection Mittelwert
-        
-        self.num_format(ws['G6']) if not oneport else None
-        ws['G6'] = ('0,40' if self.language == 'de_DE' else '0.40') if not oneport else None # Injection Optimal
-        
-        self.num_format(ws['G7']) if not oneport else None
-        ws['G7'].font = Font(bold=True) if not oneport else None
-        ws['G7'] = '=G6-G5' if not oneport else None # Injection Optimal
-        
-        # Legend
-        ws['I16'].font = Font(bold=True)
-        ws['I16'] = 'Legend'
-
-        ws['I17'] = 'Smallest value'
-        ws['J17'] = '0.001'
-        ws['J17'].fill = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='solid')
-
-        ws['I18'] = 'Largest value'
-        ws['J18'] = '0.7'
-        ws['J18'].fill = PatternFill(start_color='B8F589', end_color='B8F589', fill_type='solid')
-
-
-        ws['I19'] = 'Lower limit'
-        ws['J19'].font = Font(bold=True, color='E67E17')
-        ws['J19'] = '0.001'
-
-        ws['I20'] = 'Upper limit'
-        ws['J20'].font = Font(bold=True, color='D9112A')
-        ws['J20'] = '1.0'
\ No newline at end of file
+        if not oneport:
+            ws['G5'] = f'=AVERAGEIF(D2:D{df.shape[0]+1}, "{value_false}", B2:B{df.shape[0]+1})' # Injection Mittelwert
@@ -0,0 +1,395 @@
+import os
+import re
+import json
+import zipfile
+import posixpath
+from itertools import zip_longest
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+from result_summary import SUMMARY_COLUMNS
+
+NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+WORKSHEET_REL = f'{REL_NS}/worksheet'
+CALC_CHAIN_REL = f'{REL_NS}/calcChain'
+
+# Hidden sheet of every export, records where each file sheet came from
+MANIFEST_SHEET = 'Manifest'
+MANIFEST_COLUMNS = ['File', 'Sheet', 'Source', 'Size', 'Modified', 'Settings'] + SUMMARY_COLUMNS[1:]
+
+# Order of the sections of styles.xml
+STYLE_SECTIONS = ['numFmts', 'fonts', 'fills', 'borders', 'cellStyleXfs', 'cellXfs', 'cellStyles', 'dxfs',
+                  'tableStyles', 'colors', 'extLst']
+# Custom number formats start at this id
+FIRST_CUSTOM_FORMAT = 164
+
+
+def source_info(path):
+    stat = os.stat(path)
+    # Excel keeps 15 digits, milliseconds survive the round trip through the manifest
+    return (os.path.abspath(path), stat.st_size, round(stat.st_mtime, 3))
+
+
+def settings_key(settings, language, static, charts):
+    # Everything besides the measurement that changes the content of a sheet
+    return json.dumps({'settings': settings._asdict() if settings is not None else None,
+                       'language': language,
+                       'static': static,
+                       'charts': charts}, sort_keys=True)
+
+
+class Manifest:
+    def __init__(self, rows, sheets):
+        # File name -> row as dict, in the order of the result file
+        self.rows = rows
+        self.sheets = sheets
+
+    def is_current(self, name, source, key):
+        row = self.rows.get(name)
+        if row is None or row['Sheet'] not in self.sheets:
+            return False
+        return (row['Source'], row['Size'], row['Modified'], row['Settings']) == (*source, key)
+
+
+def read_manifest(path):
+    # None if the file does not exist or was not written by this program
+    from openpyxl import load_workbook
+
+    if not os.path.isfile(path):
+        return None
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except Exception:
+        return None
+    try:
+        if MANIFEST_SHEET not in wb.sheetnames:
+            return None
+        ws = wb[MANIFEST_SHEET]
+        # Files saved by Excel or LibreOffice can have a stale dimension, all rows are read
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        if tuple(next(rows, ())) != tuple(MANIFEST_COLUMNS):
+            return None
+        manifest = {}
+        for row in rows:
+            if row and row[0] is not None:
+                # Empty cells at the end of a row are left out, e.g. the injection of one port files
+                manifest[row[0]] = dict(zip_longest(MANIFEST_COLUMNS, row[:len(MANIFEST_COLUMNS)]))
+        return Manifest(manifest, list(wb.sheetnames))
+    finally:
+        wb.close()
+
+
+def stale_files(manifest, files, sources, key):
+    # Files that have to be evaluated and written again
+    if manifest is None:
+        return list(files)
+    return [name for name in files if name not in sources or not manifest.is_current(name, sources[name], key)]
+
+
+class Package:
+    # The parts of an xlsx file, part names have no leading slash
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as zf:
+            self.parts = {info.filename: zf.read(info) for info in zf.infolist() if not info.is_dir()}
+
+    def relationships(self, part):
+        rels = rels_name(part)
+        if rels not in self.parts:
+            return []
+        result = []
+        for rel in ElementTree.fromstring(self.parts[rels]):
+            target = rel.get('Target')
+            if rel.get('TargetMode') == 'External':
+                result.append((rel.get('Id'), rel.get('Type'), None))
+            else:
+                result.append((rel.get('Id'), rel.get('Type'), resolve_target(part, target)))
+        return result
+
+    def sheets(self):
+        workbook = ElementTree.fromstring(self.parts['xl/workbook.xml'])
+        targets = {rid: target for rid, _, target in self.relationships('xl/workbook.xml')}
+        return [{'name': sheet.get('name'),
+                 'sheetId': int(sheet.get('sheetId')),
+                 'state': sheet.get('state'),
+                 'part': targets[sheet.get(f'{{{REL_NS}}}id')]}
+                for sheet in workbook.find(f'{{{NS}}}sheets')]
+
+    def tree(self, part):
+        # The part and every part it refers to, e.g. sheet -> drawing -> chart, with their relationship files
+        parts = [part]
+        for _, _, target in self.relationships(part):
+            if target is not None and target in self.parts and target not in parts:
+                parts.extend(p for p in self.tree(target) if p not in parts)
+        if rels_name(part) in self.parts:
+            parts.append(rels_name(part))
+        return parts
+
+
+def rels_name(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', f'{name}.rels')
+
+
+def resolve_target(part, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def free_name(part, taken):
+    # xl/worksheets/sheet3.xml -> xl/worksheets/sheetN.xml with the lowest N not taken
+    folder, name = posixpath.split(part)
+    match = re.match(r'(\D*?)(\d*)(\.[^.]+)$', name)
+    stem, extension = (match.group(1), match.group(3)) if match else (name, '')
+    number = 1
+    while posixpath.join(folder, f'{stem}{number}{extension}') in taken:
+        number += 1
+    return posixpath.join(folder, f'{stem}{number}{extension}')
+
+
+def canonical(element):
+    ElementTree.register_namespace('', NS)
+    return ElementTree.tostring(element, encoding='unicode')
+
+
+def set_section(xml, tag, items, count):
+    # Appends items to a section of styles.xml, creating the section if needed
+    section = re.search(rf'<{tag}\b([^>]*?)(/?)>', xml)
+    if section is None:
+        following = [re.search(rf'<{name}\b', xml) for name in STYLE_SECTIONS[STYLE_SECTIONS.index(tag) + 1:]]
+        following = [match.start() for match in following if match] + [xml.index('</styleSheet>')]
+        position = min(following)
+        return f'{xml[:position]}<{tag} count="{count}">{"".join(items)}</{tag}>{xml[position:]}'
+
+    attributes = re.sub(r'\scount="\d*"', '', section.group(1))
+    opening = f'<{tag} count="{count}"{attributes}>'
+    if section.group(2):
+        return f'{xml[:section.start()]}{opening}{"".join(items)}</{tag}>{xml[section.end():]}'
+    closing = xml.index(f'</{tag}>', section.end())
+    return f'{xml[:section.start()]}{opening}{xml[section.end():closing]}{"".join(items)}{xml[closing:]}'
+
+
+def merge_styles(old_xml, new_xml):
+    # Adds the styles of the new workbook to the old one, returns the merged styles and the index maps
+    old = ElementTree.fromstring(old_xml)
+    new = ElementTree.fromstring(new_xml)
+    merged = old_xml.decode('utf-8')
+    maps = {}
+
+    def section(root, tag):
+        element = root.find(f'{{{NS}}}{tag}')
+        return list(element) if element is not None else []
+
+    # Custom number formats are matched by their format code
+    formats = {fmt.get('formatCode'): int(fmt.get('numFmtId')) for fmt in section(old, 'numFmts')}
+    next_id = max(formats.values(), default=FIRST_CUSTOM_FORMAT - 1) + 1
+    added = []
+    maps['numFmtId'] = {}
+    for fmt in section(new, 'numFmts'):
+        code = fmt.get('formatCode')
+        if code not in formats:
+            formats[code] = next_id
+            added.append(f'<numFmt numFmtId="{next_id}" formatCode={quoteattr(code)}/>')
+            next_id += 1
+        maps['numFmtId'][int(fmt.get('numFmtId'))] = formats[code]
+    if added:
+        merged = set_section(merged, 'numFmts', added, len(formats))
+
+    for tag, key, references in (('fonts', 'fontId', ()),
+                                 ('fills', 'fillId', ()),
+                                 ('borders', 'borderId', ()),
+                                 ('cellXfs', 'xf', ('numFmtId', 'fontId', 'fillId', 'borderId')),
+                                 ('dxfs', 'dxf', ())):
+        existing = {}
+        for index, element in enumerate(section(old, tag)):
+            existing.setdefault(canonical(element), index)
+        count = len(section(old, tag))
+        added = []
+        maps[key] = {}
+        for index, element in enumerate(section(new, tag)):
+            for attribute in references:
+                value = element.get(attribute)
+                if value is not None:
+                    element.set(attribute, str(maps[attribute].get(int(value), int(value))))
+            text = canonical(element)
+            if text not in existing:
+                existing[text] = count + len(added)
+                added.append(text)
+            maps[key][index] = existing[text]
+        if added:
+            merged = set_section(merged, tag, added, count + len(added))
+    return merged.encode('utf-8'), maps['xf'], maps['dxf']
+
+
+def remap_styles(xml, xf_map, dxf_map):
+    text = xml.decode('utf-8')
+    text = re.sub(r'(<(?:c|row)\b[^>]*?\ss=")(\d+)"', lambda m: f'{m.group(1)}{xf_map.get(int(m.group(2)), 0)}"', text)
+    text = re.sub(r'(<col\b[^>]*?\sstyle=")(\d+)"', lambda m: f'{m.group(1)}{xf_map.get(int(m.group(2)), 0)}"', text)
+    text = re.sub(r'(\sdxfId=")(\d+)"', lambda m: f'{m.group(1)}{dxf_map.get(int(m.group(2)), 0)}"', text)
+    return text.encode('utf-8')
+
+
+def rename_targets(xml, renames):
+    # Relationship targets of copied parts point to their new names
+    root = ElementTree.fromstring(xml)
+    for rel in root:
+        target = rel.get('Target')
+        if rel.get('TargetMode') != 'External' and target.lstrip('/') in renames:
+            rel.set('Target', '/' + renames[target.lstrip('/')])
+    ElementTree.register_namespace('', PACKAGE_REL_NS)
+    return ElementTree.tostring(root, encoding='utf-8', xml_declaration=False)
+
+
+def merge_workbooks(old_path, new_path, output_path, anchor=None, dropped=()):
+    # Sheets of the new workbook replace the sheets of the same name, the others are inserted behind the
+    # sheet named anchor. Old sheets named in dropped are removed, all other parts of the old workbook are
+    # copied as they are.
+    old = Package(old_path)
+    new = Package(new_path)
+    old_sheets = old.sheets()
+    new_sheets = new.sheets()
+    replaced = {sheet['name'].lower() for sheet in new_sheets}
+    dropped = {name.lower() for name in dropped} - replaced
+
+    removed = set()
+    for sheet in old_sheets:
+        if sheet['name'].lower() in replaced | dropped:
+            removed.update(old.tree(sheet['part']))
+    # The calculation chain of Excel lists the formula cells of the old sheets, Excel rebuilds it if it is missing
+    removed.update(target for _, rel_type, target in old.relationships('xl/workbook.xml') if rel_type == CALC_CHAIN_REL)
+    parts = {name: data for name, data in old.parts.items() if name not in removed}
+
+    styles, xf_map, dxf_map = merge_styles(old.parts['xl/styles.xml'], new.parts['xl/styles.xml'])
+    parts['xl/styles.xml'] = styles
+
+    # The parts of the new sheets get names that are free in the old workbook
+    renames = {}
+    for sheet in new_sheets:
+        for part in new.tree(sheet['part']):
+            if not part.endswith('.rels'):
+                renames[part] = free_name(part, set(parts) | set(renames.values()))
+    for sheet in new_sheets:
+        for part in new.tree(sheet['part']):
+            data = new.parts[part]
+            if part.endswith('.rels'):
+                owner = posixpath.join(posixpath.dirname(posixpath.dirname(part)), posixpath.basename(part)[:-5])
+                parts[rels_name(renames[owner])] = rename_targets(data, renames)
+            elif part == sheet['part']:
+                parts[renames[part]] = remap_styles(data, xf_map, dxf_map)
+            else:
+                parts[renames[part]] = data
+
+    # Sheet order
+    new_by_name = {sheet['name'].lower(): sheet for sheet in new_sheets}
+    order = [('new', new_by_name[sheet['name'].lower()]) if sheet['name'].lower() in new_by_name else ('old', sheet)
+             for sheet in old_sheets if sheet['name'].lower() not in dropped]
+    old_names = {sheet['name'].lower() for sheet in old_sheets}
+    inserted = [('new', sheet) for sheet in new_sheets if sheet['name'].lower() not in old_names]
+    position = len(order)
+    if anchor is not None:
+        names = [sheet['name'].lower() for _, sheet in order]
+        if anchor.lower() in names:
+            position = names.index(anchor.lower()) + 1
+    order[position:position] = inserted
+
+    rels, sheet_rids = merge_workbook_rels(old, removed, [renames[sheet['part']] for sheet in new_sheets])
+    parts['xl/_rels/workbook.xml.rels'] = rels
+    parts['xl/workbook.xml'] = merge_workbook(old, new, old_sheets, new_sheets, order, renames, sheet_rids)
+    parts['[Content_Types].xml'] = merge_content_types(old, new, removed, renames)
+
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', parts.pop('[Content_Types].xml'))
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+
+def merge_workbook_rels(old, removed, new_parts):
+    root = ElementTree.fromstring(old.parts['xl/_rels/workbook.xml.rels'])
+    for rel in list(root):
+        if rel.get('TargetMode') != 'External' and resolve_target('xl/workbook.xml', rel.get('Target')) in removed:
+            root.remove(rel)
+    taken = {rel.get('Id') for rel in root}
+    rids = {}
+    number = 1
+    for part in new_parts:
+        while f'rId{number}' in taken:
+            number += 1
+        rids[part] = f'rId{number}'
+        taken.add(rids[part])
+        ElementTree.SubElement(root, f'{{{PACKAGE_REL_NS}}}Relationship',
+                               {'Id': rids[part], 'Type': WORKSHEET_REL, 'Target': '/' + part})
+    ElementTree.register_namespace('', PACKAGE_REL_NS)
+    return ElementTree.tostring(root, encoding='utf-8'), rids
+
+
+def merge_workbook(old, new, old_sheets, new_sheets, order, renames, sheet_rids):
+    # Only the sheet list and the defined names are changed, the rest of workbook.xml stays as it is
+    xml = old.parts['xl/workbook.xml'].decode('utf-8')
+    prefix = re.search(rf'xmlns:(\w+)="{re.escape(REL_NS)}"', xml)
+    if prefix is None:
+        xml = xml.replace('<workbook ', f'<workbook xmlns:r="{REL_NS}" ', 1)
+        prefix = 'r'
+    else:
+        prefix = prefix.group(1)
+    old_rids = {rid: target for rid, _, target in old.relationships('xl/workbook.xml')}
+    part_rids = {target: rid for rid, target in old_rids.items()}
+
+    next_id = max((sheet['sheetId'] for sheet in old_sheets), default=0) + 1
+    entries = []
+    for source, sheet in order:
+        if source == 'old':
+            sheet_id, rid = sheet['sheetId'], part_rids[sheet['part']]
+        else:
+            sheet_id, rid = next_id, sheet_rids[renames[sheet['part']]]
+            next_id += 1
+        state = f' state="{sheet["state"]}"' if sheet['state'] else ''
+        entries.append(f'<sheet name={quoteattr(sheet["name"])} sheetId="{sheet_id}"{state} {prefix}:id="{rid}"/>')
+    xml = re.sub(r'<sheets\b[^>]*>.*?</sheets>', lambda _: f'<sheets>{"".join(entries)}</sheets>', xml, flags=re.S)
+    # The selected and the first visible tab may have been dropped
+    xml = re.sub(r'(\s(?:activeTab|firstSheet)=")(\d+)"',
+                 lambda m: m.group(0) if int(m.group(2)) < len(order) else f'{m.group(1)}0"', xml)
+
+    # Names local to a sheet refer to it by position
+    positions = {(source, sheet['name'].lower()): index for index, (source, sheet) in enumerate(order)}
+    names = []
+    for source, package, sheets in (('old', old, old_sheets), ('new', new, new_sheets)):
+        workbook = package.parts['xl/workbook.xml'].decode('utf-8')
+        for attributes, text in re.findall(r'<definedName\b([^>]*)>(.*?)</definedName>', workbook, flags=re.S):
+            local = re.search(r'localSheetId="(\d+)"', attributes)
+            if local is None:
+                if source == 'old':
+                    names.append(f'<definedName{attributes}>{text}</definedName>')
+                continue
+            key = (source, sheets[int(local.group(1))]['name'].lower())
+            if key in positions:
+                attributes = attributes.replace(local.group(0), f'localSheetId="{positions[key]}"')
+                names.append(f'<definedName{attributes}>{text}</definedName>')
+    xml = re.sub(r'<definedNames\b[^>]*>.*?</definedNames>|<definedNames\s*/>', '', xml, flags=re.S)
+    if names:
+        xml = xml.replace('</sheets>', f'</sheets><definedNames>{"".join(names)}</definedNames>', 1)
+    return xml.encode('utf-8')
+
+
+def merge_content_types(old, new, removed, renames):
+    root = ElementTree.fromstring(old.parts['[Content_Types].xml'])
+    for override in list(root.findall(f'{{{CONTENT_TYPES_NS}}}Override')):
+        if override.get('PartName').lstrip('/') in removed:
+            root.remove(override)
+    extensions = {default.get('Extension').lower() for default in root.findall(f'{{{CONTENT_TYPES_NS}}}Default')}
+
+    types = ElementTree.fromstring(new.parts['[Content_Types].xml'])
+    for default in types.findall(f'{{{CONTENT_TYPES_NS}}}Default'):
+        if default.get('Extension').lower() not in extensions:
+            root.insert(0, default)
+    for override in types.findall(f'{{{CONTENT_TYPES_NS}}}Override'):
+        part = override.get('PartName').lstrip('/')
+        if part in renames:
+            ElementTree.SubElement(root, f'{{{CONTENT_TYPES_NS}}}Override',
+                                   {'PartName': '/' + renames[part], 'ContentType': override.get('ContentType')})
+    ElementTree.register_namespace('', CONTENT_TYPES_NS)
+    return ElementTree.tostring(root, encoding='utf-8')
+
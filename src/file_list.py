@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+from typing import NamedTuple
+from PyQt6.QtCore import Qt, QObject, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt6.QtGui import QColor
+
+from measurement_reader import is_measurement_file, sniff_measurement
+
+# Sniffed headers are handed to the view in batches, not one signal per file
+SNIFF_INTERVAL = 0.25
+
+
+class FileInfo(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+    header: object = None
+
+
+def scan_folder(folder):
+    files = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if is_measurement_file(entry.name) and entry.is_file():
+                stat = entry.stat()
+                files.append(FileInfo(entry.name, stat.st_size, stat.st_mtime))
+    return files
+
+
+def format_size(size):
+    for unit in ('B', 'kB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+class FolderScanner(QObject):
+    # Lists the folder in a background thread and sniffs the headers of the files afterwards,
+    # only the results of the latest scan are delivered
+    scanned = pyqtSignal(str, object)
+    sniffed = pyqtSignal(str, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, headers=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.lock = threading.Lock()
+        # (path, size, mtime) -> header, unchanged files are not sniffed again
+        self.headers = {} if headers is None else headers
+
+    def scan(self, folder):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self.run, args=(folder, generation), daemon=True).start()
+
+    def is_current(self, generation):
+        with self.lock:
+            return generation == self.generation
+
+    def run(self, folder, generation):
+        try:
+            files = scan_folder(folder)
+        except OSError:
+            files = None
+
+        if not self.is_current(generation):
+            return
+        if files is None:
+            self.failed.emit(folder)
+            return
+
+        files = [file._replace(header=self.headers.get((os.path.join(folder, file.name), file.size, file.mtime)))
+                 for file in files]
+        self.scanned.emit(folder, files)
+
+        headers = {}
+        last_emit = time.monotonic()
+        for file in files:
+            if file.header is not None:
+                continue
+            if not self.is_current(generation):
+                return
+            key = (os.path.join(folder, file.name), file.size, file.mtime)
+            self.headers[key] = headers[file.name] = sniff_measurement(key[0])
+            if time.monotonic() - last_emit > SNIFF_INTERVAL:
+                self.sniffed.emit(folder, headers)
+                headers = {}
+                last_emit = time.monotonic()
+        if headers:
+            self.sniffed.emit(folder, headers)
+
+
+class MeasurementFileModel(QAbstractTableModel):
+    COLUMNS = ['Name', 'Modified', 'Size', 'Rows', 'Ports']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.folder = None
+        self.files = []
+        self.checked = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.files)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        file = self.files[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return file.name
+            if column == 1:
+                return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file.mtime))
+            if column == 2:
+                return format_size(file.size)
+            if file.header is None or not file.header.valid:
+                return '' if file.header is None or column == 3 else 'invalid'
+            if column == 3:
+                return file.header.rows
+            return '1' if file.header.oneport else '2'
+        if role == Qt.ItemDataRole.UserRole:
+            # Raw values to sort by
+            if column < 3:
+                return (file.name.lower(), file.mtime, file.size)[column]
+            if file.header is None or not file.header.valid:
+                return -1
+            return file.header.rows if column == 3 else (1 if file.header.oneport else 2)
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            return Qt.CheckState.Checked if file.name in self.checked else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.TextAlignmentRole and column >= 2:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if file.header is not None and not file.header.valid:
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return QColor(Qt.GlobalColor.gray)
+            if role == Qt.ItemDataRole.ToolTipRole:
+                if not file.header.readable:
+                    return 'Not an Excel file or it cant be read, it is skipped'
+                return 'No "Infusion" column in the first row, it is skipped'
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        name = self.files[index.row()].name
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.checked.add(name)
+        else:
+            self.checked.discard(name)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def set_files(self, folder, files):
+        # A rescan of the same folder keeps the check state of the files that are still there
+        if folder == self.folder and [file[:3] for file in files] == [file[:3] for file in self.files]:
+            return
+        self.beginResetModel()
+        if folder != self.folder:
+            self.checked = set()
+        self.folder = folder
+        self.files = list(files)
+        self.checked &= {file.name for file in self.files}
+        self.endResetModel()
+
+    def set_checked(self, names, state):
+        if state:
+            self.checked.update(names)
+        else:
+            self.checked.difference_update(names)
+        if self.files:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.files) - 1, 0), [Qt.ItemDataRole.CheckStateRole])
+
+    def set_headers(self, folder, headers):
+        if folder != self.folder or not self.files:
+            return
+        for row, file in enumerate(self.files):
+            header = headers.get(file.name)
+            if header is not None:
+                self.files[row] = file._replace(header=header)
+        self.dataChanged.emit(self.index(0, 0), self.index(len(self.files) - 1, len(self.COLUMNS) - 1))
+
+    def headers(self):
+        return {file.name: file.header for file in self.files if file.header is not None}
+
+    def name(self, row):
+        return self.files[row].name
@@ -0,0 +1,98 @@
+import os
+import time
+from PyQt6.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+from file_list import FolderScanner
+
+# Files have to stay unchanged this long before they are evaluated, the rig may still be writing them
+SETTLE_DELAY = 2000
+# Network drives don't always send notifications, the folder is listed regularly anyway
+POLL_INTERVAL = 5000
+
+
+class StatIndex:
+    def __init__(self, files=()):
+        self.stats = {file.name: (file.size, file.mtime) for file in files}
+
+    def changes(self, files, settle, now=None):
+        # Returns the new or changed files that settled and whether others are still being written
+        now = time.time() if now is None else now
+        ready = []
+        pending = False
+        for file in files:
+            stat = (file.size, file.mtime)
+            if self.stats.get(file.name) == stat:
+                continue
+            if now - file.mtime < settle:
+                pending = True
+                continue
+            self.stats[file.name] = stat
+            ready.append(file.name)
+
+        names = {file.name for file in files}
+        for name in [name for name in self.stats if name not in names]:
+            del self.stats[name]
+        return ready, pending
+
+
+class FolderWatcher(QObject):
+    listed = pyqtSignal(str, object)
+    filesReady = pyqtSignal(object)
+
+    def __init__(self, parent=None, headers=None):
+        super().__init__(parent)
+        self.folder = None
+        self.index = StatIndex()
+
+        self.scanner = FolderScanner(self, headers)
+        self.scanner.scanned.connect(self.update)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(lambda: self.settle_timer.start())
+
+        # Notifications come in bursts while a file is written, wait until it is quiet
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(SETTLE_DELAY)
+        self.settle_timer.timeout.connect(self.scan)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL)
+        self.poll_timer.timeout.connect(self.scan)
+
+    def start(self, folder, files):
+        self.stop()
+        self.folder = folder
+        # The files listed so far are known, only later changes are reported
+        self.index = StatIndex(files)
+        self.watcher.addPath(folder)
+        self.poll_timer.start()
+
+    def stop(self):
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        self.settle_timer.stop()
+        self.poll_timer.stop()
+        self.folder = None
+
+    def is_watching(self):
+        return self.folder is not None
+
+    def scan(self):
+        if self.folder is not None:
+            self.scanner.scan(self.folder)
+
+    def update(self, folder, files):
+        if folder != self.folder:
+            return
+        self.listed.emit(folder, files)
+
+        ready, pending = self.index.changes(files, SETTLE_DELAY / 1000)
+        if pending:
+            self.settle_timer.start()
+        if ready:
+            self.filesReady.emit(ready)
+
+        # The watch is lost if the folder was removed and created again
+        if os.path.isdir(folder) and folder not in self.watcher.directories():
+            self.watcher.addPath(folder)
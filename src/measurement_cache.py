@@ -0,0 +1,133 @@
+import io
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from measurement_reader import Measurement, read_measurement
+from timings import NULL_TIMER
+
+# Bump to invalidate existing cache entries when the reader changes
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, '2F plug in depth evaluation', 'cache')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, '2f-plug-in-depth-evaluation')
+
+
+class MeasurementCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, content_hash=False):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+
+    def key(self, path, data=None):
+        # data is the content of the file if it was already read into memory
+        stat = os.stat(path)
+        key = hashlib.sha1(f'{CACHE_VERSION}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'.encode())
+        if self.content_hash:
+            if data is not None:
+                key.update(data)
+            else:
+                with open(path, 'rb') as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b''):
+                        key.update(block)
+        return key.hexdigest()
+
+    def cached(self, path):
+        # Only entries keyed without the file content can be found without reading the file
+        if self.content_hash:
+            return False
+        return os.path.exists(self.entry_path(self.key(path)))
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        try:
+            entry = self.entry_path(key)
+            with np.load(entry, allow_pickle=False) as data:
+                measurement = Measurement(data['columns'].tolist(),
+                                          data['infusion'] if 'infusion' in data else None,
+                                          data['injection'] if 'injection' in data else None)
+            # The modification time of an entry is its last use for the LRU eviction
+            os.utime(entry)
+            return measurement
+        except Exception:
+            # Missing or broken entries are read again from the source file
+            return None
+
+    def put(self, key, measurement):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            arrays = {'columns': np.array(measurement.columns, dtype=str)}
+            if measurement.infusion is not None:
+                arrays['infusion'] = measurement.infusion
+            if measurement.injection is not None:
+                arrays['injection'] = measurement.injection
+
+            # Write to a temporary file first, parallel workers may store the same entry
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, self.entry_path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        # Remove the least recently used entries first
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        try:
+            for _, _, path in self.entries():
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def load_measurement(path, cache=None, timer=NULL_TIMER, report=None, data=None):
+    # Files read ahead by the prefetcher are decoded from memory
+    source = path if data is None else io.BytesIO(data)
+    if cache is None:
+        with timer.phase('read'):
+            return read_measurement(source, report=report)
+
+    with timer.phase('cache'):
+        key = cache.key(path, data)
+        measurement = cache.get(key)
+    if measurement is None:
+        with timer.phase('read'):
+            measurement = read_measurement(source, report=report)
+        with timer.phase('cache'):
+            cache.put(key, measurement)
+    elif report is not None and measurement.valid:
+        report(len(measurement.infusion))
+    return measurement
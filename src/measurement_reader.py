@@ -0,0 +1,306 @@
+import os
+import re
+import zipfile
+import posixpath
+import importlib.util
+from typing import NamedTuple
+import numpy as np
+from progress import check_cancelled, Cancelled
+
+# The backends are imported on first use to keep the start of the GUI fast
+CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+INFUSION = 'Infusion'
+INJECTION = 'Injection'
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Rows between two progress reports of a read
+ROW_STEP = 5000
+# Rows per block of the streaming read
+CHUNK_ROWS = 65536
+LAST_ROW = re.compile(rb'<(?:\w+:)?row[^>]*?\sr="(\d+)"')
+
+
+def is_measurement_file(file):
+    file = os.path.basename(file)
+    return os.path.splitext(file)[1] == '.xlsx' and 'result' not in file.lower() and file[:1] != '.'
+
+
+class Measurement:
+    def __init__(self, columns, infusion=None, injection=None):
+        self.columns = columns
+        self.infusion = infusion
+        self.injection = injection
+
+        # The first two data rows of each channel hold the lower and upper limit
+        self.limits = [
+            self.get_limits(infusion),
+            self.get_limits(injection) if injection is not None else (0, 0)
+        ]
+
+    @property
+    def valid(self):
+        return self.infusion is not None
+
+    @property
+    def oneport(self):
+        return self.injection is None
+
+    def get_limits(self, values):
+        if values is None or len(values) < 2:
+            return (np.nan, np.nan)
+        return (values[0], values[1])
+
+
+class MeasurementHeader(NamedTuple):
+    columns: tuple = ()
+    rows: int = None
+    readable: bool = True
+
+    @property
+    def valid(self):
+        return self.readable and INFUSION in self.columns
+
+    @property
+    def oneport(self):
+        return INJECTION not in self.columns
+
+
+def first_sheet_path(zf):
+    from xml.etree import ElementTree
+
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    sheet = workbook.find(f'{NS}sheets/{NS}sheet')
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        if rel.get('Id') == sheet.get(f'{REL_NS}id'):
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    raise KeyError('First sheet not found')
+
+
+def cell_column(reference):
+    column = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        column = column * 26 + ord(char.upper()) - 64
+    return column - 1
+
+
+def shared_strings(zf, indices):
+    # Only parse the shared string table up to the highest index the header needs
+    from xml.etree import ElementTree
+
+    strings = {}
+    if not indices or 'xl/sharedStrings.xml' not in zf.namelist():
+        return strings
+    last = max(indices)
+    with zf.open('xl/sharedStrings.xml') as file:
+        index = 0
+        for _, element in ElementTree.iterparse(file):
+            if element.tag == f'{NS}si':
+                if index in indices:
+                    strings[index] = ''.join(text.text or '' for text in element.iter(f'{NS}t'))
+                if index >= last:
+                    break
+                index += 1
+                element.clear()
+    return strings
+
+
+def count_rows(zf, sheet):
+    # Without a dimension the last row number is searched in the raw XML
+    last_row = 0
+    tail = b''
+    with zf.open(sheet) as file:
+        while chunk := file.read(1 << 20):
+            data = tail + chunk
+            matches = LAST_ROW.findall(data)
+            if matches:
+                last_row = int(matches[-1])
+            tail = data[-256:]
+    return last_row
+
+
+def sniff_measurement(path):
+    # Reads only the first row and the dimension of the first sheet, not the measurement itself
+    from xml.etree import ElementTree
+
+    try:
+        with zipfile.ZipFile(path) as zf:
+            sheet = first_sheet_path(zf)
+            dimension = None
+            cells = []
+            with zf.open(sheet) as file:
+                for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+                    if event == 'start' and element.tag == f'{NS}dimension':
+                        dimension = element.get('ref')
+                    elif event == 'end' and element.tag == f'{NS}row':
+                        for cell in element.iter(f'{NS}c'):
+                            value = cell.find(f'{NS}v')
+                            if cell.get('t') == 'inlineStr':
+                                value = ''.join(text.text or '' for text in cell.iter(f'{NS}t'))
+                            elif value is not None:
+                                value = value.text
+                            cells.append((cell_column(cell.get('r', '')), cell.get('t'), value))
+                        break
+
+            strings = shared_strings(zf, {int(value) for _, kind, value in cells if kind == 's' and value})
+            header = [None] * (max((column for column, _, _ in cells), default=-1) + 1)
+            for column, kind, value in cells:
+                header[column] = strings.get(int(value)) if kind == 's' and value else value
+
+            last_row = None
+            if dimension and ':' in dimension:
+                last_row = int(re.sub(r'\D', '', dimension.split(':')[1]) or 0)
+            if not last_row or last_row <= 1:
+                last_row = count_rows(zf, sheet)
+    except (zipfile.BadZipFile, KeyError, ValueError, AttributeError, ElementTree.ParseError, OSError):
+        return MeasurementHeader(readable=False)
+
+    return MeasurementHeader(tuple(project_columns(header)[0]), max(last_row - 1, 0))
+
+
+def to_float_array(values):
+    try:
+        # None becomes NaN here, numeric strings are converted as pandas would compare them
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([to_float(value) for value in values], dtype=np.float64)
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def project_columns(header):
+    header = [str(name) if name is not None else '' for name in header]
+    positions = {name: header.index(name) for name in (INFUSION, INJECTION) if name in header}
+    return header, positions
+
+
+def read_openpyxl(source, report=None):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # The stored dimension can be stale or missing, read up to the last row really in the sheet
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header, positions = project_columns(next(rows, ()))
+        if INFUSION not in positions:
+            return Measurement(header)
+
+        # Only iterate over the cell range spanning the wanted columns
+        min_col = min(positions.values())
+        max_col = max(positions.values())
+        columns = {name: [] for name in positions}
+        appends = [(columns[name].append, col - min_col) for name, col in positions.items()]
+        width = max_col - min_col + 1
+        for index, row in enumerate(ws.iter_rows(min_row=2, min_col=min_col + 1, max_col=max_col + 1, values_only=True), 1):
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            for append, col in appends:
+                append(row[col])
+            if report is not None and index % ROW_STEP == 0:
+                report(index)
+    finally:
+        wb.close()
+
+    if report is not None:
+        report(len(columns[INFUSION]))
+    return Measurement(header,
+                       to_float_array(columns[INFUSION]),
+                       to_float_array(columns[INJECTION]) if INJECTION in columns else None)
+
+
+def read_measurement_chunks(source, chunk_rows=CHUNK_ROWS):
+    # Yields the header and positions first, then the channels in blocks of chunk_rows samples
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # Same as read_openpyxl, a stale dimension would end the stream early
+        ws.reset_dimensions()
+        header, positions = project_columns(next(ws.iter_rows(max_row=1, values_only=True), ()))
+        yield header, positions
+        if INFUSION not in positions:
+            return
+
+        min_col = min(positions.values())
+        max_col = max(positions.values())
+        width = max_col - min_col + 1
+        infusion_col = positions[INFUSION] - min_col
+        injection_col = positions[INJECTION] - min_col if INJECTION in positions else None
+        infusion, injection = [], []
+        for row in ws.iter_rows(min_row=2, min_col=min_col + 1, max_col=max_col + 1, values_only=True):
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            infusion.append(row[infusion_col])
+            if injection_col is not None:
+                injection.append(row[injection_col])
+            if len(infusion) == chunk_rows:
+                yield to_float_array(infusion), to_float_array(injection) if injection_col is not None else None
+                infusion, injection = [], []
+        if infusion:
+            yield to_float_array(infusion), to_float_array(injection) if injection_col is not None else None
+    finally:
+        wb.close()
+
+
+def read_calamine(source, report=None):
+    from python_calamine import CalamineWorkbook
+
+    # The decode itself can't be interrupted (about 0.25 s per 60000 rows), a cancel is seen before and after it
+    check_cancelled()
+    if isinstance(source, str):
+        wb = CalamineWorkbook.from_path(source)
+    else:
+        wb = CalamineWorkbook.from_filelike(source)
+    rows = wb.get_sheet_by_index(0).to_python(skip_empty_area=False)
+    check_cancelled()
+    header, positions = project_columns(rows[0] if rows else ())
+    if INFUSION not in positions:
+        return Measurement(header)
+
+    # Calamine reports empty cells as empty strings
+    columns = {}
+    for name, col in positions.items():
+        columns[name] = to_float_array([row[col] if col < len(row) and row[col] != '' else None for row in rows[1:]])
+        check_cancelled()
+    if report is not None:
+        # Calamine reads the sheet at once, there is no progress in between
+        report(len(columns[INFUSION]))
+    return Measurement(header, columns[INFUSION], columns.get(INJECTION))
+
+
+BACKENDS = {
+    'calamine': read_calamine,
+    'openpyxl': read_openpyxl,
+}
+
+
+def default_backend():
+    return 'calamine' if CALAMINE else 'openpyxl'
+
+
+def read_measurement(source, backend=None, report=None):
+    backend = backend or default_backend()
+    if backend != 'openpyxl':
+        try:
+            return BACKENDS[backend](source, report)
+        except Cancelled:
+            # A cancelled read must not start over with openpyxl
+            raise
+        except Exception:
+            # Fall back to openpyxl, which also raises the well known errors for broken files
+            if hasattr(source, 'seek'):
+                source.seek(0)
+    return read_openpyxl(source, report)
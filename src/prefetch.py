@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Memory for files that were read ahead but not evaluated yet
+PREFETCH_BYTES = 256 * 1024 * 1024
+# Parallel reads hide the latency of network drives
+PREFETCH_READERS = 4
+BLOCK_BYTES = 1024 * 1024
+
+
+class Prefetched(NamedTuple):
+    data: bytes
+    seconds: float
+
+
+class Prefetcher:
+    # Reads the upcoming files into memory while the workers decode earlier ones. The files are read
+    # in the order of the batch and take their share of the budget in that order, the budget is
+    # given back once the worker is done with a file, so the budget bounds all buffers in memory
+    def __init__(self, folder, files, budget=PREFETCH_BYTES, readers=PREFETCH_READERS, cache=None, stream_bytes=None):
+        self.budget = budget
+        self.available = budget
+        self.cache = cache
+        self.stream_bytes = stream_bytes
+        self.condition = threading.Condition()
+        self.turn = 0
+        self.closed = False
+        self.sizes = {}
+        self.taken = 0
+        self.executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='prefetch')
+        # The files are handed out in the order of the batch, the next one is always the first future
+        self.futures = deque(self.executor.submit(self.read, os.path.join(folder, name), index)
+                             for index, name in enumerate(files))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def next(self):
+        return self.futures[0]
+
+    def ready(self):
+        return self.futures[0].done()
+
+    def take(self):
+        # Index and content of the next file, the content is None if the worker has to read it itself.
+        # The share of the file stays taken until it is released with the index
+        future = self.futures.popleft()
+        index = self.taken
+        self.taken += 1
+        try:
+            prefetched = future.result()
+        except Exception:
+            prefetched = None
+        return index, prefetched
+
+    def release(self, index):
+        with self.condition:
+            self.available += self.sizes.pop(index, 0)
+            self.condition.notify_all()
+
+    def acquire(self, index, size):
+        with self.condition:
+            while self.turn != index or size > self.available:
+                if self.closed:
+                    return False
+                self.condition.wait()
+            self.available -= size
+            self.sizes[index] = size
+            self.turn += 1
+            self.condition.notify_all()
+            return True
+
+    def skip(self, index):
+        with self.condition:
+            while self.turn != index and not self.closed:
+                self.condition.wait()
+            self.turn += 1
+            self.condition.notify_all()
+
+    def wanted(self, path, size):
+        # Streamed files are read block by block, cached files are not read at all
+        if size > self.budget:
+            return False
+        if self.stream_bytes is not None and size >= self.stream_bytes:
+            return False
+        return self.cache is None or not self.cache.cached(path)
+
+    def read(self, path, index):
+        try:
+            size = os.path.getsize(path)
+            wanted = self.wanted(path, size)
+        except OSError:
+            wanted = False
+        if not wanted:
+            # Errors are reported by the worker reading the file itself
+            self.skip(index)
+            return None
+        if not self.acquire(index, size):
+            return None
+
+        start = time.perf_counter()
+        try:
+            blocks = []
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(BLOCK_BYTES), b''):
+                    if self.closed:
+                        return None
+                    blocks.append(block)
+            return Prefetched(b''.join(blocks), time.perf_counter() - start)
+        except OSError:
+            return None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,58 @@
+import threading
+
+# Events posted by the workers, plain tuples (kind, name, value) so they pass through a multiprocessing queue
+ROWS = 'rows'
+MESSAGE = 'message'
+RESULT = 'result'
+FINISHED = 'finished'
+
+
+class WorkerState(threading.local):
+    # Every worker thread keeps the channel and cancel event of the batch its pool was started for,
+    # threads of an earlier pool still see their own cancel event
+    channel = None
+    cancel_event = None
+
+
+state = WorkerState()
+
+
+class Cancelled(Exception):
+    pass
+
+
+def connect(queue, cancel=None):
+    # Executor initializer, every worker posts into the queue of the GUI and watches the cancel event
+    state.channel = queue
+    state.cancel_event = cancel
+
+
+def post(kind, name, value=None):
+    if state.channel is not None:
+        state.channel.put((kind, name, value))
+
+
+def check_cancelled():
+    if state.cancel_event is not None and state.cancel_event.is_set():
+        raise Cancelled()
+
+
+def row_reporter(name):
+    if state.channel is None and state.cancel_event is None:
+        return None
+
+    def report(rows):
+        # Long reads stop between two chunks of rows
+        check_cancelled()
+        post(ROWS, name, rows)
+    return report
+
+
+# Rough size of a row in a compressed workbook, for files whose header was not sniffed yet
+BYTES_PER_ROW = 36
+
+
+def estimate_rows(header, size):
+    if header is not None and header.rows:
+        return header.rows
+    return max(size // BYTES_PER_ROW, 1)
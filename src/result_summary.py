@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Target depths of the ports, same as on the result sheets
+INFUSION_TARGET = 0.65
+INJECTION_TARGET = 0.40
+
+SUMMARY_COLUMNS = ['File', 'Ports', 'Cycles',
+                   'Error Infusion', 'Average Infusion', 'Min Infusion', 'Max Infusion', 'Std Infusion', 'Delta Infusion',
+                   'Error Injection', 'Average Injection', 'Min Injection', 'Max Injection', 'Std Injection', 'Delta Injection']
+
+
+def channel_stats(values, errors, group, starts, counts):
+    # Statistics of the cycles without error of every file, all files are reduced at once
+    files = len(counts)
+    valid = ~errors & ~np.isnan(values)
+    valid_group = group[valid]
+    valid_values = values[valid]
+    n = np.bincount(valid_group, minlength=files)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(valid_group, weights=valid_values, minlength=files) / n
+        deviation = valid_values - mean[valid_group]
+        std = np.sqrt(np.bincount(valid_group, weights=deviation * deviation, minlength=files) / (n - 1))
+    std[n < 2] = np.nan
+
+    minimum = np.full(files, np.nan)
+    maximum = np.full(files, np.nan)
+    filled = counts > 0
+    if filled.any():
+        minimum[filled] = np.minimum.reduceat(np.where(valid, values, np.inf), starts[filled])
+        maximum[filled] = np.maximum.reduceat(np.where(valid, values, -np.inf), starts[filled])
+    minimum[n == 0] = np.nan
+    maximum[n == 0] = np.nan
+
+    error_count = np.bincount(group, weights=errors, minlength=files).astype(np.int64)
+    return error_count, mean, minimum, maximum, std
+
+
+def summarize_results(output_file_data):
+    if not output_file_data:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    names = [data[0] for data in output_file_data]
+    oneport = np.array([data[3] for data in output_file_data])
+    counts = np.array([len(data[1]) for data in output_file_data], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    group = np.repeat(np.arange(len(names)), counts)
+
+    def column(name, dtype):
+        return np.concatenate([data[1][name].to_numpy(dtype=dtype) for data in output_file_data])
+
+    infusion = channel_stats(column('Infusion', np.float64), column('Error Infusion', bool), group, starts, counts)
+    injection = channel_stats(column('Injection', np.float64), column('Error Injection', bool), group, starts, counts)
+
+    # One port files have no injection channel
+    injection = ([np.where(oneport, None, injection[0])]
+                 + [np.where(oneport, np.nan, values) for values in injection[1:]])
+
+    return pd.DataFrame({
+        'File': names,
+        'Ports': np.where(oneport, 1, 2),
+        'Cycles': counts,
+        'Error Infusion': infusion[0],
+        'Average Infusion': infusion[1],
+        'Min Infusion': infusion[2],
+        'Max Infusion': infusion[3],
+        'Std Infusion': infusion[4],
+        'Delta Infusion': INFUSION_TARGET - infusion[1],
+        'Error Injection': injection[0],
+        'Average Injection': injection[1],
+        'Min Injection': injection[2],
+        'Max Injection': injection[3],
+        'Std Injection': injection[4],
+        'Delta Injection': INJECTION_TARGET - injection[1],
+    })
@@ -0,0 +1,156 @@
+import bisect
+from itertools import accumulate
+import numpy as np
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QColor, QFont, QKeySequence, QGuiApplication
+from PyQt6.QtWidgets import QTableView
+
+# Same colors as the conditional formatting of the export
+SMALLEST_COLOR = QColor('#FFC7CE')
+LARGEST_COLOR = QColor('#B8F589')
+LIMIT_COLOR = QColor('#E67E17')
+ERROR_COLOR = QColor('#D9112A')
+NAME_COLOR = QColor('#E8E8E8')
+
+
+def extremes(values):
+    if values is None or not len(values) or np.isnan(values).all():
+        return (None, None)
+    return (np.nanmin(values), np.nanmax(values))
+
+
+class ResultGroup:
+    # The cycles of one file, the arrays are views of the result DataFrame and are never changed
+    def __init__(self, name, df, limits, oneport):
+        self.name = name
+        self.count = len(df)
+        self.values = [df['Infusion'].to_numpy(), None if oneport else df['Injection'].to_numpy()]
+        self.errors = [df['Error Infusion'].to_numpy(), None if oneport else df['Error Injection'].to_numpy()]
+        self.lower_limits = [limits[0][0], None if oneport else limits[1][0]]
+        self.extremes = [extremes(values) for values in self.values]
+
+
+class ResultTableModel(QAbstractTableModel):
+    # Every file starts with a row holding its name followed by one row per cycle,
+    # the view only asks for the rows it shows
+    COLUMNS = ['Cycle', 'Infusion', 'Injection', 'Error Infusion', 'Error Injection']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.groups = []
+        self.starts = []
+        self.rows = 0
+        self.bold = QFont()
+        self.bold.setBold(True)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def set_results(self, output_file_data):
+        self.beginResetModel()
+        self.groups = [ResultGroup(*data) for data in output_file_data]
+        sizes = [group.count + 1 for group in self.groups]
+        self.starts = list(accumulate(sizes, initial=0))[:-1]
+        self.rows = sum(sizes)
+        self.endResetModel()
+
+    def name_rows(self):
+        return self.starts
+
+    def locate(self, row):
+        # Group of a row and its cycle, -1 is the name row
+        index = bisect.bisect_right(self.starts, row) - 1
+        return self.groups[index], row - self.starts[index] - 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        group, cycle = self.locate(index.row())
+        column = index.column()
+
+        if cycle < 0:
+            if role == Qt.ItemDataRole.DisplayRole and column == 0:
+                return f'{group.name} ({group.count} cycles)'
+            if role == Qt.ItemDataRole.FontRole:
+                return self.bold
+            if role == Qt.ItemDataRole.BackgroundRole:
+                return NAME_COLOR
+            return None
+
+        if column == 0:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return cycle + 1
+            if role == Qt.ItemDataRole.TextAlignmentRole:
+                return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            return None
+
+        channel = (column - 1) % 2
+        if group.values[channel] is None:
+            return None
+
+        if column >= 3:
+            error = group.errors[channel][cycle]
+            if role == Qt.ItemDataRole.DisplayRole:
+                return 'Error' if error else ''
+            if role == Qt.ItemDataRole.ForegroundRole and error:
+                return ERROR_COLOR
+            return None
+
+        value = group.values[channel][cycle]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return '' if np.isnan(value) else f'{value:.4f}'
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role in (Qt.ItemDataRole.FontRole, Qt.ItemDataRole.ForegroundRole) and value <= group.lower_limits[channel]:
+            return self.bold if role == Qt.ItemDataRole.FontRole else LIMIT_COLOR
+        if role == Qt.ItemDataRole.BackgroundRole:
+            smallest, largest = group.extremes[channel]
+            if value == smallest:
+                return SMALLEST_COLOR
+            if value == largest:
+                return LARGEST_COLOR
+        if role == Qt.ItemDataRole.ToolTipRole:
+            tips = []
+            if value <= group.lower_limits[channel]:
+                tips.append('Below the lower limit')
+            if value == group.extremes[channel][0]:
+                tips.append('Smallest value')
+            if value == group.extremes[channel][1]:
+                tips.append('Largest value')
+            return ', '.join(tips) or None
+        return None
+
+
+class ResultTableView(QTableView):
+    def set_results(self, output_file_data):
+        model = self.model()
+        model.set_results(output_file_data)
+        # The name row of a file spans all columns
+        self.clearSpans()
+        for row in model.name_rows():
+            self.setSpan(row, 0, 1, model.columnCount())
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            self.copy_selection()
+            return
+        super().keyPressEvent(event)
+
+    def copy_selection(self):
+        # Copied as tab separated rows to paste into Excel
+        indexes = sorted(self.selectedIndexes(), key=lambda index: (index.row(), index.column()))
+        if not indexes:
+            return
+        rows = {}
+        for index in indexes:
+            value = index.data()
+            rows.setdefault(index.row(), []).append('' if value is None else str(value))
+        QGuiApplication.clipboard().setText('\n'.join('\t'.join(row) for row in rows.values()))
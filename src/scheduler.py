@@ -0,0 +1,124 @@
+from collections import deque
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from batch import create_executor, create_cancel_event, default_workers, worker_failed, THREAD, QUEUE_DEPTH
+from evaluation import evaluate_file, STREAM_BYTES
+from prefetch import Prefetcher, PREFETCH_BYTES
+from timings import received
+
+
+class EvaluationScheduler(QObject):
+    resultReady = pyqtSignal(object)
+    finished = pyqtSignal()
+    futureDone = pyqtSignal(object, object)
+    prefetchDone = pyqtSignal()
+
+    def __init__(self, workers=None, mode=THREAD, parent=None):
+        super().__init__(parent)
+        self.workers = workers or default_workers()
+        self.mode = mode
+        self.executor = None
+        self.pending = deque()
+        self.running = set()
+        self.folder = None
+        self.settings = None
+        self.cache = None
+        self.timed = False
+        # Memory for files read ahead of the workers, 0 lets every worker read its file itself
+        self.prefetch_bytes = PREFETCH_BYTES
+        self.prefetcher = None
+        # Read of the next file that submit waits for, it gets one callback however often submit runs
+        self.waiting = None
+        # A new event for every batch, it is handed to the workers when their pool starts
+        self.cancel_event = None
+
+        # Futures complete in pool threads, the bookkeeping always happens in the thread of the scheduler
+        self.futureDone.connect(self.collect)
+        self.prefetchDone.connect(self.submit)
+
+    def start(self, folder, files, settings, cache=None, timed=False, channel=None):
+        self.shutdown()
+        # Workers of a cancelled batch may still be running, they keep their own event which stays set
+        self.cancel_event = create_cancel_event(self.mode)
+        self.executor = create_executor(self.workers, self.mode, channel, self.cancel_event)
+        self.folder = folder
+        self.settings = settings
+        self.cache = cache
+        self.timed = timed
+        self.pending = deque(files)
+        if self.prefetch_bytes:
+            self.prefetcher = Prefetcher(folder, files, self.prefetch_bytes, cache=cache, stream_bytes=STREAM_BYTES)
+        self.submit()
+        if not self.is_running():
+            self.shutdown()
+            self.finished.emit()
+
+    def submit(self):
+        while self.pending and len(self.running) < self.workers * QUEUE_DEPTH:
+            index, prefetched = None, None
+            if self.prefetcher is not None:
+                if not self.prefetcher.ready():
+                    # Submitted as soon as the next file is read
+                    if self.waiting is not self.prefetcher.next():
+                        self.waiting = self.prefetcher.next()
+                        self.waiting.add_done_callback(lambda future: self.prefetchDone.emit())
+                    return
+                index, prefetched = self.prefetcher.take()
+            name = self.pending.popleft()
+            future = self.executor.submit(evaluate_file, self.folder, name, self.settings, self.cache, True, self.timed,
+                                          prefetched=prefetched)
+            self.running.add(future)
+            if index is not None:
+                # The content is held until the worker is done with it
+                future.add_done_callback(lambda future, prefetcher=self.prefetcher, index=index: prefetcher.release(index))
+            future.add_done_callback(lambda future, name=name: self.futureDone.emit(name, future))
+
+    def collect(self, name, future):
+        if future not in self.running:
+            return
+        self.running.discard(future)
+
+        # Futures cancelled before they started have no result
+        if not future.cancelled():
+            try:
+                result = future.result()
+                received(result.timings)
+            except Exception as e:
+                result = worker_failed(name, e)
+            self.resultReady.emit(result)
+
+        self.submit()
+        if not self.is_running():
+            self.shutdown()
+            self.finished.emit()
+
+    def cancel(self):
+        # Queued files are dropped, running workers stop at their next check
+        if not self.is_running():
+            return
+        self.pending.clear()
+        self.cancel_event.set()
+        if not self.running:
+            # Only the next file was being read, no worker will report back
+            self.shutdown()
+            self.finished.emit()
+            return
+        for future in list(self.running):
+            # Only queued futures can be cancelled, their done callback collects them right away.
+            # Running ones see the event at their next check and report back as cancelled
+            future.cancel()
+
+    def is_running(self):
+        return bool(self.running or self.pending)
+
+    def shutdown(self):
+        self.pending.clear()
+        self.running.clear()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+            self.waiting = None
+        if self.executor is not None:
+            # Idle workers leave on their own, nothing is terminated
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import builtins
+
+# Import this module first, it times every following import until the window is shown
+START = time.perf_counter()
+ENABLED = '--startup-timing' in sys.argv or bool(os.environ.get('PLUGINDEPTH_STARTUP_TIMING'))
+
+imports = {}
+marks = []
+original_import = builtins.__import__
+depth = 0
+
+
+def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global depth
+    if depth:
+        return original_import(name, globals, locals, fromlist, level)
+
+    # Only the outermost import is counted, including everything it imports itself
+    depth += 1
+    start = time.perf_counter()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        depth -= 1
+        package = name.split('.')[0] if not level else (globals or {}).get('__package__') or name
+        imports[package] = imports.get(package, 0.0) + time.perf_counter() - start
+
+
+def mark(label):
+    if ENABLED:
+        marks.append((label, time.perf_counter()))
+
+
+def report(file=sys.stderr):
+    if not ENABLED:
+        return
+    builtins.__import__ = original_import
+
+    print('Startup timing [ms]', file=file)
+    for package, duration in sorted(imports.items(), key=lambda item: item[1], reverse=True):
+        if duration >= 0.001:
+            print(f'  import {package:<28}{duration*1000:8.1f}', file=file)
+
+    previous = START
+    for label, timestamp in marks:
+        print(f'  {label:<35}{(timestamp-previous)*1000:8.1f}', file=file)
+        previous = timestamp
+    print(f'  {"time to first window":<35}{(previous-START)*1000:8.1f}', file=file)
+
+
+if ENABLED:
+    builtins.__import__ = timed_import
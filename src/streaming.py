@@ -0,0 +1,214 @@
+import numpy as np
+
+from evaluation import SKIP_SAMPLES, EDGE, CycleMaxima
+from measurement_reader import Measurement, read_measurement_chunks, INFUSION, INJECTION, CHUNK_ROWS
+
+
+class LevelDetector:
+    # Every sample below the cycle filter starts a new cycle
+    def __init__(self, cycle_filter):
+        self.cycle_filter = cycle_filter
+        self.count = 0
+
+    def feed(self, values):
+        starts = self.count + np.flatnonzero(values < self.cycle_filter)
+        self.count += len(values)
+        return starts, self.count
+
+
+class EdgeDetector:
+    # Same as find_falling_edges, the idle state and the open idle run are carried from block to block
+    def __init__(self, cycle_filter, hysteresis=0.0, min_dwell=1):
+        self.cycle_filter = cycle_filter
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.count = 0
+        self.idle = False
+        self.run_start = None
+        self.confirmed = False
+
+    def feed(self, values):
+        offset = self.count
+        self.count += len(values)
+        if not len(values):
+            return np.empty(0, dtype=np.int64), self.resolved()
+
+        low = values < self.cycle_filter
+        high = values >= self.cycle_filter + self.hysteresis
+        last_defined = np.maximum.accumulate(np.where(low | high, np.arange(len(values)), -1))
+        # Samples in the hysteresis band at the start of the block keep the state of the last block
+        idle = np.where(last_defined >= 0, low[np.maximum(last_defined, 0)], self.idle)
+
+        changes = np.flatnonzero(np.diff(idle, prepend=self.idle))
+        rises = offset + changes[idle[changes]]
+        falls = offset + changes[~idle[changes]]
+
+        run_starts = rises
+        skip_first = False
+        if self.run_start is not None:
+            run_starts = np.concatenate(([self.run_start], rises))
+            # The open run was reported as soon as it was long enough
+            skip_first = self.confirmed
+
+        if len(falls) < len(run_starts):
+            self.run_start = int(run_starts[-1])
+            self.confirmed = skip_first and len(run_starts) == 1
+            run_starts = run_starts[:-1]
+        else:
+            self.run_start = None
+            self.confirmed = False
+
+        edges = run_starts[falls - run_starts >= self.min_dwell]
+        if skip_first and len(run_starts) and len(edges) and edges[0] == run_starts[0]:
+            edges = edges[1:]
+
+        if self.run_start is not None and not self.confirmed and self.count - self.run_start >= self.min_dwell:
+            edges = np.append(edges, self.run_start)
+            self.confirmed = True
+
+        self.idle = bool(idle[-1])
+        return edges.astype(np.int64), self.resolved()
+
+    def resolved(self):
+        # A run that is not long enough yet may still start a cycle, samples from its start on are not final
+        if self.run_start is not None and not self.confirmed:
+            return self.run_start
+        return self.count
+
+
+class CycleFolder:
+    # Running maximum of the open cycle of one channel, cycles are closed once their next start is final
+    def __init__(self):
+        self.pending = []
+        self.position = 0
+        self.count = 0
+        self.starts = np.empty(0, dtype=np.int64)
+        self.current = None
+        self.maxima = []
+
+    def add_values(self, values):
+        if len(values):
+            self.pending.append(values)
+            self.count += len(values)
+
+    def add_starts(self, starts):
+        if len(starts):
+            self.starts = np.concatenate((self.starts, starts))
+
+    def fold(self, resolved):
+        limit = min(self.count, resolved)
+        if limit <= self.position:
+            return
+
+        values = np.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0]
+        take = values[:limit - self.position]
+        rest = values[limit - self.position:]
+        self.pending = [rest] if len(rest) else []
+
+        inside = np.searchsorted(self.starts, limit)
+        bounds = self.starts[:inside] - self.position
+        self.starts = self.starts[inside:]
+        self.position = limit
+
+        if not len(bounds):
+            if self.current is not None:
+                self.current = max(self.current, take.max())
+            return
+
+        # Samples in front of the first start belong to the open cycle, if there is one
+        if self.current is not None:
+            if bounds[0] > 0:
+                self.current = max(self.current, take[:bounds[0]].max())
+            self.maxima.append(np.array([self.current]))
+        segments = np.maximum.reduceat(take, bounds)
+        self.maxima.append(segments[:-1])
+        self.current = segments[-1]
+
+    def finish(self):
+        self.fold(self.count)
+        if self.current is not None:
+            self.maxima.append(np.array([self.current]))
+        # Cycles starting behind the end of the channel stay empty
+        self.maxima.append(np.full(len(self.starts), np.nan))
+        return np.concatenate(self.maxima)
+
+
+class StreamingSegmentation:
+    # Same cycle maxima as segment_cycles, fed with blocks of raw samples of any size
+    def __init__(self, oneport, cycle_filter, detection, hysteresis=0.0, min_dwell=1):
+        self.channels = ['infusion'] if oneport else ['infusion', 'injection']
+        self.skipped = {channel: 0 for channel in self.channels}
+        self.samples = {channel: 0 for channel in self.channels}
+        self.start_counts = {channel: 0 for channel in self.channels}
+        self.detectors = {
+            channel: EdgeDetector(cycle_filter, hysteresis, min_dwell) if detection == EDGE else LevelDetector(cycle_filter)
+            for channel in self.channels
+        }
+        # The channel with fewer cycle starts is only known at the end, both start lists are applied to both channels
+        self.folders = {(starts, values): CycleFolder() for starts in self.channels for values in self.channels}
+
+    def feed(self, infusion, injection=None):
+        blocks = {'infusion': infusion, 'injection': injection}
+        resolved = {}
+        for channel in self.channels:
+            values = blocks[channel]
+            skip = min(SKIP_SAMPLES - self.skipped[channel], len(values))
+            self.skipped[channel] += skip
+            values = values[skip:]
+            values = values[~np.isnan(values)]
+            self.samples[channel] += len(values)
+
+            starts, resolved[channel] = self.detectors[channel].feed(values)
+            self.start_counts[channel] += len(starts)
+            for other in self.channels:
+                self.folders[(other, channel)].add_values(values)
+                self.folders[(channel, other)].add_starts(starts)
+
+        for (starts, _), folder in self.folders.items():
+            folder.fold(resolved[starts])
+
+    def finish(self):
+        # Use the shortest cycle start points to get equal cycles
+        source = 'infusion'
+        if len(self.channels) == 2 and self.start_counts['infusion'] >= self.start_counts['injection']:
+            source = 'injection'
+
+        count = self.start_counts[source]
+        if count == 0 or count == self.samples['infusion']:
+            return None
+        return CycleMaxima(self.folders[(source, 'infusion')].finish(),
+                           self.folders[(source, 'injection')].finish() if len(self.channels) == 2 else None)
+
+
+def stream_segment(path, settings, chunk_rows=CHUNK_ROWS, report=None):
+    chunks = read_measurement_chunks(path, chunk_rows)
+    header, positions = next(chunks)
+    if INFUSION not in positions:
+        chunks.close()
+        return Measurement(header), None, 0
+
+    segmentation = None
+    limits = {INFUSION: [], INJECTION: []}
+    rows = 0
+    for infusion, injection in chunks:
+        if segmentation is None:
+            segmentation = StreamingSegmentation(injection is None,
+                                                 settings.cycle_filter,
+                                                 settings.detection,
+                                                 settings.hysteresis,
+                                                 settings.min_dwell)
+        # The first two rows hold the limits
+        if len(limits[INFUSION]) < 2:
+            limits[INFUSION].extend(infusion[:2 - len(limits[INFUSION])])
+            if injection is not None:
+                limits[INJECTION].extend(injection[:2 - len(limits[INJECTION])])
+        segmentation.feed(infusion, injection)
+        rows += len(infusion)
+        if report is not None:
+            report(rows)
+
+    # The measurement only holds the limit rows, its signal can't be evaluated again
+    measurement = Measurement(header,
+                              np.array(limits[INFUSION], dtype=np.float64),
+                              np.array(limits[INJECTION], dtype=np.float64) if INJECTION in positions else None)
+    return measurement, segmentation.finish() if segmentation is not None else None, rows
@@ -0,0 +1,117 @@
+import re
+import numpy as np
+import pandas as pd
+
+from evaluation import segment_cycles, LEVEL
+
+SWEEP_COLUMNS = ['File', 'Cycle filter', 'Infusion filter', 'Injection filter',
+                 'Cycles', 'Error Infusion', 'Error Injection', 'Average Infusion', 'Average Injection']
+
+
+def parse_range(text):
+    # "start:stop:step" including stop, single values or a list separated by ";" or spaces
+    values = []
+    for part in re.split(r'[;\s]+', text.strip()):
+        if not part:
+            continue
+        bounds = [float(bound.replace(',', '.')) for bound in part.split(':')]
+        if len(bounds) == 1:
+            values.append(bounds[0])
+        elif len(bounds) == 3 and bounds[2] > 0:
+            count = int(np.floor((bounds[1] - bounds[0]) / bounds[2] + 1e-9)) + 1
+            values.extend(np.round(bounds[0] + np.arange(count) * bounds[2], 10))
+        else:
+            raise ValueError(f'Invalid range "{part}", use start:stop:step')
+    if not values:
+        raise ValueError('Empty range')
+    return np.unique(values)
+
+
+def count_below(sorted_values, thresholds):
+    return np.searchsorted(sorted_values, thresholds, side='left')
+
+
+def suffix_means(sorted_values, below):
+    # Mean of all values >= threshold, i.e. of sorted_values[below:]
+    sums = np.concatenate((np.cumsum(sorted_values[::-1])[::-1], [0.0]))
+    counts = len(sorted_values) - below
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums[below] / counts, np.nan)
+
+
+def sweep_maxima(maxima, infusion_filters, injection_filters):
+    # NaN maxima of empty cycles never pass a filter, just as in threshold_cycles
+    infusion = np.nan_to_num(maxima.infusion, nan=-np.inf)
+    oneport = maxima.injection is None
+    injection = np.full(len(infusion), -np.inf) if oneport else np.nan_to_num(maxima.injection, nan=-np.inf)
+
+    order = np.argsort(infusion, kind='stable')
+    infusion_sorted = infusion[order]
+    injection_by_infusion = injection[order]
+    injection_sorted = np.sort(injection)
+
+    infusion_below = count_below(infusion_sorted, infusion_filters)
+    injection_below = count_below(injection_sorted, injection_filters)
+
+    # Cycles with both channels below their filter are dropped, count them for every combination
+    both_below = np.empty((len(infusion_filters), len(injection_filters)), dtype=np.int64)
+    for index, below in enumerate(infusion_below):
+        both_below[index] = count_below(np.sort(injection_by_infusion[:below]), injection_filters)
+
+    cycles = len(infusion) - both_below
+    error_infusion = infusion_below[:, None] - both_below
+    error_injection = injection_below[None, :] - both_below
+
+    average_infusion = suffix_means(infusion_sorted[np.isfinite(infusion_sorted)],
+                                    np.maximum(infusion_below - np.sum(~np.isfinite(infusion_sorted)), 0))
+    if oneport:
+        # Same as threshold_maxima, one port files have no injection and every cycle is an injection error
+        average_injection = np.full(len(injection_filters), np.nan)
+        error_injection = cycles.copy()
+    else:
+        finite = np.isfinite(injection_sorted)
+        average_injection = suffix_means(injection_sorted[finite],
+                                         np.maximum(injection_below - np.sum(~finite), 0))
+
+    shape = both_below.shape
+    return (cycles,
+            error_infusion,
+            error_injection,
+            np.broadcast_to(average_infusion[:, None], shape),
+            np.broadcast_to(average_injection[None, :], shape))
+
+
+def sweep(measurements, cycle_filters, infusion_filters, injection_filters, detection=LEVEL, hysteresis=0.0, min_dwell=1):
+    infusion_filters = np.asarray(infusion_filters, dtype=np.float64)
+    injection_filters = np.asarray(injection_filters, dtype=np.float64)
+    shape = (len(infusion_filters), len(injection_filters))
+    grid_infusion, grid_injection = np.meshgrid(infusion_filters, injection_filters, indexing='ij')
+
+    tables = []
+    for name, measurement in measurements.items():
+        if not measurement.valid:
+            continue
+        for cycle_filter in cycle_filters:
+            # Segment once per cycle filter, the thresholds are searched in the sorted maxima
+            maxima = segment_cycles(measurement.infusion, measurement.injection, cycle_filter,
+                                    detection, hysteresis, min_dwell)
+            if maxima is None:
+                columns = (np.zeros(shape, dtype=np.int64),) * 3 + (np.full(shape, np.nan),) * 2
+            else:
+                columns = sweep_maxima(maxima, infusion_filters, injection_filters)
+
+            tables.append(pd.DataFrame({
+                'File': name,
+                'Cycle filter': cycle_filter,
+                'Infusion filter': grid_infusion.ravel(),
+                'Injection filter': grid_injection.ravel(),
+                'Cycles': columns[0].ravel(),
+                'Error Infusion': columns[1].ravel(),
+                'Error Injection': columns[2].ravel(),
+                'Average Infusion': columns[3].ravel(),
+                'Average Injection': columns[4].ravel(),
+            }))
+
+    if not tables:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,100 @@
+import json
+import time
+
+PHASES = ['prefetch', 'read', 'cache', 'segmentation', 'thresholding', 'transfer', 'export']
+COUNTS = ['rows', 'cycles']
+TIMING_COLUMNS = ['File'] + [f'{phase} [ms]' for phase in PHASES] + ['Rows', 'Cycles']
+
+
+class Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class PhaseTimer:
+    # Collects the durations of the phases of one file, does nothing if disabled
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+        self.counts = {}
+
+    def phase(self, name):
+        return Phase(self, name) if self.enabled else NULL_PHASE
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def record(self, name):
+        # Plain dict, it is pickled back from the worker processes
+        return {'file': name, 'phases': dict(self.phases), **self.counts, 'sent_at': time.time()}
+
+
+NULL_PHASE = NullPhase()
+NULL_TIMER = PhaseTimer(enabled=False)
+
+
+def received(record):
+    # Time between the end of the evaluation in the worker and the result arriving in the caller
+    if record is not None and 'sent_at' in record:
+        record['phases']['transfer'] = max(time.time() - record.pop('sent_at'), 0.0)
+    return record
+
+
+def merge_export(records, timer):
+    # The export timer collects one phase per sheet, named after the file
+    for record in records:
+        seconds = timer.phases.get(record['file'])
+        if seconds is not None:
+            record['phases']['export'] = seconds
+
+
+def timing_rows(records):
+    for record in records:
+        phases = record['phases']
+        yield ([record['file']]
+               + [phases[phase] * 1000 if phase in phases else None for phase in PHASES]
+               + [record.get(count) for count in COUNTS])
+
+
+def summary(records, export_seconds=None):
+    if not records:
+        return ''
+
+    totals = {phase: sum(record['phases'].get(phase, 0.0) for record in records) for phase in PHASES}
+    lines = [f'\nTimings of {len(records)} files [ms]']
+    for phase in PHASES:
+        if totals[phase]:
+            lines.append(f'  {phase:<15}{totals[phase]*1000:10.1f}  ({totals[phase]*1000/len(records):.1f} per file)')
+    if export_seconds is not None:
+        lines.append(f'  {"export total":<15}{export_seconds*1000:10.1f}')
+
+    slowest = sorted(records, key=lambda record: sum(record['phases'].values()), reverse=True)[:3]
+    lines.append('  Slowest files:')
+    for record in slowest:
+        lines.append(f'    {record["file"]}: {sum(record["phases"].values())*1000:.1f} ({record.get("rows", 0)} rows, {record.get("cycles", 0)} cycles)')
+    return '\n'.join(lines) + '\n'
+
+
+def write_json(path, records, export_seconds=None):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'export': export_seconds, 'files': records}, file, indent=2)
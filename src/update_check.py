@@ -0,0 +1,58 @@
+import time
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+
+RELEASES_URL = 'https://api.github.com/repos/jkfres/2F-plug-in-depth-evaluation/releases'
+TIMEOUT = 3
+# Check at most once a day, failed checks included so offline machines don't retry on every start
+CHECK_INTERVAL = 24 * 60 * 60
+
+
+class UpdateChecker(QObject):
+    latestRelease = pyqtSignal(str)
+    fetched = pyqtSignal(bool, str)
+
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        self.fetched.connect(self.store)
+
+    def enabled(self):
+        return self.settings.value('update_check/enabled', True, type=bool)
+
+    def set_enabled(self, enabled):
+        self.settings.setValue('update_check/enabled', enabled)
+
+    def check(self):
+        if not self.enabled():
+            return
+
+        checked_at = self.settings.value('update_check/checked_at', 0.0, type=float)
+        if 0 <= time.time() - checked_at < CHECK_INTERVAL:
+            tag = self.settings.value('update_check/latest_tag', '', type=str)
+            if tag:
+                self.latestRelease.emit(tag)
+            return
+
+        threading.Thread(target=self.fetch, daemon=True).start()
+
+    def fetch(self):
+        try:
+            import requests
+
+            response = requests.get(RELEASES_URL, timeout=TIMEOUT)
+            if response.status_code != 200:
+                self.fetched.emit(False, '')
+                return
+
+            releases = response.json()
+            self.fetched.emit(True, releases[0]['tag_name'] if releases else '')
+        except Exception:
+            self.fetched.emit(False, '')
+
+    def store(self, success, tag):
+        self.settings.setValue('update_check/checked_at', time.time())
+        if success:
+            self.settings.setValue('update_check/latest_tag', tag)
+        if tag:
+            self.latestRelease.emit(tag)
@@ -0,0 +1,35 @@
+import os
+import re
+import sys
+import shutil
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules of the application are flat files in src, the measurement generator lives in benchmarks
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmarks')]
+
+import pytest
+from generate_measurements import write_measurement
+
+
+def set_dimension(path, ref):
+    # Rewrites the stored used range of the first sheet, like a file written by a tool that never updates it
+    temp_path = f'{path}.tmp'
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                xml = re.sub(r'<dimension [^>]*/>', '', data.decode('utf-8'))
+                data = re.sub(r'(<sheetViews|<sheetFormatPr|<sheetData)', rf'<dimension ref="{ref}"/>\1', xml, count=1).encode('utf-8')
+            target.writestr(item, data)
+    shutil.move(temp_path, path)
+
+
+@pytest.fixture
+def measurement(tmp_path):
+    # Writes a synthetic measurement and returns its path
+    def write(name='measurement.xlsx', **kwargs):
+        path = os.path.join(tmp_path, name)
+        write_measurement(path, **kwargs)
+        return path
+    return write
@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import measurement_reader
+from evaluation import evaluate_file, evaluate_measurement, EvaluationSettings
+from measurement_cache import MeasurementCache
+from measurement_reader import CALAMINE
+from prefetch import Prefetched
+from streaming import stream_segment
+
+SETTINGS = [EvaluationSettings(0.01, 0.2, 0.1),
+            EvaluationSettings(0.05, 0.66, 0.41),
+            EvaluationSettings(0.01, 0.2, 0.9),
+            EvaluationSettings(0.01, 0.9, 0.9)]
+FILES = {
+    'two_port.xlsx': dict(cycles=10, samples_per_cycle=150, noise=0.01, seed=1),
+    'one_port.xlsx': dict(cycles=10, samples_per_cycle=150, noise=0.01, oneport=True, seed=2),
+    # Every cycle keeps samples in both channels, the first release failed on empty cycles
+    'gaps.xlsx': dict(cycles=10, samples_per_cycle=150, noise=0.01, nan_rate=0.005, seed=3),
+    'many_cycles.xlsx': dict(cycles=20, samples_per_cycle=60, noise=0.03, seed=4),
+}
+
+
+def calc_cycles(df1, df2, cycle_filter):
+    df1 = df1.drop(index=df1.index[:20]).dropna().reset_index(drop=True)
+    cycle_start = cycle_start1 = df1[df1 < cycle_filter].index.tolist()
+    if df2 is not None:
+        df2 = df2.drop(index=df2.index[:20]).dropna().reset_index(drop=True)
+        cycle_start = df2[df2 < cycle_filter].index.tolist()
+        if len(cycle_start1) < len(cycle_start):
+            cycle_start = cycle_start1
+    if len(cycle_start) == len(df1.index):
+        return None, None
+    ends = cycle_start[1:] + [None]
+    cycles1 = [df1[start:end] for start, end in zip(cycle_start, ends)]
+    cycles2 = [df2[start:end] for start, end in zip(cycle_start, ends)] if df2 is not None else [None] * len(cycles1)
+    return cycles1, cycles2
+
+
+def baseline_evaluation(path, settings):
+    # The evaluation of the first release, pandas and a loop over the cycles, returns the messages and the data
+    name = os.path.basename(path)
+    df = pd.read_excel(path, engine='openpyxl')
+    messages = []
+    oneport = 'Injection' not in df.columns
+    if oneport:
+        messages.append(f'One Port file ({name}) detected.\n')
+    limits = [(df.iloc[0]['Infusion'], df.iloc[1]['Infusion']),
+              (df.iloc[0]['Injection'], df.iloc[1]['Injection']) if not oneport else (0, 0)]
+    infusion, injection = calc_cycles(df['Infusion'], df['Injection'] if not oneport else None, settings.cycle_filter)
+    if not infusion:
+        messages.append('Phu you filtered the shi* out of the Cycle values.\n')
+        return messages, None
+
+    rows = []
+    for infusion, injection in zip(infusion, injection):
+        infusion_max = max(infusion)
+        append_infusion = infusion_max >= settings.infusion_filter
+        append_injection = False
+        injection_max = 0
+        if injection is not None:
+            injection_max = max(injection)
+            append_injection = injection_max >= settings.injection_filter
+        if append_infusion or append_injection:
+            rows.append((infusion_max, injection_max, not append_infusion, not append_injection))
+    if not rows:
+        messages.append('Phu you filtered the shi* out of the Infusion values.\n')
+        return messages, None
+
+    df_output = pd.DataFrame(rows, columns=['Infusion', 'Injection', 'Error Infusion', 'Error Injection'])
+    if df_output['Error Injection'].all() and not oneport:
+        messages.append(f'\nWarning: No injection measurements found. One Port file ({name}) detected.\n\n')
+        oneport = True
+    if len(df_output) > 15:
+        messages.append(f"\nWarning: More than 15 measurements found on file \"{name}\".\nThe handover from 3T to 2F could have triggered a new cycle. Adjust the filters to remove unwanted measurements.\n\n")
+    return messages, (name, df_output, limits, oneport)
+
+
+def assert_baseline(result, expected):
+    messages, data = expected
+    assert list(result.messages) == messages
+    assert (result.data is None) == (data is None)
+    if data is not None:
+        assert result.data[0] == data[0]
+        # The baseline keeps integer zeros for the injection of one port files
+        assert_frame_equal(result.data[1], data[1], check_dtype=False)
+        np.testing.assert_array_equal(np.asarray(result.data[2], dtype=np.float64), np.asarray(data[2], dtype=np.float64))
+        assert result.data[3] == data[3]
+
+
+@pytest.fixture(scope='module')
+def files(tmp_path_factory):
+    from generate_measurements import write_measurement
+
+    folder = tmp_path_factory.mktemp('measurements')
+    for name, kwargs in FILES.items():
+        write_measurement(os.path.join(folder, name), **kwargs)
+    return str(folder)
+
+
+@pytest.mark.parametrize('name', FILES)
+@pytest.mark.parametrize('settings', SETTINGS)
+@pytest.mark.parametrize('backend', ['openpyxl'] + (['calamine'] if CALAMINE else []))
+def test_readers_match_baseline(files, name, settings, backend, monkeypatch):
+    monkeypatch.setattr(measurement_reader, 'default_backend', lambda: backend)
+    expected = baseline_evaluation(os.path.join(files, name), settings)
+    assert_baseline(evaluate_file(files, name, settings, stream_bytes=None), expected)
+
+    # Files read ahead are decoded from memory
+    with open(os.path.join(files, name), 'rb') as file:
+        prefetched = Prefetched(file.read(), 0.0)
+    assert_baseline(evaluate_file(files, name, settings, stream_bytes=None, prefetched=prefetched), expected)
+
+
+@pytest.mark.parametrize('name', FILES)
+@pytest.mark.parametrize('settings', SETTINGS)
+@pytest.mark.parametrize('chunk_rows', [97, 1000, 65536])
+def test_streaming_matches_baseline(files, name, settings, chunk_rows):
+    # Chunks end in the middle of cycles and of the settling rows
+    measurement, maxima, _ = stream_segment(os.path.join(files, name), settings, chunk_rows)
+    assert_baseline(evaluate_measurement(name, measurement, maxima, settings),
+                    baseline_evaluation(os.path.join(files, name), settings))
+
+
+@pytest.mark.parametrize('name', FILES)
+def test_cache_hit_and_miss_match_baseline(files, name, tmp_path):
+    cache = MeasurementCache(str(tmp_path))
+    for settings in SETTINGS:
+        expected = baseline_evaluation(os.path.join(files, name), settings)
+        # The first settings fill the cache, all others read from it
+        assert_baseline(evaluate_file(files, name, settings, cache, stream_bytes=None), expected)
+        assert len(cache.entries()) == 1
+        assert_baseline(evaluate_file(files, name, settings, cache, stream_bytes=None), expected)
@@ -0,0 +1,23 @@
+import os
+
+import cli
+
+OPTIONS = ['--jobs', '1', '--mode', 'thread', '--no-cache', '--quiet', '--language', 'en_US']
+
+
+def test_exit_code(measurement, tmp_path):
+    path = measurement(cycles=4, samples_per_cycle=100)
+    output = os.path.join(tmp_path, 'result.xlsx')
+
+    assert cli.main([path, '--output', output] + OPTIONS) == 0
+    assert os.path.isfile(output)
+    assert cli.main([path, '--output', output, '--update'] + OPTIONS) == 0
+
+
+def test_exit_code_if_export_fails(measurement, tmp_path, capsys):
+    path = measurement(cycles=4, samples_per_cycle=100)
+    output = os.path.join(tmp_path, 'missing', 'result.xlsx')
+
+    # Scripts running the evaluation at night see that the result was not written
+    assert cli.main([path, '--output', output] + OPTIONS) == 1
+    assert 'was not saved' in capsys.readouterr().err
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+
+import evaluation
+from evaluation import find_cycle_starts, find_falling_edges, evaluate_cycles, evaluate_file, EvaluationSettings, \
+    LiveEvaluation, LEVEL, EDGE
+from generate_measurements import generate_signals
+
+CYCLE_FILTER = 0.05
+
+
+def plug_ins(cycles, idle=10, depth=0.6, hold=30):
+    # Idle, then held at depth
+    return np.tile(np.concatenate([np.zeros(idle), np.full(hold, depth)]), cycles)
+
+
+def test_edges_count_cycles_not_idle_samples():
+    values = plug_ins(4)
+
+    # Every idle sample starts a cycle with level detection, only the first one of each idle phase with edges
+    assert len(find_cycle_starts(values, CYCLE_FILTER, LEVEL)) == 40
+    np.testing.assert_array_equal(find_cycle_starts(values, CYCLE_FILTER, EDGE), [0, 40, 80, 120])
+
+
+def test_hysteresis_ignores_noise_around_the_filter():
+    # The signal crosses the cycle filter three times while ramping out
+    values = np.array([0.6, 0.6, 0.04, 0.06, 0.04, 0.06, 0.0, 0.0, 0.6, 0.6])
+
+    np.testing.assert_array_equal(find_falling_edges(values, CYCLE_FILTER), [2, 4, 6])
+    np.testing.assert_array_equal(find_falling_edges(values, CYCLE_FILTER, hysteresis=0.02), [2])
+
+
+def test_min_dwell_ignores_short_dropouts():
+    # A single sample drops out in the middle of the plug in
+    values = np.array([0.0, 0.0, 0.0, 0.6, 0.6, 0.0, 0.6, 0.6, 0.0, 0.0, 0.0, 0.6])
+
+    np.testing.assert_array_equal(find_falling_edges(values, CYCLE_FILTER), [0, 5, 8])
+    np.testing.assert_array_equal(find_falling_edges(values, CYCLE_FILTER, min_dwell=3), [0, 8])
+
+
+@pytest.mark.parametrize('oneport', [False, True])
+def test_edge_and_level_keep_the_same_cycles(oneport):
+    # The idle samples of the level detection are dropped by the infusion filter
+    infusion, injection = generate_signals(cycles=6, samples_per_cycle=200, noise=0.01, oneport=oneport, seed=3)
+    level = evaluate_cycles(infusion, injection, CYCLE_FILTER, 0.2, 0.1)
+    edge = evaluate_cycles(infusion, injection, CYCLE_FILTER, 0.2, 0.1, EDGE, 0.01, 3)
+
+    assert len(edge.infusion) == 6
+    np.testing.assert_array_equal(edge.infusion, level.infusion)
+    np.testing.assert_array_equal(edge.injection, level.injection)
+
+
+def test_live_evaluation_reuses_the_parsed_data(measurement, monkeypatch):
+    path = measurement(cycles=6, samples_per_cycle=150, noise=0.01, seed=2)
+    folder, name = os.path.split(path)
+    first = EvaluationSettings(0.01, 0.2, 0.1)
+    live = LiveEvaluation()
+    live.add(name, evaluate_file(folder, name, first, keep_measurement=True, stream_bytes=None).measurement)
+    expected = {settings: evaluate_file(folder, name, settings, stream_bytes=None)
+                for settings in [first, first._replace(infusion_filter=0.66, injection_filter=0.41),
+                                 first._replace(cycle_filter=0.05, infusion_filter=0.66),
+                                 first._replace(cycle_filter=0.05, detection=EDGE, min_dwell=3)]}
+
+    segmentations = []
+    segment_measurement = evaluation.segment_measurement
+
+    def counted_segment(measurement, settings):
+        segmentations.append(settings.segmentation())
+        return segment_measurement(measurement, settings)
+    monkeypatch.setattr(evaluation, 'segment_measurement', counted_segment)
+    # The file is not read again
+    os.remove(path)
+
+    for settings, result in expected.items():
+        live_result = live.evaluate(name, settings)
+        assert live_result.messages == result.messages
+        assert_frame_equal(live_result.data[1], result.data[1])
+    # The cycles are only found again when a setting of the cycle detection changed
+    assert segmentations == [first.segmentation(), (0.05, LEVEL, 0.0, 1), (0.05, EDGE, 0.0, 3)]
+
+    live.add(name, live.measurements[name])
+    live.evaluate(name, first)
+    assert len(segmentations) == 4
@@ -0,0 +1,80 @@
+import os
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.styles import numbers
+
+from evaluation import EvaluationSettings, evaluate_measurement, segment_measurement
+from export_excel import ExportExcel
+from generate_measurements import generate_signals, INFUSION_LIMITS, INJECTION_LIMITS
+from measurement_reader import Measurement
+from result_summary import INFUSION_TARGET
+
+SETTINGS = EvaluationSettings(0.05, 0.62, 0.38)
+LABELS = {'E2': 'Lower limit', 'E3': 'Upper limit', 'E5': 'Average', 'E6': 'Target', 'E7': 'Delta',
+          'E9': 'Installed shim', 'E10': 'Required shim', 'F1': 'Infusion evaluation',
+          'I16': 'Legend', 'I17': 'Smallest value', 'I18': 'Largest value', 'I19': 'Lower limit', 'I20': 'Upper limit'}
+
+
+def file_data(name, oneport=False, seed=0, cycles=8):
+    infusion, injection = generate_signals(cycles=cycles, samples_per_cycle=100, noise=0.01, oneport=oneport, seed=seed)
+    measurement = Measurement(['Time', 'Infusion'] + ([] if oneport else ['Injection']), infusion, injection)
+    return evaluate_measurement(name, measurement, segment_measurement(measurement, SETTINGS), SETTINGS).data
+
+
+def export(tmp_path, output_file_data, static=False, name='result.xlsx'):
+    path = os.path.join(tmp_path, name)
+    assert ExportExcel(output_file_data, path, print, 'en_US', static=static).write_to_excel()
+    return path
+
+
+def cell_styles(path):
+    # Number of cell formats in the style table of the workbook
+    with zipfile.ZipFile(path) as zf:
+        styles = zf.read('xl/styles.xml').decode('utf-8')
+    return int(styles.split('<cellXfs count="')[1].split('"')[0])
+
+
+@pytest.mark.parametrize('static', [False, True])
+def test_template_cells(tmp_path, static):
+    wb = load_workbook(export(tmp_path, [file_data('two.xlsx', cycles=8), file_data('one.xlsx', oneport=True, seed=1, cycles=6)],
+                              static))
+
+    for name, oneport, rows in (('two', False, 8), ('one', True, 6)):
+        ws = wb[name]
+        assert {coordinate: ws[coordinate].value for coordinate in LABELS} == LABELS
+        assert ws['F1'].font.b and ws['I16'].font.b and ws['E2'].alignment.horizontal == 'right'
+        # The limits are filled in per sheet
+        assert (ws['F2'].value, ws['F3'].value) == INFUSION_LIMITS
+        assert ws['F7'].font.b and ws['F7'].number_format == ws['F2'].number_format == numbers.FORMAT_NUMBER_COMMA_SEPARATED1
+        assert ws['F6'].value == (INFUSION_TARGET if static else '0.65')
+        if static:
+            assert ws['F7'].value == pytest.approx(INFUSION_TARGET - ws['F5'].value)
+        else:
+            assert ws['F7'].value == '=F6-F5'
+        assert ws['G1'].value == (None if oneport else 'Injection evaluation')
+        if not oneport:
+            assert (ws['G2'].value, ws['G3'].value) == INJECTION_LIMITS
+        assert [ws['J17'].fill.fgColor.rgb, ws['J18'].fill.fgColor.rgb] == ['00FFC7CE', '00B8F589']
+
+        widths = {column: ws.column_dimensions[column].width for column in 'ABEFGI'}
+        assert widths == {'A': 15, 'B': 15, 'E': 16, 'F': 20, 'G': 5 if oneport else 20, 'I': 20}
+        # The error columns are grouped and hidden
+        assert ws.column_dimensions['C'].hidden and ws.column_dimensions['C'].max == 4
+
+        ranges = sorted(str(rule_range.sqref) for rule_range in ws.conditional_formatting)
+        if static:
+            assert ranges == []
+        else:
+            columns = 'A' if oneport else 'AB'
+            assert ranges == sorted([f'{column}2:{column}{rows + 1}' for column in columns] +
+                                    [f'{column}1:{column}{rows + 1}' for column in columns])
+
+
+@pytest.mark.parametrize('static', [False, True])
+def test_sheets_share_the_styles(tmp_path, static):
+    # More sheets don't add cell formats, every sheet uses the styles of the template
+    few = [file_data('a.xlsx', seed=1), file_data('b.xlsx', oneport=True, seed=2)]
+    many = few + [file_data(f'{name}.xlsx', oneport=seed % 2 == 0, seed=seed) for seed, name in enumerate('cdefgh', 3)]
+    assert cell_styles(export(tmp_path, many, static, 'many.xlsx')) == cell_styles(export(tmp_path, few, static, 'few.xlsx'))
@@ -0,0 +1,155 @@
+import os
+import re
+import shutil
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+import cli
+from export_update import read_manifest, stale_files, source_info, settings_key
+from evaluation import EvaluationSettings
+from generate_measurements import write_measurement
+
+CALC_CHAIN = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              '<c r="F7" i="2"/><c r="G7"/><c r="F7" i="3"/><c r="F7" i="4"/></calcChain>')
+
+
+def export(files, output, *options):
+    argv = files + ['--output', output, '--jobs', '1', '--mode', 'thread', '--no-cache', '--quiet', '--language', 'en_US']
+    assert cli.main(argv + list(options)) == 0
+
+
+def change(path, seed):
+    # A new recording under the same name, the modification time moves on for sure
+    mtime = os.stat(path).st_mtime
+    write_measurement(path, cycles=6, samples_per_cycle=100, seed=seed)
+    os.utime(path, (mtime + 10, mtime + 10))
+
+
+def cells(ws):
+    # Values and the visible style of every cell
+    return [[(cell.value, cell.number_format, cell.font.b, cell.font.color.rgb if cell.font.color else None,
+              cell.fill.fgColor.rgb) for cell in row] for row in ws.iter_rows()]
+
+
+def conditional_formats(ws):
+    return sorted(str(rule_range.sqref) for rule_range in ws.conditional_formatting)
+
+
+def assert_same_workbook(path, expected_path, sheets=None):
+    wb = load_workbook(path)
+    expected = load_workbook(expected_path)
+    assert wb.sheetnames == expected.sheetnames
+    assert [ws.sheet_state for ws in wb] == [ws.sheet_state for ws in expected]
+    for name in sheets or expected.sheetnames:
+        assert cells(wb[name]) == cells(expected[name]), name
+        assert conditional_formats(wb[name]) == conditional_formats(expected[name]), name
+        assert len(wb[name]._charts) == len(expected[name]._charts), name
+        assert wb[name].column_dimensions['A'].width == expected[name].column_dimensions['A'].width, name
+
+
+def save_like_excel(path):
+    # Excel and LibreOffice write shared strings, their own style table and a calculation chain
+    load_workbook(path).save(path)
+    with zipfile.ZipFile(path) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    parts['xl/calcChain.xml'] = CALC_CHAIN.encode('utf-8')
+    parts['xl/_rels/workbook.xml.rels'] = parts['xl/_rels/workbook.xml.rels'].replace(
+        b'</Relationships>',
+        b'<Relationship Id="rId99" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain" '
+        b'Target="calcChain.xml"/></Relationships>')
+    parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(
+        b'</Types>',
+        b'<Override PartName="/xl/calcChain.xml" '
+        b'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/></Types>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for seed, name in enumerate('abc'):
+        write_measurement(os.path.join(tmp_path, f'{name}.xlsx'), cycles=4, samples_per_cycle=100, seed=seed)
+    return str(tmp_path)
+
+
+def files(folder, names):
+    return [os.path.join(folder, f'{name}.xlsx') for name in names]
+
+
+@pytest.mark.parametrize('static', [False, True])
+def test_update_matches_new_export(folder, static):
+    options = ['--static'] if static else []
+    result = os.path.join(folder, 'out', 'result.xlsx')
+    os.makedirs(os.path.dirname(result))
+    # The manifest row of a one port file ends with empty injection statistics
+    write_measurement(os.path.join(folder, 'p.xlsx'), cycles=4, samples_per_cycle=100, oneport=True, seed=5)
+    export(files(folder, 'abcp'), result, '--timings', *options)
+    assert 'Timings' in load_workbook(result, read_only=True).sheetnames
+
+    change(os.path.join(folder, 'b.xlsx'), seed=7)
+    write_measurement(os.path.join(folder, 'd.xlsx'), cycles=5, samples_per_cycle=100, seed=8)
+    export(files(folder, 'abcpd'), result, '--update', *options)
+
+    expected = os.path.join(folder, 'out', 'expected.xlsx')
+    export(files(folder, 'abcpd'), expected, *options)
+    # The timings of the first run are gone with an update without timings
+    assert load_workbook(result).sheetnames == ['Summary', 'a', 'b', 'c', 'p', 'd', 'Manifest']
+    assert load_workbook(result)['Manifest'].sheet_state == 'hidden'
+    assert_same_workbook(result, expected)
+
+
+def test_update_of_file_saved_by_excel(folder):
+    result = os.path.join(folder, 'out', 'result.xlsx')
+    os.makedirs(os.path.dirname(result))
+    export(files(folder, 'abc'), result)
+    save_like_excel(result)
+
+    # The manifest is still found, only the changed file is evaluated again
+    change(os.path.join(folder, 'b.xlsx'), seed=7)
+    manifest = read_manifest(result)
+    settings = EvaluationSettings(0.01, 0.2, 0.1)
+    sources = {name: source_info(name) for name in files(folder, 'abc')}
+    assert stale_files(manifest, files(folder, 'abc'), sources, settings_key(settings, 'en_US', False, True)) == \
+        files(folder, 'b')
+
+    export(files(folder, 'abc'), result, '--update')
+
+    with zipfile.ZipFile(result) as zf:
+        names = zf.namelist()
+        rels = zf.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+        content_types = zf.read('[Content_Types].xml').decode('utf-8')
+        workbook = zf.read('xl/workbook.xml').decode('utf-8')
+    assert 'xl/calcChain.xml' not in names
+    assert 'calcChain' not in rels and 'calcChain' not in content_types
+    # Every sheet has its relationship and part
+    for rid in re.findall(r'<sheet [^>]*r:id="(\w+)"', workbook):
+        target = re.search(rf'Id="{rid}"[^>]*Target="/?([^"]+)"|Target="/?([^"]+)"[^>]*Id="{rid}"', rels)
+        part = next(group for group in target.groups() if group)
+        assert part in names or f'xl/{part}' in names
+
+    expected = os.path.join(folder, 'out', 'expected.xlsx')
+    export(files(folder, 'abc'), expected)
+    # Sheets that were not written again keep the look Excel gave them, the others match a new export
+    assert_same_workbook(result, expected, ['Summary', 'b'])
+    wb = load_workbook(result)
+    assert [list(ws.values) for ws in wb if ws.title in ('a', 'c', 'Manifest')] == \
+        [list(ws.values) for ws in load_workbook(expected) if ws.title in ('a', 'c', 'Manifest')]
+
+
+def test_update_with_new_files_keeps_the_other_sheets(folder):
+    # Only the summary and the manifest are written again besides the sheet of the new file
+    result = os.path.join(folder, 'out', 'result.xlsx')
+    os.makedirs(os.path.dirname(result))
+    export(files(folder, 'ab'), result)
+    before = load_workbook(result)
+    shutil.copy(os.path.join(folder, 'c.xlsx'), os.path.join(folder, 'e.xlsx'))
+    export(files(folder, 'abe'), result, '--update')
+
+    wb = load_workbook(result)
+    assert wb.sheetnames == ['Summary', 'a', 'b', 'e', 'Manifest']
+    for name in ('a', 'b'):
+        assert cells(wb[name]) == cells(before[name])
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+import measurement_cache
+from measurement_cache import MeasurementCache, load_measurement
+from measurement_reader import Measurement
+
+
+def entry(seed, samples=1000):
+    rng = np.random.default_rng(seed)
+    return Measurement(['Time', 'Infusion', 'Injection'], rng.random(samples), rng.random(samples))
+
+
+def set_last_use(cache, key, seconds):
+    os.utime(cache.entry_path(key), ns=(seconds * 10 ** 9, seconds * 10 ** 9))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = MeasurementCache(str(tmp_path))
+    cache.put('a', entry(0))
+    size = os.path.getsize(cache.entry_path('a'))
+    # Room for two entries
+    cache.max_bytes = 2 * size + size // 2
+    cache.put('b', entry(1))
+    set_last_use(cache, 'a', 1000)
+    set_last_use(cache, 'b', 2000)
+
+    # Reading an entry makes it the most recently used one
+    np.testing.assert_array_equal(cache.get('a').infusion, entry(0).infusion)
+    cache.put('c', entry(2))
+    assert sorted(os.path.basename(path) for _, _, path in cache.entries()) == ['a.npz', 'c.npz']
+    assert cache.get('b') is None
+    assert sum(size for _, size, _ in cache.entries()) <= cache.max_bytes
+
+
+def test_key_changes_with_the_file(measurement, tmp_path):
+    path = measurement(cycles=3, samples_per_cycle=100)
+    cache = MeasurementCache(os.path.join(tmp_path, 'cache'))
+    key = cache.key(path)
+    assert cache.key(path) == key
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.key(path) != key
+
+    with open(path, 'ab') as file:
+        file.write(b'\0')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.key(path) != key
+
+
+def test_content_hash_sees_changes_behind_the_same_mtime(measurement, tmp_path):
+    path = measurement(cycles=3, samples_per_cycle=100)
+    cache = MeasurementCache(os.path.join(tmp_path, 'cache'), content_hash=True)
+    key = cache.key(path)
+    with open(path, 'rb') as file:
+        data = file.read()
+    # The content read ahead gives the same key as the file
+    assert cache.key(path, data) == key
+
+    stat = os.stat(path)
+    with open(path, 'r+b') as file:
+        file.seek(len(data) // 2)
+        file.write(bytes([data[len(data) // 2] ^ 0xff]))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.key(path) != key
+    assert not cache.cached(path)
+
+
+def test_changed_file_is_read_again(measurement, tmp_path, monkeypatch):
+    path = measurement(cycles=3, samples_per_cycle=100, seed=1)
+    cache = MeasurementCache(os.path.join(tmp_path, 'cache'))
+    first = load_measurement(path, cache)
+    assert cache.cached(path)
+
+    reads = []
+    read_measurement = measurement_cache.read_measurement
+
+    def counted_read(source, **kwargs):
+        reads.append(source)
+        return read_measurement(source, **kwargs)
+    monkeypatch.setattr(measurement_cache, 'read_measurement', counted_read)
+    np.testing.assert_array_equal(load_measurement(path, cache).infusion, first.infusion)
+    assert not reads
+
+    stat = os.stat(path)
+    measurement(cycles=4, samples_per_cycle=100, seed=2)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    changed = load_measurement(path, cache)
+    assert len(reads) == 1
+    assert len(changed.infusion) != len(first.infusion)
+    assert len(cache.entries()) == 2
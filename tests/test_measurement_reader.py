@@ -0,0 +1,48 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import progress
+from conftest import set_dimension
+from measurement_reader import read_measurement, CALAMINE
+
+BACKENDS = ['openpyxl'] + (['calamine'] if CALAMINE else [])
+
+
+def assert_same_values(actual, expected):
+    np.testing.assert_array_equal(np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_stale_dimension_reads_all_rows(measurement, backend):
+    path = measurement(cycles=2, samples_per_cycle=200)
+    set_dimension(path, 'A1:C1')
+
+    # pandas ignores the stored dimension, same as the evaluation before the projected reader
+    df = pd.read_excel(path, engine='openpyxl')
+    result = read_measurement(path, backend)
+
+    assert len(result.infusion) == len(df) == 420
+    assert_same_values(result.infusion, df['Infusion'])
+    assert_same_values(result.injection, df['Injection'])
+
+
+@pytest.mark.skipif(not CALAMINE, reason='python-calamine is not installed')
+def test_cancelled_read_does_not_fall_back(measurement, monkeypatch):
+    import measurement_reader
+
+    path = measurement(cycles=2, samples_per_cycle=200)
+    # A second read with openpyxl would take as long as the read that was cancelled
+    fallback = []
+    monkeypatch.setattr(measurement_reader, 'read_openpyxl', lambda *args: fallback.append(args))
+    cancel = threading.Event()
+    cancel.set()
+    progress.connect(None, cancel)
+    try:
+        with pytest.raises(progress.Cancelled):
+            read_measurement(path, 'calamine', progress.row_reporter(path))
+    finally:
+        progress.connect(None, None)
+    assert not fallback
@@ -0,0 +1,47 @@
+import os
+
+from batch import evaluate_files, THREAD
+from evaluation import EvaluationSettings
+from prefetch import Prefetcher
+
+SETTINGS = EvaluationSettings(0.01, 0.2, 0.1)
+
+
+def test_budget_is_held_until_the_file_is_evaluated(measurement, tmp_path):
+    names = [f'{name}.xlsx' for name in 'abc']
+    for name in names:
+        measurement(name, cycles=3, samples_per_cycle=100)
+    size = os.path.getsize(os.path.join(tmp_path, names[0]))
+
+    # Room for two files
+    with Prefetcher(str(tmp_path), names, budget=2 * size) as prefetcher:
+        index, prefetched = prefetcher.take()
+        assert len(prefetched.data) == size
+        prefetcher.next().result(10)
+        # The first file is still in memory while its worker parses it, the third one has to wait
+        assert prefetcher.available == 0
+        assert not prefetcher.futures[1].done()
+
+        prefetcher.release(index)
+        assert prefetcher.futures[1].result(10) is not None
+        assert prefetcher.available == 0
+        for _ in range(2):
+            prefetcher.release(prefetcher.take()[0])
+        assert prefetcher.available == 2 * size
+
+
+def test_batch_releases_the_budget(measurement, tmp_path, monkeypatch):
+    names = [f'{name}.xlsx' for name in 'abcd']
+    for seed, name in enumerate(names):
+        measurement(name, cycles=3, samples_per_cycle=100, seed=seed)
+    prefetchers = []
+    init = Prefetcher.__init__
+
+    def tracked_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        prefetchers.append(self)
+    monkeypatch.setattr(Prefetcher, '__init__', tracked_init)
+
+    results = list(evaluate_files(str(tmp_path), names, SETTINGS, workers=1, mode=THREAD, prefetch_bytes=10 ** 8))
+    assert sorted(result.name for result in results) == sorted(names)
+    assert prefetchers[0].available == prefetchers[0].budget
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+from openpyxl import load_workbook
+
+from evaluation import EvaluationSettings, evaluate_measurement, segment_measurement
+from measurement_reader import Measurement
+from generate_measurements import generate_signals
+from export_excel import ExportExcel
+from result_summary import summarize_results, SUMMARY_COLUMNS, INFUSION_TARGET, INJECTION_TARGET
+
+SETTINGS = EvaluationSettings(0.05, 0.62, 0.38)
+
+
+def file_data(name, oneport=False, seed=0):
+    infusion, injection = generate_signals(cycles=8, samples_per_cycle=100, noise=0.01, oneport=oneport, seed=seed)
+    measurement = Measurement(['Time', 'Infusion'] + ([] if oneport else ['Injection']), infusion, injection)
+    return evaluate_measurement(name, measurement, segment_measurement(measurement, SETTINGS), SETTINGS).data
+
+
+@pytest.fixture
+def output_file_data():
+    return [file_data('c.xlsx', seed=1), file_data('A.xlsx', oneport=True, seed=2), file_data('b.xlsx', seed=3)]
+
+
+def test_summary_matches_sheets(output_file_data):
+    summary = summarize_results(output_file_data)
+
+    assert list(summary.columns) == SUMMARY_COLUMNS
+    for data, row in zip(output_file_data, summary.itertuples(index=False)):
+        name, df, _, oneport = data
+        infusion = df['Infusion'][~df['Error Infusion']]
+        assert row[0] == name
+        assert row[2] == len(df)
+        assert row[3] == df['Error Infusion'].sum()
+        np.testing.assert_allclose(row[4:9], [infusion.mean(), infusion.min(), infusion.max(), infusion.std(),
+                                              INFUSION_TARGET - infusion.mean()])
+        if oneport:
+            assert row[9] is None and np.isnan(row[10:15]).all()
+        else:
+            injection = df['Injection'][~df['Error Injection']]
+            assert row[9] == df['Error Injection'].sum()
+            np.testing.assert_allclose(row[10:15], [injection.mean(), injection.min(), injection.max(), injection.std(),
+                                                    INJECTION_TARGET - injection.mean()])
+
+
+def test_summary_sheet_is_sorted(output_file_data, tmp_path):
+    path = os.path.join(tmp_path, 'result.xlsx')
+    ExportExcel(output_file_data, path, print, 'en_US').write_to_excel()
+
+    wb = load_workbook(path)
+    rows = list(wb['Summary'].iter_rows(values_only=True))
+    assert list(rows[0]) == SUMMARY_COLUMNS
+    assert [row[0] for row in rows[1:]] == ['A.xlsx', 'b.xlsx', 'c.xlsx']
+    # The links still point to the sheet of their file
+    assert [cell.hyperlink.location for cell in wb['Summary']['A'][1:]] == ["'A'!A1", "'b'!A1", "'c'!A1"]
+    # The file sheets keep the order of the evaluation
+    assert wb.sheetnames[:4] == ['Summary', 'c', 'A', 'b']
@@ -0,0 +1,57 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('PyQt6')
+from PyQt6.QtCore import QCoreApplication
+
+from batch import THREAD
+from evaluation import EvaluationSettings
+from prefetch import Prefetcher
+from scheduler import EvaluationScheduler
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_prefetch_callback_is_attached_once(app, measurement, monkeypatch, tmp_path):
+    names = [f'{name}.xlsx' for name in 'abcd']
+    for seed, name in enumerate(names):
+        measurement(name, cycles=3, samples_per_cycle=100, seed=seed)
+
+    # The read of the second file is held back, so the scheduler has to wait for it
+    release = threading.Event()
+    read = Prefetcher.read
+
+    def held_read(self, path, index):
+        if index == 1:
+            release.wait(10)
+        return read(self, path, index)
+    monkeypatch.setattr(Prefetcher, 'read', held_read)
+
+    scheduler = EvaluationScheduler(workers=1, mode=THREAD)
+    results = []
+    prefetched = []
+    scheduler.resultReady.connect(results.append)
+    scheduler.prefetchDone.connect(lambda: prefetched.append(None))
+    scheduler.start(str(tmp_path), names, EvaluationSettings(0.01, 0.2, 0.1))
+    prefetcher = scheduler.prefetcher
+    for _ in range(5):
+        # Every finished file submits again while the next file is still being read
+        scheduler.submit()
+
+    release.set()
+    # All files are read before the scheduler goes on, so it never waits for another one
+    for future in list(prefetcher.futures):
+        future.result(10)
+    deadline = time.monotonic() + 20
+    while scheduler.is_running() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert len(prefetched) == 1
+    assert sorted(result.name for result in results) == sorted(names)
+    assert not any(result.failed for result in results)
+    assert prefetcher.available == prefetcher.budget
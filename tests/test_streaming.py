@@ -0,0 +1,36 @@
+import os
+import pytest
+from pandas.testing import assert_frame_equal
+
+from conftest import set_dimension
+from evaluation import evaluate_file, EvaluationSettings, EDGE
+
+SETTINGS = [EvaluationSettings(0.01, 0.2, 0.1),
+            EvaluationSettings(0.01, 0.2, 0.1, EDGE, 0.005, 3)]
+
+
+def evaluate(path, settings, streamed):
+    # stream_bytes=0 streams every file, None never does
+    folder, name = os.path.split(path)
+    return evaluate_file(folder, name, settings, stream_bytes=0 if streamed else None)
+
+
+def assert_same_result(streamed, batch):
+    assert streamed.messages == batch.messages
+    assert (streamed.data is None) == (batch.data is None)
+    if batch.data is not None:
+        assert streamed.data[0] == batch.data[0]
+        assert_frame_equal(streamed.data[1], batch.data[1])
+        assert streamed.data[2] == batch.data[2]
+        assert streamed.data[3] == batch.data[3]
+
+
+@pytest.mark.parametrize('settings', SETTINGS)
+def test_stale_dimension_streams_all_rows(measurement, settings):
+    path = measurement(cycles=8, samples_per_cycle=300)
+    set_dimension(path, 'A1:C1')
+
+    streamed = evaluate(path, settings, True)
+    batch = evaluate(path, settings, False)
+    assert len(batch.data[1]) == 8
+    assert_same_result(streamed, batch)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from evaluation import EvaluationSettings, evaluate_measurement, segment_measurement, LEVEL, EDGE
+from measurement_reader import Measurement
+from generate_measurements import generate_signals
+from sweep import sweep
+
+CYCLE_FILTERS = [0.005, 0.05]
+INFUSION_FILTERS = [0.0, 0.6, 0.65, 0.7, 1.0]
+INJECTION_FILTERS = [0.0, 0.35, 0.4, 0.45, 1.0]
+
+
+def evaluated_row(measurement, settings):
+    result = evaluate_measurement('file', measurement, segment_measurement(measurement, settings), settings)
+    if result.data is None:
+        return 0, 0, 0, np.nan, np.nan
+    df = result.data[1]
+    return (len(df),
+            int(df['Error Infusion'].sum()),
+            int(df['Error Injection'].sum()),
+            df['Infusion'][~df['Error Infusion']].mean(),
+            df['Injection'][~df['Error Injection']].mean())
+
+
+@pytest.mark.parametrize('oneport', [False, True])
+@pytest.mark.parametrize('detection', [LEVEL, EDGE])
+def test_sweep_matches_evaluation(oneport, detection):
+    # Noise and gaps split some cycles, so every filter combination keeps and drops different cycles
+    infusion, injection = generate_signals(cycles=12, samples_per_cycle=200, noise=0.02, oneport=oneport,
+                                           nan_rate=0.01, seed=3)
+    measurement = Measurement(['Time', 'Infusion'] + ([] if oneport else ['Injection']), infusion, injection)
+
+    table = sweep({'file': measurement}, CYCLE_FILTERS, INFUSION_FILTERS, INJECTION_FILTERS, detection, 0.01, 2)
+
+    assert len(table) == len(CYCLE_FILTERS) * len(INFUSION_FILTERS) * len(INJECTION_FILTERS)
+    for row in table.itertuples(index=False):
+        settings = EvaluationSettings(row[1], row[2], row[3], detection, 0.01, 2)
+        expected = evaluated_row(measurement, settings)
+        assert tuple(row[4:7]) == expected[:3], settings
+        np.testing.assert_allclose(row[7:9], expected[3:], err_msg=str(settings))
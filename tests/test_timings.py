@@ -0,0 +1,74 @@
+import os
+import json
+
+import cli
+from evaluation import evaluate_file, EvaluationSettings
+from generate_measurements import SETTLING_ROWS
+from measurement_cache import MeasurementCache
+from prefetch import Prefetched
+from timings import PhaseTimer, received, merge_export, timing_rows, TIMING_COLUMNS
+
+SETTINGS = EvaluationSettings(0.01, 0.2, 0.1)
+
+
+def test_records_of_the_evaluation(measurement, tmp_path):
+    path = measurement(cycles=5, samples_per_cycle=100)
+    folder, name = os.path.split(path)
+    assert evaluate_file(folder, name, SETTINGS, stream_bytes=None).timings is None
+
+    record = received(evaluate_file(folder, name, SETTINGS, timed=True, stream_bytes=None).timings)
+    assert record['file'] == name
+    assert record['rows'] == 2 + SETTLING_ROWS + 5 * 100 and record['cycles'] == 5
+    assert set(record['phases']) == {'read', 'segmentation', 'thresholding', 'transfer'}
+    assert all(seconds >= 0 for seconds in record['phases'].values())
+    assert 'sent_at' not in record
+
+    # Cache hits are not read, files read ahead bring the time of the read along
+    cache = MeasurementCache(os.path.join(tmp_path, 'cache'))
+    assert {'read', 'cache'} <= set(evaluate_file(folder, name, SETTINGS, cache, timed=True).timings['phases'])
+    phases = evaluate_file(folder, name, SETTINGS, cache, timed=True).timings['phases']
+    assert 'cache' in phases and 'read' not in phases
+    with open(path, 'rb') as file:
+        prefetched = Prefetched(file.read(), 0.25)
+    assert evaluate_file(folder, name, SETTINGS, timed=True, prefetched=prefetched).timings['phases']['prefetch'] == 0.25
+
+    failed = evaluate_file(folder, 'missing.xlsx', SETTINGS, timed=True)
+    assert failed.failed and failed.timings['file'] == 'missing.xlsx'
+
+
+def test_timing_rows():
+    timer = PhaseTimer()
+    timer.add('read', 0.5)
+    timer.add('read', 0.25)
+    timer.count('rows', 100)
+    records = [timer.record('a.xlsx'), PhaseTimer().record('b.xlsx')]
+    export = PhaseTimer()
+    export.add('a.xlsx', 0.125)
+    merge_export(records, export)
+
+    rows = list(timing_rows(records))
+    assert all(len(row) == len(TIMING_COLUMNS) for row in rows)
+    assert dict(zip(TIMING_COLUMNS, rows[0])) == {'File': 'a.xlsx', 'prefetch [ms]': None, 'read [ms]': 750.0,
+                                                  'cache [ms]': None, 'segmentation [ms]': None,
+                                                  'thresholding [ms]': None, 'transfer [ms]': None,
+                                                  'export [ms]': 125.0, 'Rows': 100, 'Cycles': None}
+    assert rows[1] == ['b.xlsx'] + [None] * (len(TIMING_COLUMNS) - 1)
+
+    disabled = PhaseTimer(enabled=False)
+    with disabled.phase('read'):
+        disabled.count('rows', 100)
+    assert disabled.record('c.xlsx')['phases'] == {} and 'rows' not in disabled.record('c.xlsx')
+
+
+def test_cli_writes_a_record_per_file(measurement, tmp_path):
+    paths = [measurement(name, cycles=3, samples_per_cycle=100, seed=seed) for seed, name in enumerate(['b.xlsx', 'a.xlsx'])]
+    timings = os.path.join(tmp_path, 'timings.json')
+    assert cli.main(paths + ['--output', os.path.join(tmp_path, 'result.xlsx'), '--timings-json', timings, '--jobs', '1',
+                             '--mode', 'thread', '--no-cache', '--quiet', '--language', 'en_US']) == 0
+
+    with open(timings, encoding='utf-8') as file:
+        report = json.load(file)
+    # In the order of the files on the command line, with the export time of their sheet
+    assert [record['file'] for record in report['files']] == paths
+    assert all(record['cycles'] == 3 and 'export' in record['phases'] for record in report['files'])
+    assert report['export'] >= sum(record['phases']['export'] for record in report['files'])